@@ -23,6 +23,29 @@ DEBUG = os.getenv('DEBUG', 'False') == 'True'
 
 TRIPADVISOR_API_KEY = os.getenv('TRIPADVISOR_API_KEY')
 
+# Client HTTP TripAdvisor (voir tourism/tripAdvisor.py)
+TRIPADVISOR_CLIENT = {
+    'BASE_URL': os.getenv('TRIPADVISOR_BASE_URL', 'https://api.content.tripadvisor.com/api/v1'),
+    'CONNECT_TIMEOUT': 3.05,
+    'READ_TIMEOUT': 10,
+    'MAX_RETRIES': 3,
+    'BACKOFF_FACTOR': 0.5,
+    'MAX_RETRY_AFTER': 30,
+    'POOL_SIZE': 20,
+    'FETCH_WORKERS': 8,
+    'CIRCUIT_FAILURE_THRESHOLD': 5,
+    'CIRCUIT_RESET_TIMEOUT': 30,
+    'RATE_LIMIT_QPS': 5,
+    'RATE_LIMIT_BURST': 10,
+    'RATE_LIMIT_TIMEOUT': 5,
+    # True : quota commun à tous les workers (nécessite un cache partagé)
+    'RATE_LIMIT_SHARED': os.getenv('TRIPADVISOR_RATE_LIMIT_SHARED', 'False') == 'True',
+    'CACHE_ALIAS': 'tripadvisor',
+    'CACHE_TTL': {'search': 6 * 3600, 'details': 24 * 3600, 'photos': 24 * 3600, 'reviews': 6 * 3600},
+    'CACHE_STALE_TTL': 7 * 24 * 3600,
+    'CACHE_NEGATIVE_TTL': 600,
+}
+
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.2/howto/deployment/checklist/
 
@@ -92,9 +115,22 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Connexions persistantes, vérifiées avant réutilisation
+        'CONN_MAX_AGE': int(os.getenv('CONN_MAX_AGE', 600)),
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# PRAGMA appliqués à chaque connexion SQLite (WAL, synchronous, busy_timeout...) :
+# valeurs par défaut dans tourism/db.py, surchargeables ici
+SQLITE_PRAGMAS = {}
+
+# Lectures sur une connexion en lecture seule, écritures sur un seul écrivain
+if os.getenv('SQLITE_READ_REPLICA', 'False') == 'True':
+    from tourism.db import read_replica_settings
+    DATABASES['replica'] = read_replica_settings(DATABASES['default'])
+    DATABASE_ROUTERS = ['tourism.db.ReadReplicaRouter']
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -132,6 +168,10 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# Images envoyées et leurs déclinaisons (variants/), servies par Django en DEBUG
+MEDIA_URL = 'media/'
+MEDIA_ROOT = BASE_DIR / 'media'
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -141,7 +181,55 @@ CACHES = {
     'default': {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
         'LOCATION': 'unique-snowflake',
-    }
+    },
+    # Réponses TripAdvisor : persistant et commun aux workers (remplaçable par
+    # LocMemCache ou tout autre backend Django)
+    'tripadvisor': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / '.cache' / 'tripadvisor',
+        'TIMEOUT': None,
+        'OPTIONS': {'MAX_ENTRIES': 50000},
+    },
+}
+
+# Compteurs de likes / sauvegardes : BUFFERED cumule les incréments dans le
+# cache et les écrit par lots (voir tourism/counters.py). Avec plusieurs
+# workers, nécessite un cache partagé (LocMemCache est propre à chaque process).
+ATTRACTION_COUNTERS = {
+    'BUFFERED': os.getenv('ATTRACTION_COUNTERS_BUFFERED', 'False') == 'True',
+    'FLUSH_INTERVAL': 5,
+    'FLUSH_SIZE': 500,
+}
+
+# Autocomplétion /api/attractions/suggest/ : index en mémoire propre à chaque
+# process, reconstruit après TTL secondes (voir tourism/suggest.py)
+ATTRACTION_SUGGEST = {
+    'TTL': 300,
+    'MAX_RESULTS': 20,
+}
+
+# Vues asynchrones pour search_tripadvisor / details_from_tripadvisor (tourism/async_views.py) :
+# à activer quand l'application est servie en ASGI (uvicorn Solo.asgi:application)
+TRIPADVISOR_ASYNC_VIEWS = os.getenv('TRIPADVISOR_ASYNC_VIEWS', 'False') == 'True'
+
+# Déclinaisons des images envoyées (tourism/images.py) : largeurs en pixels,
+# formats, qualité et taille du pool de processus qui les génère
+IMAGE_PIPELINE = {
+    'SIZES': {'thumbnail': 160, 'card': 480, 'hero': 1280},
+    'FORMATS': ('webp', 'jpeg'),
+    'QUALITY': 80,
+    'MAX_WORKERS': int(os.getenv('IMAGE_PIPELINE_WORKERS', '2')),
+}
+
+# Cache des réponses GET de /api/countries/ et /api/attractions/ (ETag,
+# 304) ; invalidé par les versions de tables (voir tourism/caching.py),
+# rangées dans le cache par défaut. Avec plusieurs workers, nécessite un
+# cache partagé : avec LocMemCache, une écriture n'invalide que les
+# réponses du process qui l'a faite. ENABLED à None : actif seulement si
+# CACHES['default'] n'est pas un cache local (LocMemCache, DummyCache).
+RESPONSE_CACHE = {
+    'ENABLED': None,
+    'TIMEOUT': 5 * 60,
 }
 
 REST_FRAMEWORK = {
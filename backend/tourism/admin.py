@@ -13,6 +13,7 @@ from .models import (
 class AttractionImageInline(admin.TabularInline):
     model = AttractionImage
     extra = 1
+    exclude = ['variants', 'checksum']
 
 # --- ADMINISTRATION DES MODÈLES ---
 
@@ -86,6 +87,7 @@ class AttractionImageAdmin(admin.ModelAdmin):
     list_display = ['attraction', 'caption', 'order']
     list_filter = ['attraction']
     raw_id_fields = ['attraction']
+    readonly_fields = ['variants', 'checksum']
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
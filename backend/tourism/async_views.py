@@ -0,0 +1,94 @@
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.http import HttpResponseNotAllowed, JsonResponse
+from rest_framework import status
+from rest_framework.exceptions import NotFound
+from rest_framework.utils.encoders import JSONEncoder
+from . import views
+from .models import Attraction, Category, Country
+from .tripAdvisor import TripAdvisorError
+
+# Versions asynchrones des endpoints qui attendent l'API TripAdvisor.
+#
+# Servies par ASGI (uvicorn / daphne, Solo/asgi.py), elles n'occupent pas un
+# thread pendant l'appel : l'attente se fait dans la boucle d'événements, avec
+# le client httpx de TripAdvisorService. Seules les écritures transactionnelles
+# (upsert, sérialisation) passent par un thread via sync_to_async. Activées par
+# TRIPADVISOR_ASYNC_VIEWS (voir urls.py) ; mêmes URLs, paramètres et réponses
+# que les actions des viewsets.
+
+
+def json_response(data, status=status.HTTP_200_OK):
+    """JSON rendu comme par le JSONRenderer de DRF"""
+    return JsonResponse(data, status=status, safe=False, encoder=JSONEncoder,
+                        json_dumps_params={'ensure_ascii': False})
+
+
+def error_response(exc):
+    return json_response({'error': str(exc)}, status=views.tripadvisor_error_status(exc))
+
+
+def not_found():
+    return json_response({'detail': NotFound.default_detail}, status=status.HTTP_404_NOT_FOUND)
+
+
+async def search_tripadvisor(request, pk):
+    """GET /api/countries/{id}/search_tripadvisor/?q="""
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    try:
+        country = await Country.objects.aget(pk=pk)
+    except Country.DoesNotExist:
+        return not_found()
+    query = request.GET.get('q', '').strip()
+
+    try:
+        results = await views.tripadvisor.asearch_locations(
+            query, country.capital_latitude, country.capital_longitude
+        )
+    except TripAdvisorError as exc:
+        return error_response(exc)
+
+    if not results or 'data' not in results:
+        return json_response({'error': 'Aucun résultat trouvé.'}, status=status.HTTP_404_NOT_FOUND)
+
+    data = await sync_to_async(views.upsert_search_results)(country, results, {'request': request})
+    return json_response(data)
+
+
+async def details_from_tripadvisor(request, pk):
+    """GET /api/attractions/{id}/details_from_tripadvisor/"""
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    try:
+        attraction = await Attraction.objects.aget(pk=pk, is_active=True)
+    except Attraction.DoesNotExist:
+        return not_found()
+
+    if not attraction.tripadvisor_id:
+        return json_response(
+            {'error': 'No TripAdvisor ID for this attraction'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    cache_key = views.details_cache_key(attraction)
+    cached_data = await cache.aget(cache_key)
+    if cached_data:
+        return json_response(cached_data)
+
+    bundle = await views.tripadvisor.aget_location_bundle(attraction.tripadvisor_id)
+    if 'details' in bundle['errors']:
+        return error_response(bundle['errors']['details'])
+
+    update_fields = views.apply_details(attraction, bundle)
+    cat = bundle['details'].get('category', {}).get('name')
+    if cat:
+        attraction.category = (await Category.objects.aget_or_create(name=cat))[0]
+        update_fields.append('category')
+    await attraction.asave(update_fields=[*update_fields, 'updated_at'])
+
+    response_data = views.details_response(bundle)
+    # Un résultat partiel n'est pas mis en cache : le prochain appel réessaiera
+    if not bundle['errors']:
+        await cache.aset(cache_key, response_data, views.DETAILS_CACHE_TIMEOUT)
+    return json_response(response_data)
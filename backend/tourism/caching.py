@@ -0,0 +1,170 @@
+import hashlib
+import json
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_cache_control
+from django.utils.http import http_date, parse_etags, parse_http_date_safe, quote_etag
+from rest_framework.response import Response
+
+VERSION_PREFIX = 'table_version'
+RESPONSE_PREFIX = 'response'
+
+
+# Caches propres à chaque process : une écriture n'y invaliderait que les
+# réponses du worker qui l'a faite
+LOCAL_CACHE_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def response_cache_settings():
+    """ENABLED à None (défaut) : actif seulement si le cache `default` est partagé"""
+    config = {
+        'ENABLED': None,
+        'TIMEOUT': 5 * 60,  # secondes ; une réponse périmée n'est de toute façon plus adressée
+        **getattr(settings, 'RESPONSE_CACHE', {}),
+    }
+    if config['ENABLED'] is None:
+        config['ENABLED'] = settings.CACHES['default']['BACKEND'] not in LOCAL_CACHE_BACKENDS
+    return config
+
+
+def _version_key(table):
+    return f'{VERSION_PREFIX}:{table}'
+
+
+def _modified_key(table):
+    return f'{VERSION_PREFIX}:{table}:modified'
+
+
+def _incr(tables):
+    now = time.time()
+    for table in tables:
+        try:
+            cache.incr(_version_key(table))
+        except ValueError:
+            # Version absente (jamais lue ou évincée) : initialisée à la prochaine lecture
+            pass
+    cache.set_many({_modified_key(table): now for table in tables}, None)
+
+
+def bump(*tables):
+    """
+    Invalide toutes les réponses qui dépendent de `tables` en incrémentant
+    leur version, sans parcourir les clés mises en cache.
+
+    Incrément immédiat, puis de nouveau au commit de la transaction en
+    cours : une réponse calculée entre les deux, sur des données pas encore
+    validées, est ainsi écartée elle aussi.
+    """
+    _incr(tables)
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: _incr(tables))
+
+
+def versions(tables):
+    """{table: (version, date de dernière modification)}, en une lecture du cache"""
+    keys = [key for table in tables for key in (_version_key(table), _modified_key(table))]
+    values = cache.get_many(keys)
+    missing = [table for table in tables if _version_key(table) not in values]
+    if missing:
+        # Une valeur jamais utilisée : une version évincée puis recréée ne
+        # retombe pas sur des réponses encore en cache
+        now = time.time()
+        for table in missing:
+            cache.add(_version_key(table), time.time_ns(), None)
+            cache.add(_modified_key(table), now, None)
+        values = cache.get_many(keys)
+    return {
+        table: (values.get(_version_key(table)), values.get(_modified_key(table), 0))
+        for table in tables
+    }
+
+
+def normalized_params(request):
+    """Paramètres de requête triés, sans les valeurs vides : ?b=1&a= et ?b=1 ont la même clé"""
+    return sorted(
+        (key, sorted(value for value in values if value))
+        for key, values in request.query_params.lists()
+        if any(values)
+    )
+
+
+class ConditionalCacheMixin:
+    """
+    Cache des réponses GET d'un viewset en lecture, avec requêtes conditionnelles.
+
+    La clé réunit l'hôte (liens de pagination absolus), l'action, ses
+    arguments, les paramètres normalisés, le format négocié, les versions des tables `cache_tables` et, si
+    `cache_per_user` (indicateurs liked / saved), l'utilisateur connecté.
+    Son empreinte sert d'ETag fort : If-None-Match reçoit un 304 sans
+    accès à la base. Les écritures invalident en incrémentant la version
+    des tables (bump), jamais clé par clé.
+    """
+
+    cache_tables = ()
+    cached_actions = ('list', 'retrieve')
+    cache_per_user = False
+
+    def list(self, request, *args, **kwargs):
+        return self.cached(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached(super().retrieve, request, *args, **kwargs)
+
+    def cached(self, handler, request, *args, **kwargs):
+        if (request.method == 'GET' and self.action in self.cached_actions
+                and response_cache_settings()['ENABLED']):
+            return self.cached_response(handler, request, *args, **kwargs)
+        return handler(request, *args, **kwargs)
+
+    def cache_etag(self, request, kwargs, table_versions):
+        user = request.user.pk if self.cache_per_user and request.user.is_authenticated else None
+        payload = json.dumps([
+            request.build_absolute_uri('/'), type(self).__name__, self.action, sorted(kwargs.items()),
+            normalized_params(request), request.accepted_media_type, user,
+            sorted((table, version) for table, (version, _) in table_versions.items()),
+        ], default=str, separators=(',', ':'))
+        return hashlib.sha1(payload.encode()).hexdigest()
+
+    def not_modified(self, request, etag, last_modified):
+        if_none_match = request.headers.get('If-None-Match')
+        if if_none_match:
+            etags = parse_etags(if_none_match)
+            return '*' in etags or quote_etag(etag) in etags
+        # If-Modified-Since n'est consulté qu'en l'absence d'ETag (RFC 9110)
+        since = parse_http_date_safe(request.headers.get('If-Modified-Since', ''))
+        return since is not None and int(last_modified) <= since
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        table_versions = versions(self.cache_tables)
+        etag = self.cache_etag(request, kwargs, table_versions)
+        last_modified = max((modified for _, modified in table_versions.values()), default=0)
+
+        if self.not_modified(request, etag, last_modified):
+            response = HttpResponseNotModified()
+        else:
+            key = f'{RESPONSE_PREFIX}:{etag}'
+            cached = cache.get(key)
+            if cached is not None:
+                content, content_type = cached
+                response = HttpResponse(content, content_type=content_type)
+            else:
+                response = handler(request, *args, **kwargs)
+                if response.status_code != 200 or not isinstance(response, Response):
+                    return response
+                timeout = response_cache_settings()['TIMEOUT']
+                response.add_post_render_callback(
+                    lambda rendered: cache.set(key, (rendered.content, rendered['Content-Type']), timeout)
+                )
+
+        response['ETag'] = quote_etag(etag)
+        response['Last-Modified'] = http_date(int(last_modified))
+        if request.user.is_authenticated:
+            patch_cache_control(response, private=True)
+        patch_cache_control(response, no_cache=True)
+        return response
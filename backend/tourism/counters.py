@@ -0,0 +1,232 @@
+import time
+from contextlib import contextmanager
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.db.models.functions import Greatest
+from . import caching, leaderboard, suggest
+from .models import Attraction, Country
+
+
+def adjust_country_count(country_id, delta):
+    """Incrémente / décrémente atomiquement le compteur d'un pays"""
+    if country_id is not None and delta:
+        Country.objects.filter(pk=country_id).update(
+            active_attractions_count=F('active_attractions_count') + delta
+        )
+        caching.bump('country')
+
+
+def recount_countries(country_ids=None):
+    """Recalcule les compteurs depuis la table des attractions (tous les pays par défaut)"""
+    countries = Country.objects.annotate(
+        active_count=Count('attractions', filter=Q(attractions__is_active=True))
+    )
+    if country_ids is not None:
+        countries = countries.filter(pk__in=country_ids)
+
+    updated = []
+    for country in countries.only('id', 'active_attractions_count'):
+        if country.active_attractions_count != country.active_count:
+            country.active_attractions_count = country.active_count
+            updated.append(country)
+    Country.objects.bulk_update(updated, ['active_attractions_count'])
+    if updated:
+        caching.bump('country')
+    return len(updated)
+
+
+# --- Compteurs de likes / sauvegardes ---
+
+COUNTER_FIELDS = ('num_likes', 'saves_count')
+LOCK_KEY = 'attraction_counters:lock'
+FLUSH_LOCK_TIMEOUT = 30  # secondes ; libère le verrou d'un flush annulé avec sa transaction
+FLUSH_KEY = 'attraction_counters:flushed'
+# Registre des compteurs à écrire : une clé par entrée, numérotée par une
+# séquence (incr atomique), et un drapeau par compteur déjà inscrit
+DIRTY_KEY = 'attraction_counters:dirty'
+DIRTY_SEQ_KEY = 'attraction_counters:dirty_seq'
+FLUSHED_SEQ_KEY = 'attraction_counters:flushed_seq'
+GAP_KEY = 'attraction_counters:gap'
+# Verrou court du registre : inscription d'un compteur d'un côté, lecture
+# des entrées, retrait des drapeaux et relevé des incréments de l'autre
+REGISTRY_LOCK_KEY = 'attraction_counters:registry_lock'
+REGISTRY_LOCK_TIMEOUT = 2  # secondes ; libère le verrou d'un process interrompu
+
+
+def _counter_settings():
+    return {
+        'BUFFERED': False,
+        'FLUSH_INTERVAL': 5,  # secondes
+        'FLUSH_SIZE': 500,
+        **getattr(settings, 'ATTRACTION_COUNTERS', {}),
+    }
+
+
+def _pending_key(field, attraction_id):
+    return f'attraction_counters:{field}:{attraction_id}'
+
+
+def _flag_key(field, attraction_id):
+    return f'{DIRTY_KEY}:{field}:{attraction_id}'
+
+
+def _entry_key(seq):
+    return f'{DIRTY_KEY}:{seq}'
+
+
+def _apply(field, deltas):
+    """
+    Une requête UPDATE par valeur d'incrément, limitée à la colonne du compteur.
+
+    `.update()` n'émet pas de signal : les likes sont reportés à la main sur
+    le classement de l'autocomplétion, une fois la transaction validée.
+    """
+    by_delta = {}
+    for attraction_id, delta in deltas.items():
+        if delta:
+            by_delta.setdefault(delta, []).append(attraction_id)
+    for delta, ids in by_delta.items():
+        Attraction.objects.filter(pk__in=ids).update(
+            **{field: Greatest(F(field) + delta, 0)}
+        )
+    if by_delta:
+        caching.bump('attraction')
+        if field == 'num_likes':
+            transaction.on_commit(lambda: suggest.index.add_likes(deltas))
+
+
+def increment(attraction_id, field, delta):
+    """
+    Ajoute `delta` au compteur `field` d'une attraction.
+
+    Par défaut : UPDATE atomique `F(field) + delta` sur la seule colonne.
+    En mode tamponné (ATTRACTION_COUNTERS['BUFFERED']), les incréments sont
+    cumulés dans le cache et écrits par lots (flush), ce qui évite qu'une
+    rafale de likes sur une même attraction se sérialise sur le verrou
+    d'écriture SQLite. Un like ne coûte alors que des opérations atomiques
+    du cache, sans attendre un flush en cours : seul le verrou court du
+    registre est pris, le temps d'y inscrire le compteur.
+    """
+    assert field in COUNTER_FIELDS
+    config = _counter_settings()
+    if not config['BUFFERED']:
+        _apply(field, {attraction_id: delta})
+        leaderboard.schedule([attraction_id])
+        return
+
+    key = _pending_key(field, attraction_id)
+    if not cache.add(key, delta, None):
+        cache.incr(key, delta)
+
+    dirty_count = _mark_dirty(field, attraction_id)
+    if dirty_count >= config['FLUSH_SIZE'] or cache.add(FLUSH_KEY, 1, config['FLUSH_INTERVAL']):
+        # Après le commit de la requête : le like lui-même est alors en base
+        transaction.on_commit(flush)
+
+
+@contextmanager
+def _registry_lock():
+    # Quelques opérations du cache seulement : attente active brève
+    while not cache.add(REGISTRY_LOCK_KEY, 1, REGISTRY_LOCK_TIMEOUT):
+        time.sleep(0.001)
+    try:
+        yield
+    finally:
+        cache.delete(REGISTRY_LOCK_KEY)
+
+
+def _mark_dirty(field, attraction_id):
+    """
+    Inscrit le compteur au registre s'il n'y est pas déjà ; retourne le
+    nombre approximatif d'entrées en attente d'écriture.
+    """
+    with _registry_lock():
+        if cache.add(_flag_key(field, attraction_id), 1, None):
+            cache.add(DIRTY_SEQ_KEY, 0, None)
+            seq = cache.incr(DIRTY_SEQ_KEY)
+            cache.set(_entry_key(seq), (field, attraction_id), None)
+        else:
+            seq = cache.get(DIRTY_SEQ_KEY, 0)
+    return seq - cache.get(FLUSHED_SEQ_KEY, 0)
+
+
+def pending(attraction_id, field):
+    """Incrément pas encore écrit en base (mode tamponné)"""
+    if not _counter_settings()['BUFFERED']:
+        return 0
+    return cache.get(_pending_key(field, attraction_id), 0)
+
+
+def current_value(attraction_id, field):
+    """Valeur en base + incréments en attente"""
+    value = Attraction.objects.filter(pk=attraction_id).values_list(field, flat=True).first() or 0
+    return max(0, value + pending(attraction_id, field))
+
+
+def _dirty_entries(start, end):
+    """
+    Entrées start+1..end du registre et dernier numéro lu. La lecture
+    s'arrête à une entrée manquante (numéro pris par un process interrompu
+    ou dont le verrou a expiré), sauf si elle manquait déjà au flush précédent.
+    """
+    entries = cache.get_many([_entry_key(seq) for seq in range(start + 1, end + 1)])
+    found, last = [], start
+    for seq in range(start + 1, end + 1):
+        entry = entries.get(_entry_key(seq))
+        if entry is None:
+            if cache.get(GAP_KEY) != seq:
+                cache.set(GAP_KEY, seq, None)
+                break
+        else:
+            found.append(entry)
+        last = seq
+    return found, last
+
+
+def flush():
+    """
+    Écrit en base les incréments tamponnés, en une transaction.
+
+    Les incréments ne sont retirés du cache, et le verrou rendu, qu'au
+    commit : si l'écriture échoue ou si une transaction englobante est
+    annulée, ils restent en attente (le verrou expire) pour le flush suivant.
+    """
+    if not cache.add(LOCK_KEY, 1, FLUSH_LOCK_TIMEOUT):
+        return 0
+    try:
+        start = cache.get(FLUSHED_SEQ_KEY, 0)
+        # Sous le verrou du registre : aucune inscription à moitié écrite n'est
+        # lue, et un incrément relevé ici ou après réinscrit son compteur
+        with _registry_lock():
+            dirty, last = _dirty_entries(start, cache.get(DIRTY_SEQ_KEY, 0))
+            dirty = set(dirty)
+            cache.delete_many([_flag_key(field, attraction_id) for field, attraction_id in dirty])
+            values = cache.get_many([_pending_key(field, attraction_id) for field, attraction_id in dirty])
+
+        deltas = {field: {} for field in COUNTER_FIELDS}
+        for field, attraction_id in dirty:
+            delta = values.get(_pending_key(field, attraction_id), 0)
+            if delta:
+                deltas[field][attraction_id] = delta
+
+        with transaction.atomic():
+            for field, field_deltas in deltas.items():
+                _apply(field, field_deltas)
+            leaderboard.record({pk for field_deltas in deltas.values() for pk in field_deltas})
+            transaction.on_commit(lambda: _flushed(deltas, start, last))
+    except Exception:
+        cache.delete(LOCK_KEY)
+        raise
+    return sum(len(field_deltas) for field_deltas in deltas.values())
+
+
+def _flushed(deltas, start, last):
+    for field, field_deltas in deltas.items():
+        for attraction_id, delta in field_deltas.items():
+            # decr plutôt que delete : les incréments arrivés entre-temps sont conservés
+            cache.decr(_pending_key(field, attraction_id), delta)
+    cache.set(FLUSHED_SEQ_KEY, last, None)
+    cache.delete_many([_entry_key(seq) for seq in range(start + 1, last + 1)])
+    cache.delete(LOCK_KEY)
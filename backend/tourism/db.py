@@ -0,0 +1,77 @@
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+READ_REPLICA = 'replica'
+
+# Appliqués à chaque nouvelle connexion SQLite, dans cet ordre
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'WAL',  # les lecteurs ne sont plus bloqués par l'écrivain
+    'synchronous': 'NORMAL',  # sûr en WAL : seul le dernier commit peut être perdu sur coupure
+    'busy_timeout': 5000,  # ms d'attente du verrou d'écriture avant "database is locked"
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64000,  # négatif : en Kio, soit 64 Mo par connexion
+    'temp_store': 'MEMORY',
+}
+# Modifient le fichier : ignorés sur une connexion en lecture seule (le mode WAL y est persistant)
+WRITE_PRAGMAS = {'journal_mode'}
+
+
+def sqlite_pragmas():
+    return {**DEFAULT_PRAGMAS, **getattr(settings, 'SQLITE_PRAGMAS', {})}
+
+
+def is_read_only(settings_dict):
+    return 'mode=ro' in str(settings_dict['NAME'])
+
+
+def apply_pragmas(cursor, pragmas, read_only=False):
+    for name, value in pragmas.items():
+        if value is None or (read_only and name in WRITE_PRAGMAS):
+            continue
+        cursor.execute(f'PRAGMA {name} = {value}')
+
+
+@receiver(connection_created)
+def configure_sqlite(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        apply_pragmas(cursor, sqlite_pragmas(), read_only=is_read_only(connection.settings_dict))
+
+
+def read_replica_settings(database):
+    """
+    Connexion en lecture seule sur le même fichier que `database` : en WAL,
+    ses lectures voient le dernier commit sans jamais prendre le verrou
+    d'écriture. Les tests la font pointer sur la base de test (MIRROR).
+    """
+    return {
+        **database,
+        'NAME': f"file:{database['NAME']}?mode=ro",
+        'OPTIONS': {**database.get('OPTIONS', {}), 'uri': True},
+        'TEST': {'MIRROR': 'default'},
+    }
+
+
+class ReadReplicaRouter:
+    """
+    Lectures sur la connexion en lecture seule, écritures sur l'unique
+    écrivain. Dans une transaction de l'écrivain, les lectures restent
+    sur celui-ci pour voir ses propres écritures non validées.
+    """
+
+    def db_for_read(self, model, **hints):
+        if READ_REPLICA not in settings.DATABASES or connections['default'].in_atomic_block:
+            return 'default'
+        return READ_REPLICA
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True  # même fichier
+
+    def allow_migrate(self, db, app_label, **hints):
+        return db == 'default'
@@ -0,0 +1,190 @@
+import math
+from django.db.models import F, FloatField, Q, Value
+from django.db.models.functions import ASin, Cast, Cos, Power, Radians, Sin, Sqrt
+
+EARTH_RADIUS_KM = 6371  # Rayon de la Terre en km
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    """Distance en km entre deux points (formule de haversine)"""
+    dlat = math.radians(lat2 - lat1)
+    dlon = math.radians(lon2 - lon1)
+
+    a = (math.sin(dlat / 2) ** 2 +
+         math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) *
+         math.sin(dlon / 2) ** 2)
+
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def bounding_box(latitude, longitude, radius):
+    """
+    Rectangle (lat_min, lat_max, lon_min, lon_max) qui contient le cercle
+    de rayon `radius` km autour du point. Sert de préfiltre indexable.
+    """
+    dlat = radius / KM_PER_DEGREE
+    lat_min = max(-90.0, latitude - dlat)
+    lat_max = min(90.0, latitude + dlat)
+
+    # Près des pôles ou si le cercle fait le tour de la Terre : toutes les longitudes
+    cos_lat = math.cos(math.radians(max(abs(lat_min), abs(lat_max))))
+    if cos_lat <= 0 or radius / (KM_PER_DEGREE * cos_lat) >= 180:
+        return lat_min, lat_max, -180.0, 180.0
+
+    dlon = radius / (KM_PER_DEGREE * cos_lat)
+    return lat_min, lat_max, longitude - dlon, longitude + dlon
+
+
+def distance_expression(latitude, longitude, lat_field='latitude', lon_field='longitude'):
+    """Expression SQL de la distance haversine (km) depuis un point fixe"""
+    lat = Radians(Cast(F(lat_field), FloatField()))
+    lon = Radians(Cast(F(lon_field), FloatField()))
+    lat0 = math.radians(latitude)
+    lon0 = math.radians(longitude)
+
+    a = (
+        Power(Sin((lat - Value(lat0)) / 2), 2) +
+        Value(math.cos(lat0)) * Cos(lat) * Power(Sin((lon - Value(lon0)) / 2), 2)
+    )
+    return Value(2.0 * EARTH_RADIUS_KM) * ASin(Sqrt(a))
+
+
+def annotate_distance(queryset, latitude, longitude):
+    """Ajoute `distance` (km) à chaque ligne, calculée en SQL"""
+    return queryset.annotate(distance=distance_expression(latitude, longitude))
+
+
+def filter_by_radius(queryset, latitude, longitude, radius):
+    """
+    Filtre les lignes à moins de `radius` km du point, en une seule requête :
+    préfiltre par rectangle (index latitude/longitude) puis vérification
+    exacte par haversine sur les seuls candidats.
+    """
+    lat_min, lat_max, lon_min, lon_max = bounding_box(latitude, longitude, radius)
+
+    queryset = queryset.filter(latitude__gte=lat_min, latitude__lte=lat_max)
+    if lon_min < -180:
+        # Le rectangle traverse l'antiméridien
+        queryset = queryset.filter(Q(longitude__gte=lon_min + 360) | Q(longitude__lte=lon_max))
+    elif lon_max > 180:
+        queryset = queryset.filter(Q(longitude__gte=lon_min) | Q(longitude__lte=lon_max - 360))
+    else:
+        queryset = queryset.filter(longitude__gte=lon_min, longitude__lte=lon_max)
+
+    return annotate_distance(queryset, latitude, longitude).filter(distance__lte=radius)
+
+
+# --- Index spatial par geohash ---
+
+GEOHASH_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+GEOHASH_PRECISION = 9  # précision stockée en base (~5 m)
+NEAREST_START_PRECISION = 7  # premières cellules explorées (~150 m)
+
+
+def geohash_encode(latitude, longitude, precision=GEOHASH_PRECISION):
+    """Encode un point en geohash (base 32)"""
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    latitude, longitude = float(latitude), float(longitude)
+
+    chars = []
+    bit, ch, even = 0, 0, True
+    while len(chars) < precision:
+        rng, value = (lon_range, longitude) if even else (lat_range, latitude)
+        mid = (rng[0] + rng[1]) / 2
+        if value >= mid:
+            ch = (ch << 1) | 1
+            rng[0] = mid
+        else:
+            ch = ch << 1
+            rng[1] = mid
+        even = not even
+        bit += 1
+        if bit == 5:
+            chars.append(GEOHASH_BASE32[ch])
+            bit, ch = 0, 0
+    return ''.join(chars)
+
+
+def geohash_cell_size(precision):
+    """Dimensions (lat, lon) en degrés d'une cellule geohash"""
+    bits = 5 * precision
+    lon_bits = (bits + 1) // 2
+    lat_bits = bits // 2
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lon_bits
+
+
+def geohash_neighbourhood(latitude, longitude, precision):
+    """Cellule contenant le point et ses 8 voisines"""
+    dlat, dlon = geohash_cell_size(precision)
+    cells = set()
+    for i in (-1, 0, 1):
+        lat = latitude + i * dlat
+        if not -90 <= lat <= 90:
+            continue
+        for j in (-1, 0, 1):
+            lon = (longitude + j * dlon + 180) % 360 - 180
+            cells.add(geohash_encode(lat, lon, precision))
+    return cells
+
+
+def _covered_radius(latitude, precision):
+    """Rayon (km) garanti couvert par le voisinage 3x3 autour du point"""
+    dlat, dlon = geohash_cell_size(precision)
+    worst_lat = min(90.0, abs(latitude) + dlat)
+    return min(dlat * KM_PER_DEGREE, dlon * KM_PER_DEGREE * math.cos(math.radians(worst_lat)))
+
+
+def _precision_for_radius(latitude, radius):
+    for precision in range(NEAREST_START_PRECISION, 0, -1):
+        if _covered_radius(latitude, precision) >= radius:
+            return precision
+    return 1
+
+
+def nearest(queryset, latitude, longitude, k=None, radius=None):
+    """
+    Attractions les plus proches du point : liste de (id, distance en km).
+
+    Explore des voisinages de cellules geohash de plus en plus larges et
+    s'arrête dès que les k plus proches (ou tout le rayon) sont couverts :
+    le coût dépend de la densité locale, pas de la taille de la table.
+    Si même les cellules de précision 1 ne suffisent pas (données
+    éparses, très grand rayon), la recherche porte sur tout le queryset.
+    """
+    if radius is not None:
+        start = _precision_for_radius(latitude, radius)
+    else:
+        start = NEAREST_START_PRECISION
+
+    for precision in range(start, 0, -1):
+        cells = Q()
+        for cell in geohash_neighbourhood(latitude, longitude, precision):
+            # Plage de préfixe : utilise l'index sur geohash
+            cells |= Q(geohash__gte=cell, geohash__lt=cell + '{')
+
+        found = []
+        for pk, lat, lon in queryset.filter(cells).values_list('id', 'latitude', 'longitude'):
+            distance = haversine(latitude, longitude, float(lat), float(lon))
+            if radius is None or distance <= radius:
+                found.append((pk, distance))
+        found.sort(key=lambda item: item[1])
+
+        covered = _covered_radius(latitude, precision)
+        if radius is not None and covered >= radius:
+            return found[:k] if k is not None else found
+        if k is not None and len(found) >= k and found[k - 1][1] <= covered:
+            return found[:k]
+
+    return _nearest_exhaustive(queryset, latitude, longitude, k, radius)
+
+
+def _nearest_exhaustive(queryset, latitude, longitude, k, radius):
+    """nearest() sans index geohash : rectangle englobant si rayon, sinon toute la table"""
+    if radius is not None:
+        queryset = filter_by_radius(queryset, latitude, longitude, radius)
+    else:
+        queryset = annotate_distance(queryset, latitude, longitude)
+    queryset = queryset.order_by('distance', 'id').values_list('id', 'distance')
+    return list(queryset[:k] if k is not None else queryset)
@@ -0,0 +1,232 @@
+import hashlib
+import io
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+# Déclinaisons des images : plusieurs largeurs, en WebP et en JPEG, servies
+# en srcset (AttractionListSerializer.main_image_srcset) pour que la
+# carte d'une liste ne télécharge plus l'original.
+#
+# Les images envoyées (AttractionImage) sont redimensionnées par Pillow
+# dans un pool de processus borné, après le commit, et rangées sous un
+# chemin dérivé de leur contenu : variants/ab/cdef….webp. Un fichier
+# identique n'est écrit qu'une fois et peut être servi avec un cache
+# immuable ; il n'est pas supprimé avec l'image, d'autres peuvent le partager.
+# Les photos TripAdvisor ne sont pas téléchargées : l'API fournit déjà
+# plusieurs tailles, reprises telles quelles à l'ingestion.
+
+VARIANTS_DIR = 'variants'
+EXTENSIONS = {'webp': 'webp', 'jpeg': 'jpg'}
+# Tailles TripAdvisor reprises ; thumbnail et small sont recadrées au carré
+TRIPADVISOR_SIZES = ('medium', 'large', 'original')
+
+
+def image_pipeline_settings():
+    return {
+        'SIZES': {'thumbnail': 160, 'card': 480, 'hero': 1280},  # largeurs en pixels
+        'FORMATS': ('webp', 'jpeg'),
+        'QUALITY': 80,
+        'MAX_WORKERS': 2,
+        'BACKGROUND': True,  # False : redimensionnement dans le process appelant (tests)
+        **getattr(settings, 'IMAGE_PIPELINE', {}),
+    }
+
+
+def render_variants(data, widths, formats, quality):
+    """
+    Redimensionne l'image `data` (octets) à chaque largeur, sans jamais
+    l'agrandir, et l'encode dans chaque format.
+    Retourne [(largeur, hauteur, format, octets)]. Exécuté dans le pool.
+    """
+    from PIL import Image, ImageOps
+
+    with Image.open(io.BytesIO(data)) as source:
+        source = ImageOps.exif_transpose(source)
+        if source.mode not in ('RGB', 'RGBA'):
+            source = source.convert('RGBA' if 'transparency' in source.info else 'RGB')
+        rendered = []
+        for width in sorted({min(width, source.width) for width in widths}):
+            height = max(1, round(source.height * width / source.width))
+            resized = source if width == source.width else source.resize(
+                (width, height), Image.Resampling.LANCZOS, reducing_gap=3.0
+            )
+            for image_format in formats:
+                buffer = io.BytesIO()
+                if image_format == 'jpeg':
+                    resized.convert('RGB').save(buffer, 'JPEG', quality=quality, optimize=True, progressive=True)
+                else:
+                    resized.save(buffer, 'WEBP', quality=quality, method=4)
+                rendered.append((width, height, image_format, buffer.getvalue()))
+    return rendered
+
+
+def variant_path(content, image_format):
+    digest = hashlib.sha256(content).hexdigest()
+    return f'{VARIANTS_DIR}/{digest[:2]}/{digest[2:]}.{EXTENSIONS[image_format]}'
+
+
+def store_variants(rendered):
+    """Écrit les déclinaisons absentes du stockage ; retourne leurs entrées"""
+    entries = []
+    for width, height, image_format, content in rendered:
+        path = variant_path(content, image_format)
+        if not default_storage.exists(path):
+            path = default_storage.save(path, ContentFile(content))
+        entries.append({'path': path, 'width': width, 'height': height, 'format': image_format})
+    return entries
+
+
+def tripadvisor_variants(photo):
+    """Entrées des tailles fournies par TripAdvisor pour une photo"""
+    entries = []
+    for size in TRIPADVISOR_SIZES:
+        image = photo.get('images', {}).get(size) or {}
+        try:
+            width, height = int(image.get('width') or 0), int(image.get('height') or 0)
+        except (TypeError, ValueError):
+            continue
+        if image.get('url') and width and height:
+            entries.append({'url': image['url'], 'width': width, 'height': height, 'format': 'jpeg'})
+    return entries
+
+
+def entry_url(entry, request=None):
+    url = entry.get('url') or default_storage.url(entry['path'])
+    # /media/… absolu : le frontend est servi depuis une autre origine
+    return request.build_absolute_uri(url) if request is not None else url
+
+
+def _by_width(entries, image_format):
+    chosen = [entry for entry in entries if entry['format'] == image_format] or entries
+    return sorted(chosen, key=lambda entry: entry['width'])
+
+
+def default_src(entries, request=None):
+    """URL JPEG de la taille « card » (ou la plus grande en deçà) : src des clients sans srcset"""
+    card = image_pipeline_settings()['SIZES']['card']
+    candidates = _by_width(entries, 'jpeg')
+    return entry_url(next((entry for entry in candidates if entry['width'] >= card), candidates[-1]), request)
+
+
+def srcset(entries, request=None):
+    """Attribut srcset, en WebP si disponible : « url 160w, url 480w, … »"""
+    seen, candidates = set(), []
+    for entry in _by_width(entries, 'webp'):
+        if entry['width'] not in seen:
+            seen.add(entry['width'])
+            candidates.append(f"{entry_url(entry, request)} {entry['width']}w")
+    return ', '.join(candidates)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def pool():
+    """Pool de MAX_WORKERS processus, créé au premier envoi"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn : pas de copie des connexions et threads du process web
+            _pool = ProcessPoolExecutor(
+                max_workers=image_pipeline_settings()['MAX_WORKERS'],
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+        return _pool
+
+
+def _discard_pool(broken):
+    global _pool
+    with _pool_lock:
+        if _pool is broken:
+            _pool = None
+
+
+def prepare(image, force=False):
+    """
+    (empreinte, arguments de render_variants) pour une AttractionImage,
+    ou None si ses déclinaisons correspondent déjà au fichier actuel.
+    """
+    if not image.image_file:
+        return None
+    with image.image_file.open('rb') as file:
+        data = file.read()
+    checksum = hashlib.sha256(data).hexdigest()
+    if checksum == image.checksum and image.variants and not force:
+        return None
+    config = image_pipeline_settings()
+    return checksum, (data, sorted(config['SIZES'].values()), config['FORMATS'], config['QUALITY'])
+
+
+def process(image_id):
+    """Génère les déclinaisons d'une AttractionImage. Appelé après le commit de l'envoi."""
+    from .models import AttractionImage
+
+    image = AttractionImage.objects.filter(pk=image_id).first()
+    prepared = prepare(image) if image is not None else None
+    if prepared is None:
+        return
+    checksum, args = prepared
+    if not image_pipeline_settings()['BACKGROUND']:
+        save_variants(image_id, checksum, render_variants(*args))
+        return
+    executor = pool()
+    try:
+        future = executor.submit(render_variants, *args)
+    except BrokenProcessPool:
+        _discard_pool(executor)
+        raise
+    caller = threading.current_thread()
+    future.add_done_callback(lambda future: _rendered(image_id, checksum, executor, future, caller))
+
+
+def _rendered(image_id, checksum, executor, future, caller):
+    # Appelé par le thread de gestion du pool (ou par l'appelant si le
+    # résultat était déjà prêt) : seule une connexion propre à ce thread est fermée
+    try:
+        save_variants(image_id, checksum, future.result())
+    except BrokenProcessPool:
+        _discard_pool(executor)
+        logger.exception("Pool d'images interrompu (image %s)", image_id)
+    except Exception:
+        logger.exception("Déclinaisons impossibles pour l'image %s", image_id)
+    finally:
+        if threading.current_thread() is not caller:
+            connection.close()
+
+
+def save_variants(image_id, checksum, rendered):
+    from .models import AttractionImage
+
+    entries = store_variants(rendered)
+    attraction_id = AttractionImage.objects.filter(pk=image_id).values_list('attraction_id', flat=True).first()
+    if attraction_id is None:
+        return  # image supprimée entre-temps
+    AttractionImage.objects.filter(pk=image_id).update(variants=entries, checksum=checksum)
+    refresh_main_image(attraction_id)
+
+
+def refresh_main_image(attraction_id):
+    """
+    Attraction sans photo TripAdvisor : son image principale devient la
+    première image envoyée déjà déclinée.
+    """
+    from . import caching
+    from .models import Attraction, AttractionImage
+
+    images = Attraction.objects.filter(pk=attraction_id).values_list('images', flat=True).first()
+    if images is None or images:
+        return
+    uploaded = AttractionImage.objects.filter(attraction_id=attraction_id).only('variants')
+    variants = next((image.variants for image in uploaded if image.variants), [])
+    Attraction.objects.filter(pk=attraction_id).update(image_variants=variants)
+    caching.bump('attraction')
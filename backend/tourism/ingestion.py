@@ -0,0 +1,97 @@
+from django.db import transaction
+from . import caching, similarity, suggest
+from .counters import recount_countries
+from .geo import geohash_encode
+from .images import tripadvisor_variants
+from .models import Attraction
+
+
+# Champs d'Attraction renseignés depuis /location/{id}/details
+DETAILS_FIELDS = {
+    'name': ('name',),
+    'description': ('description',),
+    'city': ('address_obj', 'city'),
+    'address': ('address_obj', 'address_string'),
+    'latitude': ('latitude',),
+    'longitude': ('longitude',),
+    'phone': ('phone',),
+    'website': ('website',),
+    'rating': ('rating',),
+    'num_reviews': ('num_reviews',),
+    'num_photos': ('photo_count',),
+}
+
+
+def fields_from_details(details, photos=None):
+    """
+    Valeurs d'Attraction tirées des détails (et photos) TripAdvisor.
+    Seuls les champs présents dans la réponse sont retournés.
+    """
+    fields = {}
+    for field, path in DETAILS_FIELDS.items():
+        value = details
+        for key in path:
+            value = value.get(key) if isinstance(value, dict) else None
+        if value is not None:
+            fields[field] = value
+    fields['awards'] = details.get('awards', [])
+    if photos is not None:
+        data = photos.get('data', [])
+        fields['images'] = [p['images']['original']['url'] for p in data]
+        # Tailles déjà réduites par TripAdvisor, pour le srcset de l'image principale
+        fields['image_variants'] = tripadvisor_variants(data[0]) if data else []
+    return fields
+
+
+def upsert_attractions(rows, update_fields):
+    """
+    Crée ou met à jour des attractions en lot, à partir de dictionnaires
+    de champs contenant au moins `tripadvisor_id`.
+
+    Nombre de requêtes constant quel que soit le nombre de lignes : une
+    lecture de l'existant, un INSERT ... ON CONFLICT DO UPDATE (seules les
+    colonnes `update_fields` sont écrasées), le recalcul des compteurs des
+    pays touchés et la relecture des lignes. Retourne les attractions dans
+    l'ordre de `rows`.
+    """
+    by_id = {}
+    for row in rows:
+        if row.get('tripadvisor_id'):
+            by_id[str(row['tripadvisor_id'])] = row
+    if not by_id:
+        return []
+    ids = list(by_id)
+    # Comme Attraction.save : le geohash ne suit que des coordonnées écrasées
+    spatial_fields = ['geohash'] if {'latitude', 'longitude'} & set(update_fields) else []
+
+    attractions = []
+    for tripadvisor_id, row in by_id.items():
+        attraction = Attraction(**{**row, 'tripadvisor_id': tripadvisor_id})
+        # bulk_create ne passe pas par save() : geohash calculé ici
+        attraction.geohash = geohash_encode(attraction.latitude, attraction.longitude)
+        attractions.append(attraction)
+
+    with transaction.atomic():
+        previous = Attraction.objects.filter(tripadvisor_id__in=ids).values_list('country_id', 'is_active')
+        touched = {country_id for country_id, is_active in previous if is_active}
+
+        Attraction.objects.bulk_create(
+            attractions,
+            update_conflicts=True,
+            unique_fields=['tripadvisor_id'],
+            update_fields=[*update_fields, *spatial_fields, 'updated_at'],
+        )
+
+        persisted = Attraction.objects.filter(
+            tripadvisor_id__in=ids
+        ).select_related('country', 'category')
+        persisted = {attraction.tripadvisor_id: attraction for attraction in persisted}
+
+        # Les signaux ne sont pas émis par bulk_create : compteurs recalculés
+        touched |= {attraction.country_id for attraction in persisted.values()}
+        recount_countries(touched)
+        similarity.invalidate_linking([attraction.pk for attraction in persisted.values()])
+        caching.bump('attraction')
+        transaction.on_commit(lambda: suggest.index.update(persisted.values()))
+
+    return [persisted[tripadvisor_id] for tripadvisor_id in ids]
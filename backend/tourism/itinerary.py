@@ -0,0 +1,372 @@
+import math
+import time
+from collections import namedtuple
+import numpy as np
+from .geo import EARTH_RADIUS_KM
+
+MATRIX_LIMIT = 2500  # au-delà, pas de matrice complète (n² flottants en mémoire)
+NEIGHBOURS = 8  # voisins candidats examinés par 2-opt / Or-opt
+NEIGHBOUR_BLOCK_CELLS = 2 ** 20  # distances calculées par bloc de lignes (8 Mo)
+EXACT_NEIGHBOURS_LIMIT = 4000  # au-delà, voisins candidats approchés (coût linéaire)
+GREEDY_LIMIT = 4000  # au-delà, tour initial le long d'une courbe de Hilbert
+CURVE_WINDOW = 8  # voisins approchés : nœuds proches sur les courbes de Hilbert
+HILBERT_BITS = 16
+OR_OPT_SEGMENTS = (1, 2, 3)
+DEFAULT_TIME_BUDGET = 0.5  # secondes d'amélioration maximum
+DUMMY_DISTANCE = 1e6  # km, coût constant de l'extrémité libre d'un trajet ouvert
+
+Route = namedtuple('Route', ['order', 'legs', 'total_distance'])
+
+
+def _haversine_from(coords, i, targets=None):
+    """Distances (km) du nœud i vers `targets` (tous les nœuds par défaut)"""
+    lat1, lon1 = coords[i]
+    others = coords if targets is None else coords[targets]
+    dlat = others[:, 0] - lat1
+    dlon = others[:, 1] - lon1
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(others[:, 0]) * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+class _Distances:
+    """
+    Distances entre nœuds : matrice vectorisée pour les petites entrées,
+    calcul à la demande au-delà de MATRIX_LIMIT (mémoire linéaire).
+
+    Le nœud fictif `dummy` (trajet ouvert) est à distance nulle de `anchor`
+    (le départ imposé) et à une distance constante de tous les autres : il
+    reste collé au départ et l'autre extrémité du trajet est libre.
+    Sans `anchor`, il est à distance nulle de tous les nœuds.
+    """
+
+    def __init__(self, coords, dummy=None, anchor=None):
+        self.coords = coords
+        self.dummy = dummy
+        self.anchor = anchor
+        self.size = len(coords) + (dummy is not None)
+        self.free_end = 0.0 if anchor is None else DUMMY_DISTANCE
+        self.matrix = None
+        self.points = coords.tolist()  # accès scalaire rapide, hors numpy
+        if self.size <= MATRIX_LIMIT:
+            lat = coords[:, 0][:, None]
+            lon = coords[:, 1][:, None]
+            a = (np.sin((lat - lat.T) / 2) ** 2 +
+                 np.cos(lat) * np.cos(lat.T) * np.sin((lon - lon.T) / 2) ** 2)
+            matrix = 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+            if dummy is not None:
+                matrix = np.pad(matrix, ((0, 1), (0, 1)), constant_values=self.free_end)
+                matrix[dummy, dummy] = 0.0
+                if anchor is not None:
+                    matrix[dummy, anchor] = matrix[anchor, dummy] = 0.0
+            self.matrix = matrix
+
+    def _to_dummy(self, other):
+        if other == self.dummy or other == self.anchor:
+            return 0.0
+        return self.free_end
+
+    def __call__(self, i, j):
+        if self.matrix is not None:
+            return self.matrix[i, j]
+        if i == self.dummy:
+            return self._to_dummy(j)
+        if j == self.dummy:
+            return self._to_dummy(i)
+        (lat1, lon1), (lat2, lon2) = self.points[i], self.points[j]
+        a = (math.sin((lat2 - lat1) / 2) ** 2 +
+             math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2)
+        return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+    def legs(self, stops):
+        """Distances (km) entre nœuds réels consécutifs de `stops`, en un calcul vectorisé"""
+        a, b = np.asarray(stops[:-1], dtype=int), np.asarray(stops[1:], dtype=int)
+        if self.matrix is not None:
+            return self.matrix[a, b].tolist()
+        (lat1, lon1), (lat2, lon2) = self.coords[a].T, self.coords[b].T
+        h = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+        return (2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(h, 0.0, 1.0)))).tolist()
+
+    def row(self, i):
+        if self.matrix is not None:
+            return self.matrix[i].copy()
+        if i == self.dummy:
+            row = np.full(self.size, self.free_end)
+            row[i] = 0.0
+            if self.anchor is not None:
+                row[self.anchor] = 0.0
+            return row
+        row = _haversine_from(self.coords, i)
+        if self.dummy is not None:
+            row = np.append(row, self._to_dummy(i))
+        return row
+
+    def neighbours(self, k):
+        """Les k plus proches voisins de chaque nœud, calculés par blocs de lignes"""
+        k = min(k, self.size - 1)
+        if k <= 0:
+            return [[] for _ in range(self.size)]
+        real = len(self.coords)
+        if self.matrix is None:
+            # Sans matrice : l'ordre des distances haversine est l'ordre
+            # décroissant du produit scalaire des vecteurs unitaires (un produit matriciel)
+            lat, lon = self.coords[:, 0], self.coords[:, 1]
+            unit = np.column_stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)])
+        if self.matrix is None and real > EXACT_NEIGHBOURS_LIMIT:
+            nearest = _curve_neighbours(self.coords, unit, min(k, real - 1))
+        else:
+            nearest = []
+            step = max(1, NEIGHBOUR_BLOCK_CELLS // real)
+            for lo in range(0, real, step):
+                hi = min(lo + step, real)
+                rows = self.matrix[lo:hi, :real].copy() if self.matrix is not None else -(unit[lo:hi] @ unit.T)
+                rows[np.arange(hi - lo), np.arange(lo, hi)] = np.inf
+                nearest.extend(_smallest(rows, min(k, real - 1)))
+        result = []
+        for i, candidates in enumerate(nearest):
+            # Nœud fictif : voisin à distance nulle, ou dernier recours
+            if self.dummy is not None and (self._to_dummy(i) == 0.0 or len(candidates) < k):
+                candidates = [self.dummy] + candidates[:k - 1]
+            result.append(candidates)
+        if self.dummy is not None:
+            row = self.row(self.dummy)
+            row[self.dummy] = np.inf
+            result.extend(_smallest(row[None, :], k))
+        return result
+
+
+def _smallest(rows, k):
+    """Indices des k plus petites valeurs de chaque ligne, dans l'ordre"""
+    if k <= 0:
+        return [[] for _ in rows]
+    nearest = np.argpartition(rows, k - 1, axis=1)[:, :k]
+    order = np.take_along_axis(rows, nearest, axis=1).argsort(axis=1)
+    return np.take_along_axis(nearest, order, axis=1).tolist()
+
+
+def _hilbert_order(coords, shift=0.0):
+    """
+    Indices des nœuds le long d'une courbe de Hilbert (projection
+    équirectangulaire) : des nœuds proches sur la courbe sont proches sur le
+    terrain. `shift` décale la grille (fraction de son côté) pour une seconde courbe.
+    """
+    y = coords[:, 0]
+    x = coords[:, 1] * np.cos(y.mean())
+    side = max(np.ptp(x), np.ptp(y)) or 1.0
+    cells = 2 ** HILBERT_BITS
+    gx = ((((x - x.min()) / side + shift) % 1.0) * (cells - 1)).astype(np.int64)
+    gy = ((((y - y.min()) / side + shift) % 1.0) * (cells - 1)).astype(np.int64)
+    d = np.zeros(len(coords), dtype=np.int64)
+    s = cells // 2
+    while s > 0:
+        rx = (gx & s) > 0
+        ry = (gy & s) > 0
+        d += s * s * ((3 * rx) ^ ry)
+        # Rotation du quadrant (xy2d classique, vectorisé)
+        flip = ~ry & rx
+        gx = np.where(flip, cells - 1 - gx, gx)
+        gy = np.where(flip, cells - 1 - gy, gy)
+        gx, gy = np.where(~ry, gy, gx), np.where(~ry, gx, gy)
+        s //= 2
+    return np.argsort(d, kind='stable')
+
+
+def _curve_neighbours(coords, unit, k):
+    """
+    k plus proches voisins approchés : choisis parmi les CURVE_WINDOW
+    nœuds de part et d'autre sur deux courbes de Hilbert décalées.
+    Coût linéaire, pour les entrées où les blocs de distances coûtent trop.
+    """
+    n = len(coords)
+    own = np.arange(n)
+    candidates = []
+    for shift in (0.0, 1 / 3):
+        order = _hilbert_order(coords, shift)
+        rank = np.empty(n, dtype=np.int64)
+        rank[order] = own
+        for offset in range(1, CURVE_WINDOW + 1):
+            candidates.append(order[np.clip(rank - offset, 0, n - 1)])
+            candidates.append(order[np.clip(rank + offset, 0, n - 1)])
+    candidates = np.stack(candidates, axis=1)
+    candidates.sort(axis=1)
+    scores = -np.einsum('ij,imj->im', unit, unit[candidates])
+    # Le nœud lui-même (bords de courbe) et les doublons sont écartés
+    scores[candidates == own[:, None]] = np.inf
+    scores[:, 1:][candidates[:, 1:] == candidates[:, :-1]] = np.inf
+    nearest = np.take_along_axis(candidates, np.array(_smallest(scores, k)), axis=1)
+    valid = np.take_along_axis(scores, np.array(_smallest(scores, k)), axis=1) < np.inf
+    return [row[keep].tolist() for row, keep in zip(nearest, valid)]
+
+
+def _curve_tour(dist, first):
+    """
+    Tour initial le long d'une courbe de Hilbert, en O(n log n) : remplace
+    le plus proche voisin au-delà de GREEDY_LIMIT nœuds.
+    """
+    order = _hilbert_order(dist.coords).tolist()
+    if first == dist.dummy:
+        return [first] + order
+    idx = order.index(first)
+    tour = order[idx:] + order[:idx]
+    if dist.dummy is not None:
+        tour.append(dist.dummy)
+    return tour
+
+
+def _nearest_neighbour_tour(dist, first, neighbours=None):
+    """
+    Tour glouton du plus proche voisin. Le plus proche non visité est
+    cherché parmi les voisins candidats, puis sur toute la ligne de
+    distances seulement si tous sont déjà visités.
+    """
+    visited = np.zeros(dist.size, dtype=bool)
+    tour = [first]
+    visited[first] = True
+    current = first
+    for _ in range(dist.size - 1):
+        candidate = None
+        if neighbours is not None:
+            candidate = next((c for c in neighbours[current] if not visited[c]), None)
+        if candidate is None:
+            row = dist.row(current)
+            row[visited] = np.inf
+            candidate = int(np.argmin(row))
+        current = candidate
+        visited[current] = True
+        tour.append(current)
+    return tour
+
+
+def _two_opt(tour, dist, neighbours, deadline):
+    """Amélioration 2-opt (tour fermé) limitée aux voisins candidats"""
+    n = len(tour)
+    position = [0] * n
+    for idx, node in enumerate(tour):
+        position[node] = idx
+
+    improved = False
+    for i in range(n):
+        if time.monotonic() > deadline:
+            break
+        a = tour[i]
+        b = tour[(i + 1) % n]
+        d_ab = dist(a, b)
+        for c in neighbours[a]:
+            d_ac = dist(a, c)
+            if d_ac >= d_ab:
+                break
+            j = position[c]
+            d = tour[(j + 1) % n]
+            if c == b or d == a:
+                continue
+            delta = d_ac + dist(b, d) - d_ab - dist(c, d)
+            if delta < -1e-9:
+                # Inverse le segment b..c
+                lo, hi = (i + 1, j) if i < j else (j + 1, i)
+                tour[lo:hi + 1] = tour[lo:hi + 1][::-1]
+                for idx in range(lo, hi + 1):
+                    position[tour[idx]] = idx
+                improved = True
+                a, b = tour[i], tour[(i + 1) % n]
+                d_ab = dist(a, b)
+    return improved
+
+
+def _or_opt(tour, dist, neighbours, deadline):
+    """Déplace des segments de 1 à 3 nœuds entre deux voisins plus proches"""
+    n = len(tour)
+    improved = False
+    for length in OR_OPT_SEGMENTS:
+        if length >= n - 2:
+            break
+        position = {node: idx for idx, node in enumerate(tour)}
+        for i in range(n):
+            if time.monotonic() > deadline:
+                return improved
+            segment = tour[i:i + length]
+            if len(segment) < length:
+                break
+            prev = tour[i - 1]
+            nxt = tour[(i + length) % n]
+            gain = dist(prev, segment[0]) + dist(segment[-1], nxt) - dist(prev, nxt)
+
+            best = None
+            for c in set(neighbours[segment[0]] + neighbours[segment[-1]]):
+                if c in segment:
+                    continue
+                # Successeur de c une fois le segment retiré
+                e = tour[(position[c] + 1) % n]
+                if e == segment[0]:
+                    e = nxt
+                forward = dist(c, segment[0]) + dist(segment[-1], e) - dist(c, e)
+                backward = dist(c, segment[-1]) + dist(segment[0], e) - dist(c, e)
+                cost, reverse = min((forward, False), (backward, True))
+                if cost < gain - 1e-9 and (best is None or cost < best[0]):
+                    best = (cost, c, reverse)
+
+            if best is not None:
+                _, c, reverse = best
+                rest = tour[:i] + tour[i + length:]
+                idx = rest.index(c)
+                moved = segment[::-1] if reverse else segment
+                tour[:] = rest[:idx + 1] + moved + rest[idx + 1:]
+                position = {node: idx for idx, node in enumerate(tour)}
+                improved = True
+    return improved
+
+
+def plan_route(points, start=None, return_to_start=False, time_budget=DEFAULT_TIME_BUDGET):
+    """
+    Ordre de visite optimisé des `points` [(lat, lon), ...].
+
+    Tour initial par plus proche voisin (le long d'une courbe de Hilbert
+    au-delà de GREEDY_LIMIT nœuds) puis améliorations 2-opt / Or-opt
+    jusqu'à l'échéance de `time_budget` secondes, comptée dès l'appel :
+    distances, voisins candidats et tour initial l'entament aussi, et
+    restent quasi linéaires pour les grandes entrées. `start` fixe le point de
+    départ (position de l'utilisateur) ; `return_to_start` ferme la boucle.
+
+    Retourne Route(order, legs, total_distance) : indices dans `points`,
+    distance de chaque étape (km) et distance totale.
+    """
+    if not points:
+        return Route([], [], 0.0)
+
+    deadline = time.monotonic() + time_budget
+    nodes = list(points)
+    first = 0
+    if start is not None:
+        nodes.insert(0, start)
+    offset = 1 if start is not None else 0
+
+    coords = np.radians(np.asarray(nodes, dtype=float))
+    # Trajet ouvert : un nœud fictif à distance nulle relie la fin au départ
+    dummy = len(nodes) if not return_to_start else None
+    dist = _Distances(coords, dummy, anchor=0 if start is not None else None)
+    if start is None and dummy is not None:
+        first = dummy
+
+    # Voisins candidats d'abord : ils évitent au tour glouton une ligne de distances par étape
+    neighbours = dist.neighbours(NEIGHBOURS) if dist.size > 3 else None
+    if dist.size <= GREEDY_LIMIT:
+        tour = _nearest_neighbour_tour(dist, first, neighbours)
+    else:
+        # Le glouton coûte une ligne de distances à chaque impasse : trop pour une grande entrée
+        tour = _curve_tour(dist, first)
+    if neighbours is not None:
+        while time.monotonic() < deadline:
+            improved = _two_opt(tour, dist, neighbours, deadline)
+            improved = _or_opt(tour, dist, neighbours, deadline) or improved
+            if not improved:
+                break
+
+    # Remet le tour dans l'ordre : départ en tête, nœud fictif en queue
+    idx = tour.index(first)
+    tour = tour[idx:] + tour[:idx]
+    if dummy is not None and first != dummy and tour[1] == dummy:
+        tour = [tour[0]] + tour[1:][::-1]
+    sequence = [node for node in tour if node != dummy]
+
+    order = [node - offset for node in sequence if node >= offset]
+    stops = sequence + [sequence[0]] if return_to_start else sequence
+    legs = dist.legs(stops)
+    return Route(order, legs, sum(legs))
@@ -0,0 +1,202 @@
+import threading
+import weakref
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from .models import PROFILE_CATEGORIES, Attraction, Leaderboard
+
+LEADERBOARD_SIZE = 100
+CACHE_TIMEOUT = 10 * 60
+# Ordre de popularité, identique en base (repli) et dans les classements
+POPULARITY_ORDERING = ['-num_likes', '-rating', '-saves_count', '-num_reviews', 'id']
+ENTRY_FIELDS = ['id', 'num_likes', 'rating', 'saves_count', 'num_reviews']
+
+# Lot en attente de commit (par thread, donc par connexion) : référence faible vers un _Batch
+_scheduled = threading.local()
+
+
+def _sort_key(entry):
+    pk, num_likes, rating, saves_count, num_reviews = entry
+    # Note NULL en dernier, comme en SQL (DESC)
+    return (-num_likes, -(rating if rating is not None else float('-inf')), -saves_count, -num_reviews, pk)
+
+
+def _entry(row):
+    rating = float(row['rating']) if row['rating'] is not None else None
+    return [row['id'], row['num_likes'], rating, row['saves_count'], row['num_reviews']]
+
+
+def _boards_for(row):
+    """Clés (pays, ville, profil) des classements où figure l'attraction"""
+    profiles = [''] + [
+        profile for profile, categories in PROFILE_CATEGORIES.items()
+        if row['category__name'] in categories
+    ]
+    cities = [''] + ([row['city']] if row['city'] else [])
+    return [
+        (row['country_id'], city, profile)
+        for city in cities
+        for profile in profiles
+    ]
+
+
+def _cache_key(country_id, city, profile_type):
+    return f'leaderboard:{country_id}:{city.casefold()}:{profile_type}'
+
+
+def top_ids(country_id, city='', profile_type=''):
+    """
+    Identifiants du classement, du plus populaire au moins populaire ;
+    None si ce classement n'a pas encore été construit.
+    """
+    key = _cache_key(country_id, city, profile_type)
+    ids = cache.get(key)
+    if ids is None:
+        board = Leaderboard.objects.filter(
+            country_id=country_id, city__iexact=city, profile_type=profile_type
+        ).values_list('entries', flat=True).first()
+        # Absence mise en cache aussi : le repli ne coûte pas une requête de plus
+        ids = [entry[0] for entry in board] if board is not None else False
+        cache.set(key, ids, CACHE_TIMEOUT)
+    return ids if ids is not False else None
+
+
+def _cities_key(country_id):
+    return f'leaderboard:{country_id}:cities'
+
+
+def cities(country_id):
+    """Villes ayant un classement dans le pays"""
+    key = _cities_key(country_id)
+    names = cache.get(key)
+    if names is None:
+        names = list(Leaderboard.objects.filter(
+            country_id=country_id, profile_type=''
+        ).exclude(city='').values_list('city', flat=True))
+        cache.set(key, names, CACHE_TIMEOUT)
+    return names
+
+
+def covers_city_filter(country_id, city):
+    """
+    Vrai si le filtre partiel `city` (city__icontains du repli) ne retient
+    qu'une ville, celle de son classement : 'paris' ne passe pas par le
+    classement de Paris si Cormeilles-en-Parisis a aussi le sien.
+    """
+    needle = city.casefold()
+    return {name.casefold() for name in cities(country_id) if needle in name.casefold()} == {needle}
+
+
+def _cache_boards(boards):
+    """Met en cache les classements écrits, pour que la lecture suivante ne touche pas la base"""
+    cache.set_many({
+        _cache_key(country_id, city, profile): [entry[0] for entry in entries]
+        for (country_id, city, profile), entries in boards.items()
+    }, CACHE_TIMEOUT)
+
+
+def rebuild(country_ids=None):
+    """
+    Reconstruit les classements depuis la table des attractions (tous les
+    pays par défaut) : un tri par pays, réparti entre ses classements.
+    """
+    attractions = Attraction.objects.filter(is_active=True)
+    if country_ids is not None:
+        attractions = attractions.filter(country_id__in=country_ids)
+    rows = attractions.order_by(*POPULARITY_ORDERING).values(
+        *ENTRY_FIELDS, 'country_id', 'city', 'category__name'
+    )
+
+    boards = {}
+    for row in rows.iterator():
+        for key in _boards_for(row):
+            entries = boards.setdefault(key, [])
+            if len(entries) < LEADERBOARD_SIZE:
+                entries.append(_entry(row))
+
+    countries = {key[0] for key in boards} | set(country_ids or ())
+    with transaction.atomic():
+        previous = Leaderboard.objects.filter(country_id__in=countries)
+        stale_keys = [_cache_key(*key) for key in previous.values_list('country_id', 'city', 'profile_type')]
+        stale_keys += [_cities_key(country_id) for country_id in countries]
+        previous.delete()
+        Leaderboard.objects.bulk_create([
+            Leaderboard(country_id=country_id, city=city, profile_type=profile, entries=entries)
+            for (country_id, city, profile), entries in boards.items()
+        ], batch_size=500)
+    cache.delete_many(stale_keys)
+    _cache_boards(boards)
+    return len(boards)
+
+
+def record(attraction_ids):
+    """
+    Repositionne des attractions dans leurs classements après un like ou une
+    sauvegarde (ou un changement de statut). Seuls les classements déjà
+    construits sont mis à jour ; les écarts éventuels (écritures
+    concurrentes) sont corrigés par la reconstruction périodique.
+    """
+    rows = list(Attraction.objects.filter(pk__in=attraction_ids).values(
+        *ENTRY_FIELDS, 'is_active', 'country_id', 'city', 'category__name'
+    ))
+    if not rows:
+        return
+    by_board = {}
+    for row in rows:
+        for key in _boards_for(row):
+            by_board.setdefault(key, []).append(row)
+    condition = Q()
+    for country_id, city, profile in by_board:
+        condition |= Q(country_id=country_id, city=city, profile_type=profile)
+
+    changed = []
+    for board in Leaderboard.objects.filter(condition):
+        entries = board.entries
+        for row in by_board[(board.country_id, board.city, board.profile_type)]:
+            entries = [entry for entry in entries if entry[0] != row['id']]
+            if not row['is_active']:
+                continue
+            entry = _entry(row)
+            if len(entries) < LEADERBOARD_SIZE or _sort_key(entry) < _sort_key(entries[-1]):
+                entries.append(entry)
+                entries.sort(key=_sort_key)
+                del entries[LEADERBOARD_SIZE:]
+        if entries != board.entries:
+            board.entries = entries
+            board.updated_at = timezone.now()
+            changed.append(board)
+
+    Leaderboard.objects.bulk_update(changed, ['entries', 'updated_at'])
+    _cache_boards({(board.country_id, board.city, board.profile_type): board.entries for board in changed})
+
+
+class _Batch:
+    """
+    Attractions à repositionner au commit d'une transaction. Seul son rappel
+    on_commit la retient : si la transaction (ou le savepoint) est annulée,
+    Django oublie le rappel et le lot disparaît avec lui.
+    """
+
+    def __init__(self, attraction_ids):
+        self.ids = set(attraction_ids)
+        self.done = False
+
+    def __call__(self):
+        self.done = True
+        record(self.ids)
+
+
+def schedule(attraction_ids):
+    """
+    record() différé au commit de la transaction en cours (immédiat hors
+    transaction) : hors du verrou d'écriture du like, et une seule fois
+    pour toutes les attractions touchées par la transaction.
+    """
+    batch = _scheduled.batch() if getattr(_scheduled, 'batch', None) else None
+    if batch is None or batch.done:
+        batch = _Batch(attraction_ids)
+        _scheduled.batch = weakref.ref(batch)
+        transaction.on_commit(batch)
+    else:
+        batch.ids.update(attraction_ids)
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from tourism.models import Attraction
+from tourism.similarity import compute_similar, stale_attractions
+
+
+class Command(BaseCommand):
+    help = (
+        "Précalcule les attractions similaires. Par défaut, seules celles "
+        "modifiées depuis le dernier calcul (à lancer périodiquement)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help="Recalcule toutes les attractions actives")
+        parser.add_argument('--country', action='append', dest='countries', metavar='CODE',
+                            help="Limite à un pays (répétable)")
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        attractions = Attraction.objects.all() if options['all'] else stale_attractions()
+        if options['countries']:
+            attractions = attractions.filter(country__code__in=[code.upper() for code in options['countries']])
+        done = compute_similar(attractions, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"{done} attractions recalculées"))
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from tourism import counters
+
+
+class Command(BaseCommand):
+    help = "Écrit en base les likes / sauvegardes tamponnés dans le cache"
+
+    def handle(self, *args, **options):
+        flushed = counters.flush()
+        self.stdout.write(self.style.SUCCESS(f"{flushed} compteurs écrits"))
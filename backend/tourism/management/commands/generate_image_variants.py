@@ -0,0 +1,45 @@
+from concurrent.futures import FIRST_COMPLETED, wait
+from django.core.management.base import BaseCommand
+from tourism import images
+from tourism.models import AttractionImage
+
+
+class Command(BaseCommand):
+    help = (
+        "Génère les déclinaisons (miniature, carte, bannière ; WebP et JPEG) "
+        "des images envoyées qui n'en ont pas encore, dans le pool de processus."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true',
+                            help="Régénère aussi les images déjà déclinées (après un changement de tailles)")
+
+    def handle(self, *args, **options):
+        queryset = AttractionImage.objects.order_by('pk')
+        if not options['force']:
+            queryset = queryset.filter(checksum='')
+        config = images.image_pipeline_settings()
+        # Fichiers sources en mémoire : quelques envois d'avance par processus, pas plus
+        window = config['MAX_WORKERS'] * 2
+        pending, done = {}, 0
+
+        for image in queryset.iterator():
+            prepared = images.prepare(image, force=options['force'])
+            if prepared is None:
+                continue
+            checksum, render_args = prepared
+            if not config['BACKGROUND']:
+                images.save_variants(image.pk, checksum, images.render_variants(*render_args))
+                done += 1
+                continue
+            pending[images.pool().submit(images.render_variants, *render_args)] = (image.pk, checksum)
+            if len(pending) >= window:
+                done += self.collect(pending, wait(pending, return_when=FIRST_COMPLETED).done)
+        done += self.collect(pending, list(pending))
+        self.stdout.write(self.style.SUCCESS(f"{done} images déclinées"))
+
+    def collect(self, pending, futures):
+        for future in futures:
+            image_id, checksum = pending.pop(future)
+            images.save_variants(image_id, checksum, future.result())
+        return len(futures)
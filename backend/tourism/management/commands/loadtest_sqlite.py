@@ -0,0 +1,112 @@
+import random
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+from pathlib import Path
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from tourism.db import apply_pragmas, sqlite_pragmas
+from tourism.models import Attraction
+from tourism.views import shape_for_list
+
+# Configuration par défaut de Django : journal rollback, fsync à chaque commit
+ROLLBACK_PRAGMAS = {'journal_mode': 'DELETE', 'synchronous': 'FULL', 'busy_timeout': 5000}
+
+
+class Command(BaseCommand):
+    help = (
+        "Mesure la latence des lectures de la liste d'attractions pendant une "
+        "rafale de likes concurrents, en journal rollback puis en WAL avec les "
+        "PRAGMA de tourism/db.py. Travaille sur une copie de la base."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=4, help="Threads de lecture")
+        parser.add_argument('--writers', type=int, default=2, help="Threads d'écriture (un like par transaction)")
+        parser.add_argument('--duration', type=float, default=5.0, help="Secondes par scénario")
+
+    def handle(self, *args, **options):
+        connection = connections['default']
+        if connection.vendor != 'sqlite':
+            raise CommandError("Test de charge réservé à SQLite")
+        if connection.in_atomic_block:
+            # La copie (API de sauvegarde SQLite) attendrait indéfiniment la fin de la transaction
+            raise CommandError("Test de charge impossible dans une transaction")
+
+        queryset = shape_for_list(Attraction.objects.filter(is_active=True)).order_by('-num_likes', '-rating')[:20]
+        sql, params = queryset.query.sql_with_params()
+        read_query = (sql.replace('%s', '?'), params)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / 'loadtest.sqlite3'
+            connection.ensure_connection()
+            target = sqlite3.connect(path)
+            connection.connection.backup(target)
+            ids = [row[0] for row in target.execute('SELECT id FROM tourism_attraction')]
+            target.close()
+            if not ids:
+                raise CommandError("Aucune attraction en base : rien à mesurer")
+
+            self.stdout.write(f"{len(ids)} attractions, {options['readers']} lecteurs, "
+                              f"{options['writers']} écrivains, {options['duration']:.1f} s par scénario")
+            for label, pragmas in [('journal rollback', ROLLBACK_PRAGMAS), ('WAL + PRAGMA', sqlite_pragmas())]:
+                latencies, writes = self.run_scenario(path, pragmas, read_query, ids, options)
+                self.report(label, latencies, writes, options['duration'])
+
+    def connect(self, path, pragmas):
+        db = sqlite3.connect(path, timeout=pragmas.get('busy_timeout', 5000) / 1000,
+                             isolation_level=None, check_same_thread=False)
+        apply_pragmas(db.cursor(), pragmas)
+        return db
+
+    def run_scenario(self, path, pragmas, read_query, ids, options):
+        # Le mode de journal est changé seul, avant l'ouverture des autres connexions
+        self.connect(path, pragmas).close()
+        deadline = time.monotonic() + options['duration']
+        latencies, writes, lock = [], [0], threading.Lock()
+
+        def read():
+            db = self.connect(path, pragmas)
+            local = []
+            while time.monotonic() < deadline:
+                start = time.perf_counter()
+                db.execute(*read_query).fetchall()
+                local.append(time.perf_counter() - start)
+            db.close()
+            with lock:
+                latencies.extend(local)
+
+        def write():
+            db = self.connect(path, pragmas)
+            count = 0
+            while time.monotonic() < deadline:
+                db.execute('BEGIN IMMEDIATE')
+                db.execute('UPDATE tourism_attraction SET num_likes = num_likes + 1 WHERE id = ?',
+                           (random.choice(ids),))
+                db.execute('COMMIT')
+                count += 1
+            db.close()
+            with lock:
+                writes[0] += count
+
+        threads = [threading.Thread(target=read) for _ in range(options['readers'])]
+        threads += [threading.Thread(target=write) for _ in range(options['writers'])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return latencies, writes[0]
+
+    def report(self, label, latencies, writes, duration):
+        if len(latencies) < 2:
+            self.stdout.write(f"{label:<18} lectures insuffisantes pour mesurer")
+            return
+        quantiles = statistics.quantiles(latencies, n=100)
+        self.stdout.write(
+            f"{label:<18} {len(latencies) / duration:8.0f} lectures/s  "
+            f"p50 {quantiles[49] * 1000:7.2f} ms  p95 {quantiles[94] * 1000:7.2f} ms  "
+            f"p99 {quantiles[98] * 1000:7.2f} ms  max {max(latencies) * 1000:7.2f} ms  "
+            f"{writes / duration:6.0f} likes/s"
+        )
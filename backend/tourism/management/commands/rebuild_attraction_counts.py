@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from tourism.counters import recount_countries
+
+
+class Command(BaseCommand):
+    help = "Recalcule Country.active_attractions_count depuis la table des attractions"
+
+    def handle(self, *args, **options):
+        updated = recount_countries()
+        self.stdout.write(self.style.SUCCESS(f"{updated} pays mis à jour"))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from tourism import leaderboard
+from tourism.models import Country
+
+
+class Command(BaseCommand):
+    help = (
+        "Reconstruit les classements de popularité (pays, ville, profil) "
+        "depuis les likes, notes et avis. À lancer périodiquement."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--country', action='append', dest='countries', metavar='CODE',
+                            help="Limite à un pays (répétable)")
+
+    def handle(self, *args, **options):
+        country_ids = None
+        if options['countries']:
+            country_ids = list(Country.objects.filter(
+                code__in=[code.upper() for code in options['countries']]
+            ).values_list('id', flat=True))
+        built = leaderboard.rebuild(country_ids)
+        self.stdout.write(self.style.SUCCESS(f"{built} classements reconstruits"))
@@ -0,0 +1,142 @@
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from tourism.ingestion import fields_from_details, upsert_attractions
+from tourism.models import Category, CategoryType, Country
+from tourism.tripAdvisor import TripAdvisorError, TripAdvisorService
+
+# Catégorie TripAdvisor de la recherche pour chaque CategoryType
+SEARCH_CATEGORIES = {
+    CategoryType.RESTAURANT: 'restaurants',
+    CategoryType.HOTEL: 'hotels',
+}
+DEFAULT_SEARCH_CATEGORY = 'attractions'
+
+DEFAULT_CHECKPOINT = os.path.join(settings.BASE_DIR, '.cache', 'sync_tripadvisor.json')
+
+# Champs écrasés à chaque synchronisation (les compteurs locaux sont préservés),
+# s'ils figurent dans la réponse : une partie du lieu en échec (photos...) ou
+# un champ absent des détails laisse la valeur enregistrée intacte
+SYNC_FIELDS = [
+    'country', 'category', 'name', 'description', 'city', 'address',
+    'latitude', 'longitude', 'phone', 'website', 'rating', 'num_reviews',
+    'num_photos', 'images', 'image_variants', 'awards', 'is_active',
+]
+# Champs toujours écrasés, fixés par la tranche synchronisée
+SLICE_FIELDS = ('country', 'category', 'is_active')
+
+
+class Command(BaseCommand):
+    help = (
+        "Synchronise le catalogue depuis TripAdvisor : recherche par pays et "
+        "par catégorie, puis détails et photos de chaque lieu. Reprend là où "
+        "une exécution interrompue s'est arrêtée."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--country', action='append', dest='countries', metavar='CODE',
+                            help="Code pays à synchroniser (répétable, tous par défaut)")
+        parser.add_argument('--category', action='append', dest='categories',
+                            choices=CategoryType.values,
+                            help="Catégorie à synchroniser (répétable, toutes par défaut)")
+        parser.add_argument('--workers', type=int, default=4,
+                            help="Lieux récupérés en parallèle")
+        parser.add_argument('--checkpoint', default=DEFAULT_CHECKPOINT,
+                            help="Fichier de reprise")
+        parser.add_argument('--restart', action='store_true',
+                            help="Ignore le fichier de reprise et recommence tout")
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1:
+            raise CommandError("--workers doit être positif")
+
+        countries = Country.objects.order_by('code')
+        if options['countries']:
+            countries = countries.filter(code__in=[code.upper() for code in options['countries']])
+        category_types = options['categories'] or CategoryType.values
+
+        self.checkpoint = options['checkpoint']
+        done = set() if options['restart'] else self.load_checkpoint()
+        self.service = TripAdvisorService()
+
+        synced = 0
+        with ThreadPoolExecutor(max_workers=options['workers'], thread_name_prefix='sync') as pool:
+            for country in countries:
+                for category_type in category_types:
+                    key = f'{country.code}:{category_type}'
+                    if key in done:
+                        continue
+                    try:
+                        count = self.sync(pool, country, category_type)
+                    except TripAdvisorError as exc:
+                        # Tranche non marquée comme faite : reprise au prochain lancement
+                        self.stderr.write(f"{key} : recherche en échec ({exc})")
+                        continue
+                    done.add(key)
+                    self.save_checkpoint(done)
+                    synced += count
+                    self.stdout.write(f"{key} : {count} lieux")
+
+        self.stdout.write(self.style.SUCCESS(f"{synced} attractions synchronisées"))
+
+    def sync(self, pool, country, category_type):
+        """Synchronise une tranche pays × catégorie, écrite en une transaction"""
+        category, _ = Category.objects.get_or_create(name=category_type)
+        results = self.service.search_locations(
+            CategoryType(category_type).label,
+            country.capital_latitude,
+            country.capital_longitude,
+            category=SEARCH_CATEGORIES.get(category_type, DEFAULT_SEARCH_CATEGORY),
+        )
+        location_ids = [item['location_id'] for item in (results or {}).get('data', []) if item.get('location_id')]
+
+        # Lignes regroupées par ensemble de champs à écraser
+        groups = {}
+        bundles = pool.map(self.fetch, location_ids)
+        for location_id, bundle in zip(location_ids, bundles):
+            details = bundle.get('details')
+            if not details or details.get('latitude') is None or details.get('longitude') is None:
+                # Sans coordonnées réelles, le lieu n'est pas enregistré
+                self.stderr.write(f"{location_id} : détails indisponibles")
+                continue
+            fields = fields_from_details(details, bundle.get('photos'))
+            update_fields = tuple(field for field in SYNC_FIELDS if field in fields or field in SLICE_FIELDS)
+            groups.setdefault(update_fields, []).append({
+                'tripadvisor_id': location_id,
+                'country': country,
+                'category': category,
+                # Valeurs d'un nouveau lieu, si les détails ne les donnent pas
+                'city': country.capital,
+                'address': '',
+                'is_active': True,
+                **fields,
+            })
+
+        with transaction.atomic():
+            return sum(
+                len(upsert_attractions(rows, update_fields=list(update_fields)))
+                for update_fields, rows in groups.items()
+            )
+
+    def fetch(self, location_id):
+        return self.service.get_location_bundle(location_id, parts=('details', 'photos'))
+
+    def load_checkpoint(self):
+        try:
+            with open(self.checkpoint) as f:
+                return set(json.load(f).get('done', []))
+        except FileNotFoundError:
+            return set()
+        except ValueError:
+            raise CommandError(f"Fichier de reprise illisible : {self.checkpoint} (utiliser --restart)")
+
+    def save_checkpoint(self, done):
+        # Écriture atomique : un arrêt brutal ne laisse jamais un fichier tronqué
+        os.makedirs(os.path.dirname(os.path.abspath(self.checkpoint)), exist_ok=True)
+        tmp = f'{self.checkpoint}.tmp'
+        with open(tmp, 'w') as f:
+            json.dump({'done': sorted(done)}, f)
+        os.replace(tmp, self.checkpoint)
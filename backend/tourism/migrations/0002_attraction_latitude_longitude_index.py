@@ -0,0 +1,17 @@
+# Generated by Django 4.2 on 2026-10-17 19:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tourism', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='attraction',
+            index=models.Index(fields=['latitude', 'longitude'], name='tourism_att_latitud_7dfb2a_idx'),
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 4.2 on 2026-10-17 19:17
+
+from django.db import migrations, models
+
+GEOHASH_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+
+def geohash_encode(latitude, longitude, precision=9):
+    """Copie figée de tourism.geo.geohash_encode à la date de la migration"""
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    latitude, longitude = float(latitude), float(longitude)
+
+    chars = []
+    bit, ch, even = 0, 0, True
+    while len(chars) < precision:
+        rng, value = (lon_range, longitude) if even else (lat_range, latitude)
+        mid = (rng[0] + rng[1]) / 2
+        if value >= mid:
+            ch = (ch << 1) | 1
+            rng[0] = mid
+        else:
+            ch = ch << 1
+            rng[1] = mid
+        even = not even
+        bit += 1
+        if bit == 5:
+            chars.append(GEOHASH_BASE32[ch])
+            bit, ch = 0, 0
+    return ''.join(chars)
+
+
+def fill_geohash(apps, schema_editor):
+    Attraction = apps.get_model('tourism', 'Attraction')
+    attractions = list(Attraction.objects.only('id', 'latitude', 'longitude'))
+    for attraction in attractions:
+        attraction.geohash = geohash_encode(attraction.latitude, attraction.longitude)
+    Attraction.objects.bulk_update(attractions, ['geohash'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tourism', '0002_attraction_latitude_longitude_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='attraction',
+            name='geohash',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=12),
+        ),
+        migrations.RunPython(fill_geohash, migrations.RunPython.noop),
+    ]
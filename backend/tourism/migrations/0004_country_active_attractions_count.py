@@ -0,0 +1,30 @@
+# Generated by Django 4.2 on 2026-10-17 19:21
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def fill_counts(apps, schema_editor):
+    Country = apps.get_model('tourism', 'Country')
+    countries = Country.objects.annotate(
+        active_count=Count('attractions', filter=Q(attractions__is_active=True))
+    )
+    for country in countries:
+        country.active_attractions_count = country.active_count
+    Country.objects.bulk_update(countries, ['active_attractions_count'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tourism', '0003_attraction_geohash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='country',
+            name='active_attractions_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_counts, migrations.RunPython.noop),
+    ]
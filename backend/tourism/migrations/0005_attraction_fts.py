@@ -0,0 +1,52 @@
+from django.db import migrations
+
+# SQL figé ici : la migration ne doit pas suivre les évolutions de tourism/search.py
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tourism', '0004_country_active_attractions_count'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql=[
+                """
+                CREATE VIRTUAL TABLE IF NOT EXISTS tourism_attraction_fts USING fts5(
+                    name, description, city,
+                    content='tourism_attraction', content_rowid='id',
+                    tokenize='unicode61 remove_diacritics 2'
+                )
+                """,
+                """
+                CREATE TRIGGER IF NOT EXISTS tourism_attraction_fts_insert AFTER INSERT ON tourism_attraction BEGIN
+                    INSERT INTO tourism_attraction_fts(rowid, name, description, city)
+                    VALUES (new.id, new.name, new.description, new.city);
+                END
+                """,
+                """
+                CREATE TRIGGER IF NOT EXISTS tourism_attraction_fts_delete AFTER DELETE ON tourism_attraction BEGIN
+                    INSERT INTO tourism_attraction_fts(tourism_attraction_fts, rowid, name, description, city)
+                    VALUES ('delete', old.id, old.name, old.description, old.city);
+                END
+                """,
+                """
+                CREATE TRIGGER IF NOT EXISTS tourism_attraction_fts_update
+                AFTER UPDATE OF name, description, city ON tourism_attraction BEGIN
+                    INSERT INTO tourism_attraction_fts(tourism_attraction_fts, rowid, name, description, city)
+                    VALUES ('delete', old.id, old.name, old.description, old.city);
+                    INSERT INTO tourism_attraction_fts(rowid, name, description, city)
+                    VALUES (new.id, new.name, new.description, new.city);
+                END
+                """,
+                "INSERT INTO tourism_attraction_fts(tourism_attraction_fts) VALUES ('rebuild')",
+            ],
+            reverse_sql=[
+                'DROP TRIGGER IF EXISTS tourism_attraction_fts_insert',
+                'DROP TRIGGER IF EXISTS tourism_attraction_fts_delete',
+                'DROP TRIGGER IF EXISTS tourism_attraction_fts_update',
+                'DROP TABLE IF EXISTS tourism_attraction_fts',
+            ],
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2 on 2026-10-17 19:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tourism', '0005_attraction_fts'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='attraction',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['-num_likes', '-rating', 'id'], name='attraction_active_popular_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='attraction',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['country', '-num_likes', '-rating', 'id'], name='attraction_country_popular_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userattractionlist',
+            index=models.Index(fields=['user', '-added_at', 'id'], name='user_list_added_idx'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 4.2 on 2026-10-17 19:45
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tourism', '0006_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='attraction',
+            name='similar_computed_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.CreateModel(
+            name='SimilarAttraction',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+                ('rank', models.PositiveSmallIntegerField()),
+                ('attraction', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similar_links', to='tourism.attraction')),
+                ('similar', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='tourism.attraction')),
+            ],
+            options={
+                'ordering': ['attraction', 'rank'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='similarattraction',
+            index=models.Index(fields=['similar'], name='tourism_sim_similar_098a18_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='similarattraction',
+            unique_together={('attraction', 'similar')},
+        ),
+    ]
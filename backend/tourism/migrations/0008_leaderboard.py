@@ -0,0 +1,28 @@
+# Generated by Django 4.2 on 2026-10-17 19:52
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tourism', '0007_similar_attractions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Leaderboard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('city', models.CharField(blank=True, max_length=100)),
+                ('profile_type', models.CharField(blank=True, choices=[('local', 'Local'), ('tourist', 'Touriste'), ('professional', 'Professionnel')], max_length=20)),
+                ('entries', models.JSONField(default=list)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('country', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='leaderboards', to='tourism.country')),
+            ],
+            options={
+                'unique_together': {('country', 'city', 'profile_type')},
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2 on 2026-10-17 20:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tourism', '0008_leaderboard'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='attraction',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.AddField(
+            model_name='attractionimage',
+            name='checksum',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='attractionimage',
+            name='variants',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
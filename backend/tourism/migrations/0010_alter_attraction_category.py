@@ -0,0 +1,19 @@
+# Generated by Django 4.2 on 2026-10-17 20:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tourism', '0009_image_variants'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='attraction',
+            name='category',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='tourism.category'),
+        ),
+    ]
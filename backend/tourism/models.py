@@ -1,6 +1,7 @@
 from random import choices
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
+from .geo import geohash_encode
 
 # Choix pour les champs de texte
 class ProfileType(models.TextChoices):
@@ -25,6 +26,22 @@ class CategoryType(models.TextChoices):
     SHOPPING = 'shopping', 'Shopping'
     NIGHTLIFE = 'nightlife', 'Vie nocturne'
 
+# Catégories proposées à chaque profil (aucune restriction si absent)
+PROFILE_CATEGORIES = {
+    ProfileType.LOCAL: ['restaurant', 'attraction'],
+    ProfileType.TOURIST: ['restaurant', 'attraction', 'hotel', 'geo'],
+    ProfileType.PROFESSIONAL: ['hotel', 'restaurant'],
+}
+
+# Coût estimé d'une visite par niveau de prix ($), comme dans le front
+PRICE_COSTS = {
+    PriceLevel.FREE: 0,
+    PriceLevel.BUDGET: 10,
+    PriceLevel.MODERATE: 25,
+    PriceLevel.EXPENSIVE: 50,
+    PriceLevel.LUXURY: 100,
+}
+
 # Modèles
 class Country(models.Model):
     name = models.CharField(max_length=100)
@@ -32,6 +49,8 @@ class Country(models.Model):
     capital = models.CharField(max_length=100)
     capital_latitude = models.DecimalField(max_digits=10, decimal_places=7)
     capital_longitude = models.DecimalField(max_digits=10, decimal_places=7)
+    # Dénormalisé : maintenu par les signaux d'Attraction (voir counters.py)
+    active_attractions_count = models.PositiveIntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
@@ -72,6 +91,7 @@ class Attraction(models.Model):
     address = models.TextField()
     latitude = models.DecimalField(max_digits=10, decimal_places=7)
     longitude = models.DecimalField(max_digits=10, decimal_places=7)
+    geohash = models.CharField(max_length=12, blank=True, db_index=True, editable=False)
 
     # Contact
     phone = models.CharField(max_length=20, blank=True)
@@ -94,6 +114,8 @@ class Attraction(models.Model):
     
     # Images et récompenses
     images = models.JSONField(default=list, blank=True)
+    # Tailles de l'image principale [{url ou path, width, height, format}] (voir images.py)
+    image_variants = models.JSONField(default=list, blank=True)
     awards = models.JSONField(default=list, blank=True)
 
     # Métadonnées
@@ -101,6 +123,9 @@ class Attraction(models.Model):
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Dernier calcul des attractions similaires (voir similarity.py) ;
+    # à refaire si NULL ou antérieur à updated_at
+    similar_computed_at = models.DateTimeField(null=True, blank=True, editable=False)
     
     class Meta:
         ordering = ['-num_likes', '-rating']
@@ -110,22 +135,94 @@ class Attraction(models.Model):
             models.Index(fields=['-num_likes']),
             models.Index(fields=['price_level']),
             models.Index(fields=['ranking']),
+            models.Index(fields=['latitude', 'longitude']),
+            # Pagination par curseur sur le tri par défaut (voir pagination.py).
+            # Index partiels : SQLite ne sait pas chercher `WHERE is_active`
+            # dans un index qui commence par is_active
+            models.Index(
+                fields=['-num_likes', '-rating', 'id'],
+                name='attraction_active_popular_idx',
+                condition=models.Q(is_active=True),
+            ),
+            models.Index(
+                fields=['country', '-num_likes', '-rating', 'id'],
+                name='attraction_country_popular_idx',
+                condition=models.Q(is_active=True),
+            ),
         ]
     
     def __str__(self):
         return f"{self.name} - {self.city}"
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Pays où l'attraction est comptée, pour mettre à jour les compteurs au save
+        if 'country_id' in instance.__dict__ and 'is_active' in instance.__dict__:
+            instance._counted_in = instance.country_id if instance.is_active else None
+        return instance
+    
+    def save(self, *args, **kwargs):
+        # Index spatial : geohash toujours synchronisé avec les coordonnées
+        if self.latitude is not None and self.longitude is not None:
+            self.geohash = geohash_encode(self.latitude, self.longitude)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'latitude', 'longitude'} & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'geohash'}
+        # Les compteurs dénormalisés (post_save) sont mis à jour dans la même transaction
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
 
 class AttractionImage(models.Model):
     attraction = models.ForeignKey(Attraction, on_delete=models.CASCADE, related_name='media_files')
     image_file = models.ImageField(upload_to='gallery/%Y/%m/')
     caption = models.CharField(max_length=255, blank=True)
     order = models.PositiveSmallIntegerField(default=0)
+    # Déclinaisons redimensionnées (images.py) et empreinte du fichier dont elles sont issues
+    variants = models.JSONField(default=list, blank=True)
+    checksum = models.CharField(max_length=64, blank=True)
     
     class Meta:
         ordering = ['order']
     def __str__(self):
         return f"Image for {self.attraction.name} - {self.caption}"
 
+class SimilarAttraction(models.Model):
+    """Attractions similaires précalculées (commande compute_similar)"""
+    attraction = models.ForeignKey(Attraction, on_delete=models.CASCADE, related_name='similar_links')
+    similar = models.ForeignKey(Attraction, on_delete=models.CASCADE, related_name='+')
+    score = models.FloatField()
+    rank = models.PositiveSmallIntegerField()
+    
+    class Meta:
+        unique_together = ['attraction', 'similar']
+        ordering = ['attraction', 'rank']
+        indexes = [
+            models.Index(fields=['similar']),
+        ]
+    
+    def __str__(self):
+        return f"{self.attraction_id} ~ {self.similar_id} ({self.score:.2f})"
+
+class Leaderboard(models.Model):
+    """
+    Classement matérialisé des attractions les plus populaires pour un
+    (pays, ville, profil) ; ville et profil vides = tout le pays / tous
+    profils. Maintenu par tourism/leaderboard.py.
+    """
+    country = models.ForeignKey(Country, on_delete=models.CASCADE, related_name='leaderboards')
+    city = models.CharField(max_length=100, blank=True)
+    profile_type = models.CharField(max_length=20, choices=ProfileType.choices, blank=True)
+    # [[id, num_likes, rating, saves_count, num_reviews], ...] dans l'ordre du classement
+    entries = models.JSONField(default=list)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        unique_together = ['country', 'city', 'profile_type']
+    
+    def __str__(self):
+        return f"{self.country} / {self.city or '*'} / {self.profile_type or '*'}"
+
 class UserAttractionList(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='attraction_lists')
     attraction = models.ForeignKey(Attraction, on_delete=models.CASCADE)
@@ -136,6 +233,9 @@ class UserAttractionList(models.Model):
     class Meta:
         unique_together = ['user', 'attraction']
         ordering = ['-added_at']
+        indexes = [
+            models.Index(fields=['user', '-added_at', 'id'], name='user_list_added_idx'),
+        ]
     
     def __str__(self):
         return f"{self.user.username} - {self.attraction.name}"
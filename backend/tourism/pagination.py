@@ -0,0 +1,226 @@
+import base64
+import binascii
+import json
+from collections import OrderedDict
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import F, Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def _resolve_field(model, path):
+    """Champ de modèle désigné par `path` ('num_likes', 'attraction__rating'), None pour une annotation"""
+    field = None
+    for part in path.split('__'):
+        if model is None:
+            return None
+        try:
+            field = model._meta.get_field(part)
+        except FieldDoesNotExist:
+            return None
+        model = field.related_model
+    return field
+
+
+class KeysetPagination(BasePagination):
+    """
+    Pagination par curseur sur (champs de tri, id) : chaque page est une
+    requête `WHERE (tri) > (dernière ligne vue) ... LIMIT n` qui s'appuie
+    sur les index composites, sans OFFSET ni COUNT(*).
+
+    Le tri est celui déjà appliqué au queryset (?ordering, pertinence de
+    recherche) ou le tri par défaut du modèle ; `id` départage les égalités.
+    Les NULL sont placés comme la plus petite valeur (en tête en ordre
+    croissant, en queue en décroissant), comme SQLite le fait nativement,
+    ce qui laisse les index utilisables.
+
+    ?count=1 ajoute le nombre total de résultats (une requête de plus).
+    """
+
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.count = queryset.count() if self.wants_count(request) else None
+
+        self.ordering = self.get_ordering(queryset)
+        values, reverse = self.decode_cursor(request)
+        self.reverse = reverse
+
+        if values is not None:
+            queryset = queryset.filter(self.after(values, reverse))
+        queryset = queryset.order_by(*self.order_expressions(reverse))
+
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if reverse:
+            results.reverse()
+
+        self.results = results
+        # Dans le sens de lecture : il reste des lignes avant / après la page
+        self.has_next = has_more if not reverse else values is not None
+        self.has_previous = values is not None if not reverse else has_more
+        return results
+
+    def get_paginated_response(self, data):
+        fields = [
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]
+        if self.count is not None:
+            fields.insert(0, ('count', self.count))
+        return Response(OrderedDict(fields))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'count': {'type': 'integer'},
+                'next': {'type': 'string', 'nullable': True},
+                'previous': {'type': 'string', 'nullable': True},
+                'results': schema,
+            },
+        }
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def wants_count(self, request):
+        return request.query_params.get(self.count_query_param, '').lower() in ('1', 'true')
+
+    # --- Tri ---
+
+    def get_ordering(self, queryset):
+        """[(chemin, champ ou None, décroissant)] terminé par l'identifiant"""
+        terms = list(queryset.query.order_by) or list(queryset.model._meta.ordering)
+        ordering = []
+        for term in terms:
+            if not isinstance(term, str):
+                continue  # expressions : non supportées pour le curseur
+            descending = term.startswith('-')
+            path = term.lstrip('-')
+            if path in ('pk', 'id'):
+                path = 'id'
+            field = _resolve_field(queryset.model, path)
+            if field is not None and field.is_relation:
+                path, field = f'{path}_id', field.target_field
+            ordering.append((path, field, descending))
+        if not any(path == 'id' for path, _, _ in ordering):
+            ordering.append(('id', queryset.model._meta.pk, False))
+        return ordering
+
+    def order_expressions(self, reverse):
+        expressions = []
+        for path, _, descending in self.ordering:
+            if descending != reverse:
+                expressions.append(F(path).desc(nulls_last=True))
+            else:
+                expressions.append(F(path).asc(nulls_first=True))
+        return expressions
+
+    def after(self, values, reverse):
+        """Lignes strictement après `values` dans l'ordre (inversé si `reverse`)"""
+        condition = Q(pk__in=[])
+        equal = Q()
+        for (path, field, descending), value in zip(self.ordering, values):
+            descending = descending != reverse
+            nullable = field is None or field.null
+            if value is None:
+                # NULL = plus petite valeur : seules les valeurs non nulles le suivent en ordre croissant
+                if not descending:
+                    condition |= equal & Q(**{f'{path}__isnull': False})
+                same = Q(**{f'{path}__isnull': True})
+            else:
+                lookup = 'lt' if descending else 'gt'
+                beyond = Q(**{f'{path}__{lookup}': value})
+                if descending and nullable:
+                    beyond |= Q(**{f'{path}__isnull': True})
+                condition |= equal & beyond
+                same = Q(**{path: value})
+            equal &= same
+        return self.leading_bound(values, reverse) & condition
+
+    def leading_bound(self, values, reverse):
+        """
+        Borne redondante sur la première colonne du tri : SQLite ne tire
+        pas de plage d'index de la chaîne de OR, mais d'un `>=`/`<=` si.
+        Impossible en ordre décroissant sur une colonne nullable (les NULL suivent).
+        """
+        path, field, descending = self.ordering[0]
+        descending = descending != reverse
+        value = values[0]
+        if value is None:
+            return Q(**{f'{path}__isnull': True}) if descending else Q()
+        if not descending:
+            return Q(**{f'{path}__gte': value})
+        if field is not None and not field.null:
+            return Q(**{f'{path}__lte': value})
+        return Q()
+
+    # --- Curseurs ---
+
+    def row_values(self, instance):
+        values = []
+        for path, field, _ in self.ordering:
+            value = instance
+            for part in path.split('__'):
+                value = getattr(value, part, None) if value is not None else None
+            values.append(value)
+        return values
+
+    def encode_cursor(self, instance, reverse):
+        values = [self.serialize(value) for value in self.row_values(instance)]
+        payload = json.dumps({'v': values, 'r': reverse}, separators=(',', ':'))
+        cursor = base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+        url = remove_query_param(self.base_url, 'page')
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def decode_cursor(self, request):
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None, False
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+            values, reverse = payload['v'], bool(payload['r'])
+            if len(values) != len(self.ordering):
+                raise ValueError
+            values = [
+                field.to_python(value) if field is not None and value is not None else value
+                for (_, field, _), value in zip(self.ordering, values)
+            ]
+        except (binascii.Error, KeyError, TypeError, ValueError, ValidationError):
+            raise NotFound('Curseur invalide.')
+        return values, reverse
+
+    @staticmethod
+    def serialize(value):
+        if isinstance(value, (int, float, str, bool)) or value is None:
+            return value
+        if hasattr(value, 'isoformat'):
+            return value.isoformat()
+        return str(value)
+
+    def get_next_link(self):
+        if not self.has_next or not self.results:
+            return None
+        return self.encode_cursor(self.results[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.results:
+            return None
+        return self.encode_cursor(self.results[0], reverse=True)
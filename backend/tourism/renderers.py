@@ -0,0 +1,159 @@
+import csv
+import io
+from abc import ABC, abstractmethod
+from datetime import timedelta
+from xml.sax.saxutils import escape
+from django.utils import timezone
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+EXPORT_TITLE = 'Mon itinéraire TravelGuide'
+EXPORT_FIELDS = [
+    'position', 'name', 'city', 'address', 'latitude', 'longitude',
+    'leg_km', 'price_level', 'rating', 'visited', 'notes',
+]
+
+
+class StreamingRenderer(BaseRenderer, ABC):
+    """
+    Renderer d'export produit morceau par morceau : stream(stops, options)
+    est un générateur de texte, consommé par une StreamingHttpResponse au
+    fil de l'itinéraire. render() assemble le tout pour une Response DRF ;
+    les réponses d'erreur (400, 401...) y sont rendues en JSON.
+
+    Le générateur est synchrone : sous WSGI l'export part au fil de l'eau,
+    mais sous ASGI Django 4.2 le consomme en entier avant d'envoyer la
+    réponse (mémoire proportionnelle à l'itinéraire).
+    """
+
+    charset = 'utf-8'
+    extension = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        response = (renderer_context or {}).get('response')
+        if response is not None and response.status_code >= 400:
+            response['Content-Type'] = 'application/json'
+            return JSONRenderer().render(data)
+        return ''.join(self.stream(data, {})).encode(self.charset)
+
+    @abstractmethod
+    def stream(self, stops, options):
+        """Générateur des morceaux de texte du fichier, étape par étape"""
+
+
+class GPXRenderer(StreamingRenderer):
+    """Route GPX 1.1 : un point (rtept) par étape"""
+
+    media_type = 'application/gpx+xml'
+    format = 'gpx'
+    extension = 'gpx'
+
+    def stream(self, stops, options):
+        title = escape(options.get('title', EXPORT_TITLE))
+        yield (
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<gpx version="1.1" creator="TravelGuide" xmlns="http://www.topografix.com/GPX/1/1">\n'
+            f'<metadata><name>{title}</name><time>{timezone.now().isoformat()}</time></metadata>\n'
+            f'<rte><name>{title}</name>\n'
+        )
+        for stop in stops:
+            description = ', '.join(part for part in (stop['city'], stop['notes']) if part)
+            yield (
+                f'<rtept lat="{stop["latitude"]}" lon="{stop["longitude"]}">'
+                f'<name>{escape(stop["name"])}</name><desc>{escape(description)}</desc></rtept>\n'
+            )
+        yield '</rte>\n</gpx>\n'
+
+
+def _ics_text(value):
+    return (value or '').replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\n', '\\n')
+
+
+def _ics_line(line):
+    """Ligne repliée à 75 octets (RFC 5545), sans couper un caractère UTF-8"""
+    chunks, current = [], ''
+    for char in line:
+        if len((current + char).encode()) > (75 if not chunks else 74):
+            chunks.append(current)
+            current = ''
+        current += char
+    chunks.append(current)
+    return '\r\n '.join(chunks) + '\r\n'
+
+
+class ICSRenderer(StreamingRenderer):
+    """
+    Calendrier iCalendar : une visite par étape, en créneaux consécutifs
+    de `visit_minutes` à partir de `start` (heure locale flottante).
+    """
+
+    media_type = 'text/calendar'
+    format = 'ics'
+    extension = 'ics'
+
+    def stream(self, stops, options):
+        start = options.get('start') or timezone.localtime().replace(
+            hour=9, minute=0, second=0, microsecond=0, tzinfo=None
+        ) + timedelta(days=1)
+        visit = timedelta(minutes=options.get('visit_minutes', 60))
+        stamp = timezone.now().strftime('%Y%m%dT%H%M%SZ')
+        yield (
+            'BEGIN:VCALENDAR\r\nVERSION:2.0\r\nPRODID:-//TravelGuide//Itinéraire//FR\r\n'
+            + _ics_line(f'X-WR-CALNAME:{_ics_text(options.get("title", EXPORT_TITLE))}')
+        )
+        for stop in stops:
+            begin = start + visit * (stop['position'] - 1)
+            yield (
+                'BEGIN:VEVENT\r\n'
+                f'UID:{stop["position"]}-{stop["id"]}@travelguide\r\n'
+                f'DTSTAMP:{stamp}\r\n'
+                f'DTSTART:{begin:%Y%m%dT%H%M%S}\r\n'
+                f'DTEND:{begin + visit:%Y%m%dT%H%M%S}\r\n'
+                + _ics_line(f'SUMMARY:{stop["position"]}. {_ics_text(stop["name"])}')
+                + _ics_line(f'LOCATION:{_ics_text(stop["address"] or stop["city"])}')
+                + f'GEO:{stop["latitude"]};{stop["longitude"]}\r\n'
+                + (_ics_line(f'DESCRIPTION:{_ics_text(stop["notes"])}') if stop['notes'] else '')
+                + 'END:VEVENT\r\n'
+            )
+        yield 'END:VCALENDAR\r\n'
+
+
+class CSVRenderer(StreamingRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+    extension = 'csv'
+
+    def stream(self, stops, options):
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS, extrasaction='ignore')
+
+        def flush():
+            text = buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            return text
+
+        writer.writeheader()
+        yield flush()
+        for stop in stops:
+            writer.writerow(stop)
+            yield flush()
+
+
+class JSONStreamRenderer(StreamingRenderer):
+    """Tableau JSON des étapes, écrit élément par élément"""
+
+    media_type = 'application/json'
+    format = 'json'
+    extension = 'json'
+
+    def stream(self, stops, options):
+        encoder = JSONEncoder(ensure_ascii=False)
+        separator = '[\n'
+        for stop in stops:
+            yield separator + encoder.encode(stop)
+            separator = ',\n'
+        yield '[]\n' if separator == '[\n' else '\n]\n'
+
+
+EXPORT_RENDERERS = [GPXRenderer, ICSRenderer, CSVRenderer, JSONStreamRenderer]
@@ -0,0 +1,130 @@
+import re
+from django.db import connections
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from rest_framework import filters
+from .models import Attraction
+
+# Index plein texte SQLite FTS5 : table à contenu externe (seul l'index est
+# stocké, le texte reste dans tourism_attraction), tenue à jour par des
+# triggers pour tout INSERT / UPDATE / DELETE, y compris bulk_create,
+# update() et les upserts. remove_diacritics 2 : "musee" trouve "Musée".
+FTS_TABLE = 'tourism_attraction_fts'
+FTS_COLUMNS = ['name', 'description', 'city']
+FTS_WEIGHTS = {'name': 10.0, 'description': 1.0, 'city': 5.0}
+SEARCH_RANK = 'search_rank'
+
+FTS_TABLE_SQL = f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        name, description, city,
+        content='tourism_attraction', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+"""
+FTS_TRIGGERS_SQL = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_insert AFTER INSERT ON tourism_attraction BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, name, description, city)
+        VALUES (new.id, new.name, new.description, new.city);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_delete AFTER DELETE ON tourism_attraction BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, description, city)
+        VALUES ('delete', old.id, old.name, old.description, old.city);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_update AFTER UPDATE OF name, description, city ON tourism_attraction BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, description, city)
+        VALUES ('delete', old.id, old.name, old.description, old.city);
+        INSERT INTO {FTS_TABLE}(rowid, name, description, city)
+        VALUES (new.id, new.name, new.description, new.city);
+    END
+    """,
+]
+
+
+def install_search_index(connection, rebuild=False):
+    """
+    Crée l'index FTS5 et ses triggers s'ils manquent (SQLite uniquement).
+
+    Les migrations SQLite qui reconstruisent tourism_attraction (ajout de
+    colonne, etc.) suppriment ses triggers : ils sont recréés après chaque
+    migrate (voir signals.py). `rebuild` réindexe toute la table.
+    """
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(FTS_TABLE_SQL)
+        for sql in FTS_TRIGGERS_SQL:
+            cursor.execute(sql)
+        if rebuild:
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def fts_available(queryset):
+    return connections[queryset.db].vendor == 'sqlite'
+
+
+def fts_query(text, columns=None):
+    """
+    Expression MATCH à partir d'une saisie libre : chaque mot devient un
+    préfixe entre guillemets (la syntaxe FTS5 de l'utilisateur est ignorée),
+    tous les mots sont requis. None si la saisie ne contient aucun mot.
+    """
+    terms = ' '.join(f'"{word}"*' for word in re.findall(r'\w+', text))
+    if not terms:
+        return None
+    if columns:
+        return '{%s} : (%s)' % (' '.join(columns), terms)
+    return terms
+
+
+def full_text_search(queryset, text, columns=None, rank=True):
+    """
+    Attractions de `queryset` correspondant à `text`, via l'index FTS5.
+
+    Avec `rank`, ajoute l'annotation `search_rank` (BM25, plus petit = plus
+    pertinent) calculée pour les seules lignes trouvées. Hors SQLite,
+    retombe sur des `icontains` (mêmes colonnes, tous les mots requis).
+    """
+    columns = columns or FTS_COLUMNS
+    if not fts_available(queryset):
+        for word in re.findall(r'\w+', text):
+            condition = Q()
+            for column in columns:
+                condition |= Q(**{f'{column}__icontains': word})
+            queryset = queryset.filter(condition)
+        return queryset
+
+    query = fts_query(text, columns if columns != FTS_COLUMNS else None)
+    if query is None:
+        return queryset
+
+    queryset = queryset.filter(pk__in=RawSQL(
+        f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [query]
+    ))
+    if rank:
+        weights = ', '.join(str(FTS_WEIGHTS[column]) for column in FTS_COLUMNS)
+        queryset = queryset.annotate(**{SEARCH_RANK: RawSQL(
+            f'SELECT bm25({FTS_TABLE}, {weights}) FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s AND rowid = "{Attraction._meta.db_table}"."id"',
+            [query]
+        )})
+    return queryset
+
+
+class FullTextSearchFilter(filters.SearchFilter):
+    """
+    ?search= servi par l'index FTS5 (accents ignorés, classement BM25).
+    Hors SQLite, comportement de SearchFilter (LIKE sur search_fields).
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        if not fts_available(queryset):
+            return super().filter_queryset(request, queryset, view)
+        text = request.query_params.get(self.search_param, '')
+        if not text.strip():
+            return queryset
+        return full_text_search(queryset, text)
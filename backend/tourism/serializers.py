@@ -1,22 +1,49 @@
 from rest_framework import serializers
+from . import images
 from .models import Country, Attraction, UserAttractionList, AttractionLike, UserProfile
 
 class CountrySerializer(serializers.ModelSerializer):
-    attractions_count = serializers.SerializerMethodField()
+    attractions_count = serializers.IntegerField(source='active_attractions_count', read_only=True)
     
     class Meta:
         model = Country
         fields = ['id', 'name', 'code', 'capital', 'attractions_count']
+
+def get_user_flags(context):
+    """
+    IDs des attractions aimées / sauvegardées par l'utilisateur courant.
+    Chargés une seule fois par requête puis gardés sur l'objet request.
+    """
+    request = context.get('request')
+    if not request or not request.user.is_authenticated:
+        return None
     
-    def get_attractions_count(self, obj):
-        return obj.attractions.filter(is_active=True).count()
+    flags = getattr(request, '_attraction_flags', None)
+    if flags is None:
+        flags = {
+            'liked': set(AttractionLike.objects.filter(user=request.user).values_list('attraction_id', flat=True)),
+            'saved': set(UserAttractionList.objects.filter(user=request.user).values_list('attraction_id', flat=True)),
+        }
+        request._attraction_flags = flags
+    return flags
 
-class AttractionListSerializer(serializers.ModelSerializer):
+class UserFlagsMixin:
+    def get_is_liked(self, obj):
+        flags = get_user_flags(self.context)
+        return flags is not None and obj.id in flags['liked']
+    
+    def get_is_saved(self, obj):
+        flags = get_user_flags(self.context)
+        return flags is not None and obj.id in flags['saved']
+
+class AttractionListSerializer(UserFlagsMixin, serializers.ModelSerializer):
     country_name = serializers.CharField(source='country.name', read_only=True)
     is_liked = serializers.SerializerMethodField()
     is_saved = serializers.SerializerMethodField()
     main_image = serializers.SerializerMethodField()
+    main_image_srcset = serializers.SerializerMethodField()
     category = serializers.SerializerMethodField()
+    distance = serializers.FloatField(read_only=True)  # présent si annoté (recherche géographique)
     
     class Meta:
         model = Attraction
@@ -24,30 +51,24 @@ class AttractionListSerializer(serializers.ModelSerializer):
             'id', 'tripadvisor_id', 'name', 'city', 
             'country_name', 'latitude', 'longitude', 'price_level',
             'rating', 'num_reviews', 'num_likes', 'category',
-            'main_image', 'is_liked', 'is_saved'
+            'main_image', 'main_image_srcset', 'is_liked', 'is_saved', 'distance'
         ]
     
     def get_main_image(self, obj):
+        # Taille « card » quand des déclinaisons existent, l'original sinon
+        if obj.image_variants:
+            return images.default_src(obj.image_variants, self.context.get('request'))
         if obj.images and len(obj.images) > 0:
             return obj.images[0]
         return None
     
-    def get_is_liked(self, obj):
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            return AttractionLike.objects.filter(user=request.user, attraction=obj).exists()
-        return False
-    
-    def get_is_saved(self, obj):
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            return UserAttractionList.objects.filter(user=request.user, attraction=obj).exists()
-        return False
+    def get_main_image_srcset(self, obj):
+        return images.srcset(obj.image_variants, self.context.get('request')) if obj.image_variants else None
     
     def get_category(self, obj):
         return obj.category.name if obj.category else None
 
-class AttractionDetailSerializer(serializers.ModelSerializer):
+class AttractionDetailSerializer(UserFlagsMixin, serializers.ModelSerializer):
     country = CountrySerializer(read_only=True)
     is_liked = serializers.SerializerMethodField()
     is_saved = serializers.SerializerMethodField()
@@ -66,24 +87,17 @@ class AttractionDetailSerializer(serializers.ModelSerializer):
             'is_liked', 'is_saved', 'similar_attractions', 'created_at'
         ]
     
-    def get_is_liked(self, obj):
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            return AttractionLike.objects.filter(user=request.user, attraction=obj).exists()
-        return False
-    
-    def get_is_saved(self, obj):
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            return UserAttractionList.objects.filter(user=request.user, attraction=obj).exists()
-        return False
-    
     def get_similar_attractions(self, obj):
-        similar = Attraction.objects.filter(
-            city=obj.city,
-            category=obj.category,
-            is_active=True
-        ).exclude(id=obj.id)[:6]
+        if obj.similar_computed_at is None:
+            # Pas encore précalculé (compute_similar) : requête directe
+            similar = Attraction.objects.filter(
+                city=obj.city,
+                category=obj.category,
+                is_active=True
+            ).select_related('country', 'category').exclude(id=obj.id)[:6]
+        else:
+            # Liens préchargés par AttractionViewSet.get_queryset
+            similar = [link.similar for link in obj.similar_links.all() if link.similar.is_active]
         return AttractionListSerializer(similar, many=True, context=self.context).data
     
     def get_category(self, obj):
@@ -0,0 +1,137 @@
+from django.db import connections, transaction
+from django.db.models.signals import post_delete, post_migrate, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from . import caching, counters, images, similarity, suggest
+from .counters import adjust_country_count
+from .models import Attraction, AttractionImage, AttractionLike, Category, Country, UserAttractionList
+from .search import FTS_TABLE, install_search_index
+
+
+@receiver(pre_save, sender=Attraction)
+@receiver(pre_delete, sender=Attraction)
+def remember_counted_country(sender, instance, **kwargs):
+    if hasattr(instance, '_counted_in'):
+        return
+    previous = None
+    if instance.pk is not None:
+        previous = Attraction.objects.filter(pk=instance.pk).values_list('country_id', 'is_active').first()
+    instance._counted_in = previous[0] if previous and previous[1] else None
+
+
+@receiver(post_save, sender=Attraction)
+def update_country_count(sender, instance, **kwargs):
+    counted_in = instance.country_id if instance.is_active else None
+    if counted_in != instance._counted_in:
+        adjust_country_count(instance._counted_in, -1)
+        adjust_country_count(counted_in, +1)
+        instance._counted_in = counted_in
+
+
+@receiver(post_delete, sender=Attraction)
+def release_country_count(sender, instance, **kwargs):
+    adjust_country_count(instance._counted_in, -1)
+    instance._counted_in = None
+
+
+SUGGEST_FIELDS = {'name', 'city', 'country', 'is_active', 'num_likes', 'rating'}
+
+
+@receiver(post_save, sender=Attraction)
+def update_suggest_index(sender, instance, update_fields, raw, **kwargs):
+    if raw or (update_fields is not None and not SUGGEST_FIELDS & set(update_fields)):
+        return
+    transaction.on_commit(lambda: suggest.index.update([instance]))
+
+
+@receiver(post_delete, sender=Attraction)
+def discard_from_suggest_index(sender, instance, **kwargs):
+    pk = instance.pk
+    transaction.on_commit(lambda: suggest.index.discard(pk))
+
+
+@receiver(post_save, sender=AttractionLike)
+def count_like(sender, instance, created, raw, **kwargs):
+    if created and not raw:
+        counters.increment(instance.attraction_id, 'num_likes', +1)
+
+
+@receiver(post_delete, sender=AttractionLike)
+def uncount_like(sender, instance, **kwargs):
+    counters.increment(instance.attraction_id, 'num_likes', -1)
+
+
+@receiver(post_save, sender=UserAttractionList)
+def count_save(sender, instance, created, raw, **kwargs):
+    if created and not raw:
+        counters.increment(instance.attraction_id, 'saves_count', +1)
+
+
+@receiver(post_delete, sender=UserAttractionList)
+def uncount_save(sender, instance, **kwargs):
+    counters.increment(instance.attraction_id, 'saves_count', -1)
+
+
+@receiver(post_migrate)
+def restore_search_triggers(sender, using, **kwargs):
+    # Une reconstruction de tourism_attraction par une migration supprime les triggers FTS
+    if sender.name != 'tourism':
+        return
+    connection = connections[using]
+    if FTS_TABLE in connection.introspection.table_names():
+        install_search_index(connection)
+
+
+SIMILARITY_FIELDS = {'city', 'category', 'latitude', 'longitude', 'price_level', 'is_active', 'country'}
+
+
+@receiver(post_save, sender=Attraction)
+def invalidate_similar(sender, instance, created, update_fields, raw, **kwargs):
+    # L'attraction elle-même est périmée via updated_at ; celles qui la citent aussi
+    if raw or created or (update_fields is not None and not SIMILARITY_FIELDS & set(update_fields)):
+        return
+    similarity.invalidate_linking([instance.pk])
+
+
+@receiver(pre_delete, sender=Attraction)
+def invalidate_similar_before_delete(sender, instance, **kwargs):
+    similarity.invalidate_linking([instance.pk])
+
+
+@receiver(post_save, sender=Attraction)
+@receiver(post_delete, sender=Attraction)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_attraction_responses(sender, **kwargs):
+    if not kwargs.get('raw'):
+        caching.bump('attraction')
+
+
+@receiver(post_save, sender=AttractionLike)
+@receiver(post_delete, sender=AttractionLike)
+@receiver(post_save, sender=UserAttractionList)
+@receiver(post_delete, sender=UserAttractionList)
+def invalidate_user_flags(sender, **kwargs):
+    # is_liked / is_saved changent tout de suite, même si le compteur est tamponné
+    if not kwargs.get('raw'):
+        caching.bump('attraction')
+
+
+@receiver(post_save, sender=Country)
+@receiver(post_delete, sender=Country)
+def invalidate_country_responses(sender, **kwargs):
+    if not kwargs.get('raw'):
+        caching.bump('country')
+
+
+@receiver(post_save, sender=AttractionImage)
+def generate_image_variants(sender, instance, update_fields, raw, **kwargs):
+    if raw or (update_fields is not None and 'image_file' not in update_fields):
+        return
+    pk = instance.pk
+    transaction.on_commit(lambda: images.process(pk))
+
+
+@receiver(post_delete, sender=AttractionImage)
+def refresh_main_image(sender, instance, **kwargs):
+    attraction_id = instance.attraction_id
+    transaction.on_commit(lambda: images.refresh_main_image(attraction_id))
@@ -0,0 +1,106 @@
+import numpy as np
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from . import caching
+from .geo import EARTH_RADIUS_KM
+from .models import Attraction, PriceLevel, SimilarAttraction
+
+SIMILAR_COUNT = 6
+DISTANCE_SCALE_KM = 2.0  # la proximité vaut 1/e à cette distance
+WEIGHTS = {
+    'city': 0.30,
+    'category': 0.35,
+    'distance': 0.25,
+    'price': 0.10,
+}
+PRICE_RANKS = {value: rank for rank, value in enumerate(PriceLevel.values)}
+
+
+def stale_attractions():
+    """Attractions actives jamais calculées ou modifiées depuis le dernier calcul"""
+    return Attraction.objects.filter(is_active=True).filter(
+        Q(similar_computed_at__isnull=True) | Q(similar_computed_at__lt=F('updated_at'))
+    )
+
+
+def invalidate_linking(attraction_ids):
+    """Les attractions qui proposent celles-ci comme similaires sont à recalculer"""
+    if Attraction.objects.filter(
+        similar_links__similar__in=attraction_ids
+    ).update(similar_computed_at=None):
+        caching.bump('attraction')
+
+
+class _CountryCandidates:
+    """Attractions actives d'un pays, en tableaux NumPy pour un calcul vectorisé"""
+
+    def __init__(self, country_id):
+        rows = list(Attraction.objects.filter(country_id=country_id, is_active=True).order_by().values_list(
+            'id', 'city', 'category_id', 'latitude', 'longitude', 'price_level', 'num_likes'
+        ))
+        self.ids = np.array([row[0] for row in rows], dtype=np.int64)
+        self.city = np.array([(row[1] or '').casefold() for row in rows], dtype=object)
+        self.category = np.array([row[2] if row[2] is not None else -1 for row in rows], dtype=np.int64)
+        self.lat = np.radians(np.array([float(row[3]) for row in rows]))
+        self.lon = np.radians(np.array([float(row[4]) for row in rows]))
+        self.price = np.array([PRICE_RANKS.get(row[5], 0) for row in rows], dtype=float)
+        self.likes = np.array([row[6] for row in rows], dtype=float)
+        self.index = {pk: i for i, pk in enumerate(self.ids.tolist())}
+
+    def scores(self, i):
+        """Score de similarité de chaque candidat avec l'attraction d'indice i"""
+        dlat = self.lat - self.lat[i]
+        dlon = self.lon - self.lon[i]
+        a = np.sin(dlat / 2) ** 2 + np.cos(self.lat[i]) * np.cos(self.lat) * np.sin(dlon / 2) ** 2
+        distance = 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+        score = (
+            WEIGHTS['city'] * (self.city == self.city[i]) +
+            WEIGHTS['category'] * ((self.category == self.category[i]) & (self.category >= 0)) +
+            WEIGHTS['distance'] * np.exp(-distance / DISTANCE_SCALE_KM) +
+            WEIGHTS['price'] * (1 - np.abs(self.price - self.price[i]) / (len(PRICE_RANKS) - 1))
+        )
+        score[i] = -np.inf
+        return score
+
+    def most_similar(self, pk, count=SIMILAR_COUNT):
+        """[(id, score)] des `count` plus similaires ; à score égal, les plus aimées"""
+        i = self.index[pk]
+        score = self.scores(i)
+        count = min(count, len(score) - 1)
+        if count <= 0:
+            return []
+        candidates = np.argpartition(-score, count - 1)[:count]
+        order = sorted(candidates.tolist(), key=lambda j: (-score[j], -self.likes[j], self.ids[j]))
+        return [(int(self.ids[j]), float(score[j])) for j in order]
+
+
+def compute_similar(attractions, batch_size=500):
+    """
+    Recalcule les attractions similaires de `attractions` (queryset) :
+    candidats du même pays notés sur la ville, la catégorie, la proximité
+    et le niveau de prix. Écrit par lots, une transaction par lot.
+    Retourne le nombre d'attractions traitées.
+    """
+    pending = {}
+    for pk, country_id in attractions.filter(is_active=True).order_by().values_list('id', 'country_id'):
+        pending.setdefault(country_id, []).append(pk)
+
+    done = 0
+    for country_id, ids in pending.items():
+        candidates = _CountryCandidates(country_id)
+        for start in range(0, len(ids), batch_size):
+            batch = ids[start:start + batch_size]
+            links = [
+                SimilarAttraction(attraction_id=pk, similar_id=similar_id, score=score, rank=rank)
+                for pk in batch
+                for rank, (similar_id, score) in enumerate(candidates.most_similar(pk))
+            ]
+            with transaction.atomic():
+                SimilarAttraction.objects.filter(attraction_id__in=batch).delete()
+                SimilarAttraction.objects.bulk_create(links)
+                Attraction.objects.filter(pk__in=batch).update(similar_computed_at=timezone.now())
+                caching.bump('attraction')
+            done += len(batch)
+    return done
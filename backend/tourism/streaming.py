@@ -0,0 +1,45 @@
+from django.http import StreamingHttpResponse
+from rest_framework.utils.encoders import JSONEncoder
+
+STREAM_CHUNK_SIZE = 200  # lignes chargées et sérialisées à la fois
+
+
+def iter_in_bulk(queryset, ids, chunk_size=STREAM_CHUNK_SIZE):
+    """
+    Instances de `queryset` dans l'ordre de `ids`, chargées par paquets :
+    une requête par paquet, mémoire bornée par `chunk_size`.
+    Les ids absents du queryset sont ignorés.
+    """
+    for start in range(0, len(ids), chunk_size):
+        chunk = ids[start:start + chunk_size]
+        objects = queryset.in_bulk(chunk)
+        for pk in chunk:
+            if pk in objects:
+                yield objects[pk]
+
+
+def iter_serialized(objects, serializer_class, context, chunk_size=STREAM_CHUNK_SIZE):
+    """Sérialise un itérable d'objets par paquets, sans le charger en entier"""
+    chunk = []
+    for obj in objects:
+        chunk.append(obj)
+        if len(chunk) >= chunk_size:
+            yield from serializer_class(chunk, many=True, context=context).data
+            chunk = []
+    if chunk:
+        yield from serializer_class(chunk, many=True, context=context).data
+
+
+def ndjson_response(rows, filename=None):
+    """
+    Réponse streamée : un objet JSON par ligne (application/x-ndjson).
+    Itérateur synchrone : sous ASGI, Django 4.2 le lit en entier avant l'envoi.
+    """
+    encoder = JSONEncoder(ensure_ascii=False)
+    response = StreamingHttpResponse(
+        (encoder.encode(row) + '\n' for row in rows),
+        content_type='application/x-ndjson; charset=utf-8'
+    )
+    if filename:
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
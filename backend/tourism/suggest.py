@@ -0,0 +1,200 @@
+import re
+import threading
+import time
+import unicodedata
+from bisect import bisect_left, insort
+from django.conf import settings
+from .models import Attraction
+
+MIN_QUERY_LENGTH = 2  # un seul caractère parcourrait une trop grande part de l'index
+BUCKET_LENGTHS = (2, 3, 4)  # préfixes indexés ; au-delà, le seau de 4 caractères est filtré
+
+
+def index_settings():
+    return {
+        'TTL': 300,  # secondes avant reconstruction complète
+        'MAX_RESULTS': 20,
+        **getattr(settings, 'ATTRACTION_SUGGEST', {}),
+    }
+
+
+def fold(text):
+    """Minuscules sans accents ni ponctuation : 'Musée d'Orsay' -> 'musee d orsay'"""
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    return ' '.join(re.findall(r'\w+', text.lower()))
+
+
+def _index_keys(name, city):
+    """Une clé par mot du nom et de la ville : 'du lou' trouve 'Musée du Louvre'"""
+    keys = set()
+    for text in (name, city):
+        words = fold(text).split(' ')
+        for i in range(len(words)):
+            key = ' '.join(words[i:])
+            if key:
+                keys.add(key)
+    return keys
+
+
+def _buckets_of(entry):
+    """Seaux d'une entrée : chaque préfixe indexé de ses clés, tous pays et pour son pays"""
+    prefixes = {key[:length] for key in entry[2] for length in BUCKET_LENGTHS if len(key) >= length}
+    country = entry[1]['country']
+    return [(scope, prefix) for prefix in prefixes for scope in (None, country)]
+
+
+def _rank(data):
+    """Ordre des suggestions : num_likes puis note décroissants, id croissant"""
+    return (-data['num_likes'], -(data['rating'] or 0.0), data['id'])
+
+
+class SuggestIndex:
+    """
+    Index de préfixes en mémoire sur le nom et la ville des attractions
+    actives, sans accès à la base une fois construit.
+
+    Chaque préfixe de 2 à 4 caractères des clés a son seau, global et par
+    pays, trié du meilleur au moins bon : une suggestion lit le seau du
+    préfixe et s'arrête aux `limit` premières entrées qui conviennent, quel
+    que soit le nombre d'attractions correspondantes.
+
+    Construit au premier appel, tenu à jour par les signaux d'Attraction,
+    par l'ingestion et par les compteurs de likes, et reconstruit entièrement
+    après TTL secondes (chaque processus a son index ; les mises à jour en
+    masse y sont ainsi reprises). La reconstruction se fait hors du verrou :
+    les suggestions continuent sur l'ancien index jusqu'à l'échange, et les
+    modifications reçues entre-temps sont rejouées sur le nouveau.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._build_lock = threading.Lock()
+        self._buckets = {}  # (pays ou None, préfixe) -> [rang] trié
+        self._entries = {}  # id -> (rang, données retournées, clés)
+        self._built_at = None
+        self._pending = None  # modifications reçues pendant une construction
+
+    def _entry(self, attraction):
+        rating = float(attraction.rating) if attraction.rating is not None else None
+        data = {
+            'id': attraction.id,
+            'name': attraction.name,
+            'city': attraction.city,
+            'country': attraction.country_id,
+            'num_likes': attraction.num_likes,
+            'rating': rating,
+        }
+        return _rank(data), data, _index_keys(attraction.name, attraction.city)
+
+    def build(self):
+        with self._lock:
+            self._pending = []
+        attractions = Attraction.objects.filter(is_active=True).only(
+            'id', 'name', 'city', 'country_id', 'num_likes', 'rating'
+        ).order_by()
+        entries = {attraction.id: self._entry(attraction) for attraction in attractions.iterator()}
+        buckets = {}
+        for entry in sorted(entries.values(), key=lambda entry: entry[0]):
+            for bucket in _buckets_of(entry):
+                buckets.setdefault(bucket, []).append(entry[0])  # Seaux triés par construction
+        with self._lock:
+            self._entries, self._buckets = entries, buckets
+            self._built_at = time.monotonic()
+            pending, self._pending = self._pending or [], None
+            for change in pending:
+                change()
+
+    def _ensure_fresh(self):
+        if self._built_at is None:
+            with self._build_lock:
+                if self._built_at is None:
+                    self.build()
+        elif time.monotonic() - self._built_at > index_settings()['TTL']:
+            # Un seul appel reconstruit ; les autres servent l'index courant
+            if self._build_lock.acquire(blocking=False):
+                try:
+                    if time.monotonic() - self._built_at > index_settings()['TTL']:
+                        self.build()
+                finally:
+                    self._build_lock.release()
+
+    def _change(self, change):
+        """Applique une modification à l'index courant et à celui en construction"""
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append(change)
+            if self._built_at is not None:
+                change()
+
+    def _insert(self, pk, entry):
+        self._entries[pk] = entry
+        for bucket in _buckets_of(entry):
+            insort(self._buckets.setdefault(bucket, []), entry[0])
+
+    def _remove(self, pk):
+        entry = self._entries.pop(pk, None)
+        if entry is None:
+            return
+        for bucket in _buckets_of(entry):
+            ranks = self._buckets.get(bucket, [])
+            idx = bisect_left(ranks, entry[0])
+            if idx < len(ranks) and ranks[idx] == entry[0]:
+                del ranks[idx]
+
+    def update(self, attractions):
+        """Ajoute ou remplace des attractions ; les inactives sont retirées"""
+        changes = [
+            (attraction.id, self._entry(attraction) if attraction.is_active else None)
+            for attraction in attractions
+        ]
+
+        def apply():
+            for pk, entry in changes:
+                self._remove(pk)
+                if entry is not None:
+                    self._insert(pk, entry)
+
+        self._change(apply)
+
+    def add_likes(self, deltas):
+        """Reporte des incréments de num_likes {id: delta} sur le classement"""
+        def apply():
+            for pk, delta in deltas.items():
+                entry = self._entries.get(pk)
+                if entry is None or not delta:
+                    continue
+                data = {**entry[1], 'num_likes': max(entry[1]['num_likes'] + delta, 0)}
+                self._remove(pk)
+                self._insert(pk, (_rank(data), data, entry[2]))
+
+        self._change(apply)
+
+    def discard(self, pk):
+        self._change(lambda: self._remove(pk))
+
+    def clear(self):
+        with self._lock:
+            self._entries, self._buckets = {}, {}
+            self._built_at = None
+
+    def suggest(self, query, limit=10, country=None):
+        """Les `limit` meilleures attractions (num_likes, rating) dont un mot commence par `query`"""
+        prefix = fold(query)
+        if len(prefix) < MIN_QUERY_LENGTH:
+            return []
+        self._ensure_fresh()
+        longest = BUCKET_LENGTHS[-1]
+        results = []
+        with self._lock:
+            for rank in self._buckets.get((country, prefix[:longest]), ()):
+                _, data, keys = self._entries[rank[2]]
+                if len(prefix) > longest and not any(key.startswith(prefix) for key in keys):
+                    continue
+                results.append(dict(data))
+                if len(results) >= limit:
+                    break
+        return results
+
+
+index = SuggestIndex()
@@ -1,3 +1,1541 @@
-from django.test import TestCase
+import asyncio
+import csv
+import importlib
+import io
+import json
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+from asgiref.sync import sync_to_async
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.db.models import F
+from django.test import AsyncRequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from . import async_views, caching, counters, geo, images, leaderboard, suggest, views
+from .counters import recount_countries
+from .ingestion import fields_from_details, upsert_attractions
+from .itinerary import plan_route
+from .db import READ_REPLICA, ReadReplicaRouter, read_replica_settings
+from .similarity import stale_attractions
+from .models import Country, Category, Attraction, AttractionImage, UserAttractionList, AttractionLike
+from .tripAdvisor import CircuitOpenError, RateLimitedError, TokenBucket, TripAdvisorError, TripAdvisorService
 
-# Create your tests here.
+
+class QueryCountTests(TestCase):
+    """Le nombre de requêtes SQL de chaque endpoint ne dépend pas du nombre de lignes"""
+
+    sizes = [2, 12]
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.country = Country.objects.create(
+            name='France', code='FR', capital='Paris',
+            capital_latitude=48.8566, capital_longitude=2.3522
+        )
+        cls.category = Category.objects.create(name='monument')
+        cls.user = User.objects.create_user('visitor')
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def populate(self, size):
+        for i in range(Attraction.objects.count(), size):
+            attraction = Attraction.objects.create(
+                tripadvisor_id=f'ta-{i}', name=f'Attraction {i}',
+                country=self.country, category=self.category,
+                city='Paris', address='Paris',
+                latitude=48.85 + i / 100, longitude=2.35 + i / 100,
+                images=['https://example.com/photo.jpg']
+            )
+            UserAttractionList.objects.create(user=self.user, attraction=attraction)
+            AttractionLike.objects.create(user=self.user, attraction=attraction)
+
+    def assertQueryCount(self, url, expected, authenticated=False):
+        if authenticated:
+            self.client.force_authenticate(self.user)
+        for size in self.sizes:
+            self.populate(size)
+            with self.subTest(url=url, size=size), self.assertNumQueries(expected):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+
+    def test_country_list(self):
+        self.assertQueryCount('/api/countries/', 2)
+
+    def test_search_tripadvisor_bulk_upsert(self):
+        url = '/api/countries/%d/search_tripadvisor/?q=musee' % self.country.pk
+        for size in self.sizes:
+            ids = [str(i) for i in range(size)]
+            results = {'data': [
+                {'location_id': i, 'name': f'Lieu {i}', 'address_obj': {'address_string': 'Paris'}}
+                for i in ids
+            ]}
+            with mock.patch.object(views.tripadvisor, 'search_locations', return_value=results):
+                # pays, savepoint, états précédents, upsert, relecture, recomptage (2),
+                # invalidation des similaires, release
+                with self.subTest(size=size), self.assertNumQueries(9):
+                    response = self.client.get(url)
+            self.assertEqual([item['tripadvisor_id'] for item in response.json()], ids)
+
+        self.country.refresh_from_db()
+        self.assertEqual(self.country.active_attractions_count, 12)
+
+    def test_attraction_list(self):
+        # Pagination par curseur : pas de COUNT(*)
+        self.assertQueryCount('/api/attractions/', 1)
+
+    def test_attraction_list_with_count(self):
+        self.assertQueryCount('/api/attractions/?count=1', 2)
+
+    def test_attraction_list_authenticated(self):
+        # + IDs aimés et sauvegardés, chargés une fois par requête
+        self.assertQueryCount('/api/attractions/', 3, authenticated=True)
+
+    def test_attraction_popular(self):
+        cache.clear()
+        url = '/api/attractions/popular/?country=%d&city=Par' % self.country.pk
+        self.populate(self.sizes[0])
+        self.client.get(url)  # absence de classement mise en cache
+        self.assertQueryCount(url, 3, authenticated=True)
+        # Classement matérialisé, tenu à jour par les likes : lecture du cache + clés primaires
+        leaderboard.rebuild()
+        self.sizes = [12, 20]
+        self.assertQueryCount('/api/attractions/popular/?country=%d' % self.country.pk, 3, authenticated=True)
+
+    def test_attraction_by_distance(self):
+        # coordonnées pour l'itinéraire, puis la page d'attractions
+        self.assertQueryCount('/api/attractions/by_distance/?latitude=48.85&longitude=2.35', 4, authenticated=True)
+
+    def test_country_popular_attractions(self):
+        self.assertQueryCount('/api/countries/%d/popular_attractions/' % self.country.pk, 4, authenticated=True)
+
+    def test_attraction_detail(self):
+        self.populate(12)
+        call_command('compute_similar', stdout=io.StringIO())
+        self.client.force_authenticate(self.user)
+        url = '/api/attractions/%d/' % Attraction.objects.first().pk
+        # attraction + similaires (une jointure) + likes/sauvegardes
+        with self.assertNumQueries(4):
+            response = self.client.get(url)
+        self.assertEqual(len(response.json()['similar_attractions']), 6)
+
+    def test_my_attractions(self):
+        self.assertQueryCount('/api/my-attractions/', 3, authenticated=True)
+
+    def test_my_attractions_by_distance(self):
+        self.assertQueryCount('/api/my-attractions/by_distance/?latitude=48.85&longitude=2.35', 4, authenticated=True)
+
+    def test_my_attractions_budget_total(self):
+        self.assertQueryCount('/api/my-attractions/budget_total/', 1, authenticated=True)
+        # Agrégat + plan par journée
+        self.assertQueryCount('/api/my-attractions/budget_total/?days=3', 2, authenticated=True)
+
+
+class BudgetTotalTests(TestCase):
+    def setUp(self):
+        country = Country.objects.create(
+            name='France', code='FR', capital='Paris',
+            capital_latitude=48.8566, capital_longitude=2.3522
+        )
+        self.user = User.objects.create_user('visitor')
+        for i, (price_level, visited) in enumerate([
+            ('free', True), ('budget', False), ('moderate', True), ('luxury', False), ('moderate', False),
+        ]):
+            attraction = Attraction.objects.create(
+                tripadvisor_id=f'ta-{i}', name=f'Attraction {i}', country=country,
+                city='Paris', address='Paris', latitude=48.85, longitude=2.35, price_level=price_level
+            )
+            UserAttractionList.objects.create(user=self.user, attraction=attraction, visited=visited)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_aggregated_budget_and_daily_plan(self):
+        data = self.client.get('/api/my-attractions/budget_total/?days=2').json()
+        self.assertEqual((data['total_budget'], data['count']), (160, 5))
+        self.assertEqual(data['by_price_level']['moderate'], {'count': 2, 'budget': 50})
+        self.assertEqual(data['by_price_level']['expensive'], {'count': 0, 'budget': 0})
+        self.assertEqual(data['visited'], {'count': 2, 'budget': 25})
+        self.assertEqual(data['remaining'], {'count': 3, 'budget': 135})
+        # Ordre d'ajout : 3 attractions le premier jour, 2 le second
+        self.assertEqual(data['days'], [
+            {'day': 1, 'count': 3, 'budget': 35},
+            {'day': 2, 'count': 2, 'budget': 125},
+        ])
+
+        self.assertEqual(self.client.get('/api/my-attractions/budget_total/?days=0').status_code, 400)
+        empty = APIClient()
+        empty.force_authenticate(User.objects.create_user('newcomer'))
+        data = empty.get('/api/my-attractions/budget_total/?days=1').json()
+        self.assertEqual((data['total_budget'], data['days']), (0, [{'day': 1, 'count': 0, 'budget': 0}]))
+
+
+def jpeg_bytes(width, height):
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.new('RGB', (width, height), (200, 120, 40)).save(buffer, 'JPEG', quality=95)
+    return buffer.getvalue()
+
+
+def call_command_output(*args, **options):
+    stdout = io.StringIO()
+    call_command(*args, stdout=stdout, **options)
+    return stdout.getvalue().strip()
+
+
+class ImagePipelineTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        patched = override_settings(MEDIA_ROOT=media_root, IMAGE_PIPELINE={'BACKGROUND': False})
+        patched.enable()
+        self.addCleanup(patched.disable)
+        country = Country.objects.create(
+            name='France', code='FR', capital='Paris',
+            capital_latitude=48.8566, capital_longitude=2.3522
+        )
+        self.attraction = Attraction.objects.create(
+            tripadvisor_id='1', name='Louvre', country=country, city='Paris',
+            address='Paris', latitude=48.8606, longitude=2.3376
+        )
+
+    def upload(self, content, name='photo.jpg'):
+        with self.captureOnCommitCallbacks(execute=True):
+            image = AttractionImage.objects.create(
+                attraction=self.attraction, image_file=SimpleUploadedFile(name, content, 'image/jpeg')
+            )
+        image.refresh_from_db()
+        return image
+
+    def test_upload_generates_content_addressed_variants(self):
+        original = jpeg_bytes(2400, 1200)
+        image = self.upload(original)
+        self.assertEqual(sorted((entry['width'], entry['height'], entry['format']) for entry in image.variants), [
+            (160, 80, 'jpeg'), (160, 80, 'webp'), (480, 240, 'jpeg'), (480, 240, 'webp'),
+            (1280, 640, 'jpeg'), (1280, 640, 'webp'),
+        ])
+        for entry in image.variants:
+            self.assertRegex(entry['path'], r'^variants/[0-9a-f]{2}/[0-9a-f]{62}\.(webp|jpg)$')
+            self.assertLess(default_storage.size(entry['path']), len(original))
+
+        # Même contenu : mêmes fichiers, écrits une seule fois
+        again = self.upload(original, 'copie.jpg')
+        self.assertEqual(again.variants, image.variants)
+        self.assertEqual(len(os.listdir(os.path.join(settings.MEDIA_ROOT, 'variants'))), 6)
+
+        # Attraction sans photo TripAdvisor : la première image envoyée devient l'image principale
+        item = APIClient().get('/api/attractions/').json()['results'][0]
+        card = next(e for e in image.variants if (e['width'], e['format']) == (480, 'jpeg'))
+        self.assertEqual(item['main_image'], 'http://testserver/media/' + card['path'])
+        self.assertEqual([c.split(' ')[1] for c in item['main_image_srcset'].split(', ')], ['160w', '480w', '1280w'])
+        self.assertIn('.webp 160w', item['main_image_srcset'])
+
+    def test_small_upload_is_never_enlarged(self):
+        image = self.upload(jpeg_bytes(300, 200))
+        self.assertEqual(sorted({(entry['width'], entry['height']) for entry in image.variants}),
+                         [(160, 107), (300, 200)])
+        self.assertEqual(call_command_output('generate_image_variants'), '0 images déclinées')
+        self.assertEqual(call_command_output('generate_image_variants', force=True), '1 images déclinées')
+
+    def test_tripadvisor_sizes_feed_the_srcset(self):
+        photo = {'images': {
+            size: {'url': f'https://example.com/{size}.jpg', 'width': width, 'height': width // 2}
+            for size, width in [('thumbnail', 50), ('small', 150), ('medium', 250), ('large', 550), ('original', 2000)]
+        }}
+        fields = fields_from_details({'name': 'Louvre'}, {'data': [photo]})
+        self.assertEqual(fields['images'], ['https://example.com/original.jpg'])
+        self.assertEqual([entry['width'] for entry in fields['image_variants']], [250, 550, 2000])
+
+        Attraction.objects.filter(pk=self.attraction.pk).update(**fields)
+        item = APIClient().get('/api/attractions/').json()['results'][0]
+        self.assertEqual(item['main_image'], 'https://example.com/large.jpg')
+        self.assertEqual(item['main_image_srcset'], 'https://example.com/medium.jpg 250w, '
+                         'https://example.com/large.jpg 550w, https://example.com/original.jpg 2000w')
+
+    def test_variants_rendered_in_process_pool(self):
+        rendered = images.pool().submit(images.render_variants, jpeg_bytes(800, 400), [160, 480], ['webp'], 80).result()
+        self.assertEqual([(width, height, image_format) for width, height, image_format, _ in rendered],
+                         [(160, 80, 'webp'), (480, 240, 'webp')])
+
+
+class KeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        country = Country.objects.create(
+            name='France', code='FR', capital='Paris',
+            capital_latitude=48.8566, capital_longitude=2.3522
+        )
+        # Égalités sur num_likes et notes nulles pour éprouver le départage
+        for i in range(7):
+            Attraction.objects.create(
+                tripadvisor_id=f'ta-{i}', name=f'Attraction {i}', country=country,
+                city='Paris', address='Paris', latitude=48.85, longitude=2.35,
+                num_likes=i // 3, rating=None if i % 2 else 4 + i / 10
+            )
+
+    def walk(self, url, key='next'):
+        pages = []
+        while url:
+            data = self.client.get(url).json()
+            pages.append([item['name'] for item in data['results']])
+            url = data[key]
+        return pages, data
+
+    def test_pages_cover_every_row_once_in_order(self):
+        for ordering in ['', '&ordering=rating', '&ordering=-rating', '&ordering=num_likes', '&search=attraction',
+                         '&latitude=48.8&longitude=2.3&ordering=distance']:
+            with self.subTest(ordering=ordering):
+                expected = [item['name'] for item in self.client.get(
+                    '/api/attractions/?page_size=100' + ordering).json()['results']]
+                pages, last = self.walk('/api/attractions/?page_size=2' + ordering)
+                self.assertEqual(sum(pages, []), expected)
+                self.assertEqual([len(page) for page in pages], [2, 2, 2, 1])
+
+                # Retour en arrière depuis la dernière page
+                back, _ = self.walk(last['previous'], key='previous')
+                self.assertEqual(sum(reversed(back), []), expected[:-1])
+
+    def test_next_page_seeks_the_index(self):
+        country = Country.objects.get()
+        for url, index in [('/api/attractions/?page_size=2', 'attraction_active_popular_idx'),
+                           ('/api/attractions/?page_size=2&country=%d' % country.pk, 'attraction_country_popular_idx')]:
+            with self.subTest(url=url):
+                next_page = self.client.get(url).json()['next']
+                with CaptureQueriesContext(connection) as queries:
+                    self.client.get(next_page)
+                sql = next(query['sql'] for query in queries.captured_queries if 'LIMIT' in query['sql'])
+                with connection.cursor() as cursor:
+                    cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+                    plan = ' '.join(row[-1] for row in cursor.fetchall())
+                # Plage lue dans l'index (num_likes<?), pas un parcours complet
+                self.assertRegex(plan, rf'SEARCH tourism_attraction USING INDEX {index} \(.*num_likes<\?\)')
+
+    def test_count_is_optional(self):
+        self.assertNotIn('count', self.client.get('/api/attractions/').json())
+        self.assertEqual(self.client.get('/api/attractions/?count=1').json()['count'], 7)
+        self.assertEqual(self.client.get('/api/attractions/?cursor=garbage').status_code, 404)
+
+
+class GeoRadiusTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        country = Country.objects.create(
+            name='France', code='FR', capital='Paris',
+            capital_latitude=48.8566, capital_longitude=2.3522
+        )
+        # Notre-Dame, Louvre (~1,3 km), Versailles (~18 km), Lyon (~390 km)
+        for name, latitude, longitude in [
+            ('Versailles', 48.8049, 2.1204), ('Louvre', 48.8606, 2.3376),
+            ('Lyon', 45.7640, 4.8357), ('Notre-Dame', 48.8530, 2.3499),
+        ]:
+            Attraction.objects.create(
+                tripadvisor_id=name, name=name, country=country, city=name,
+                address=name, latitude=latitude, longitude=longitude
+            )
+
+    def test_bounding_box(self):
+        lat_min, lat_max, lon_min, lon_max = geo.bounding_box(48.85, 2.35, 10)
+        self.assertAlmostEqual(lat_max - 48.85, 10 / geo.KM_PER_DEGREE)
+        self.assertGreater(lon_max - 2.35, lat_max - 48.85)  # un degré de longitude est plus court
+        # Le rectangle contient le cercle : ses bords sont au moins à `radius`
+        self.assertGreaterEqual(geo.haversine(48.85, 2.35, 48.85, lon_max), 10)
+        self.assertEqual(geo.bounding_box(89.99, 0, 50)[2:], (-180.0, 180.0))
+
+    def test_distance_expression_matches_haversine(self):
+        rows = geo.annotate_distance(Attraction.objects.all(), 48.8530, 2.3499).values_list(
+            'latitude', 'longitude', 'distance')
+        for latitude, longitude, distance in rows:
+            self.assertAlmostEqual(distance, geo.haversine(48.8530, 2.3499, float(latitude), float(longitude)), places=6)
+
+    def test_filter_by_radius(self):
+        def names(radius, latitude=48.8530, longitude=2.3499):
+            return sorted(geo.filter_by_radius(Attraction.objects.all(), latitude, longitude, radius)
+                          .values_list('name', flat=True))
+
+        self.assertEqual(names(1), ['Notre-Dame'])
+        self.assertEqual(names(5), ['Louvre', 'Notre-Dame'])
+        self.assertEqual(names(20), ['Louvre', 'Notre-Dame', 'Versailles'])
+        self.assertEqual(names(400), ['Louvre', 'Lyon', 'Notre-Dame', 'Versailles'])
+
+    def test_filter_by_radius_across_antimeridian(self):
+        fiji = Country.objects.create(name='Fidji', code='FJ', capital='Suva',
+                                      capital_latitude=-18.14, capital_longitude=178.44)
+        Attraction.objects.create(tripadvisor_id='taveuni', name='Taveuni', country=fiji, city='Taveuni',
+                                  address='', latitude=-16.85, longitude=179.95)
+        found = geo.filter_by_radius(Attraction.objects.all(), -16.85, -179.95, 20)
+        self.assertEqual([a.name for a in found], ['Taveuni'])
+        self.assertAlmostEqual(found[0].distance, 10.66, places=1)
+
+    def test_list_radius_and_distance_ordering(self):
+        data = self.client.get(
+            '/api/attractions/?latitude=48.8530&longitude=2.3499&radius=20&ordering=distance').json()
+        self.assertEqual([item['name'] for item in data['results']], ['Notre-Dame', 'Louvre', 'Versailles'])
+        distances = [item['distance'] for item in data['results']]
+        self.assertEqual(distances, sorted(distances))
+        self.assertLess(distances[-1], 20)
+
+        data = self.client.get('/api/attractions/?latitude=48.8530&longitude=2.3499&ordering=-distance').json()
+        self.assertEqual(data['results'][0]['name'], 'Lyon')
+
+    def test_invalid_coordinates_are_rejected(self):
+        for params in ('latitude=abc&longitude=2.35', 'latitude=48.85&longitude=2.35&radius=far'):
+            with self.subTest(params=params):
+                response = self.client.get('/api/attractions/?' + params)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('error', response.json())
+
+
+class GeohashTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.country = Country.objects.create(
+            name='France', code='FR', capital='Paris',
+            capital_latitude=48.8566, capital_longitude=2.3522
+        )
+        # Grille de 11 x 11 points espacés de 0,01° autour de Notre-Dame
+        Attraction.objects.bulk_create([
+            Attraction(
+                tripadvisor_id=f'ta-{i}-{j}', name=f'Point {i} {j}', country=cls.country, city='Paris',
+                address='', latitude=48.80 + i / 100, longitude=2.30 + j / 100,
+                geohash=geo.geohash_encode(48.80 + i / 100, 2.30 + j / 100)
+            )
+            for i in range(11) for j in range(11)
+        ])
+
+    def brute_force(self, latitude, longitude):
+        return sorted(
+            (geo.haversine(latitude, longitude, float(a.latitude), float(a.longitude)), a.pk)
+            for a in Attraction.objects.all()
+        )
+
+    def test_encode(self):
+        self.assertEqual(geo.geohash_encode(57.64911, 10.40744, 11), 'u4pruydqqvj')
+        self.assertEqual(geo.geohash_encode(42.6, -5.6, 5), 'ezs42')
+        self.assertEqual(geo.geohash_encode(-90, -180, 3), '000')
+        # Un préfixe commun pour des points voisins
+        self.assertEqual(geo.geohash_encode(48.8606, 2.3376, 6), geo.geohash_encode(48.8607, 2.3377, 6))
+
+    def test_neighbourhood(self):
+        cells = geo.geohash_neighbourhood(48.8606, 2.3376, 5)
+        self.assertEqual(len(cells), 9)
+        self.assertIn(geo.geohash_encode(48.8606, 2.3376, 5), cells)
+        dlat, dlon = geo.geohash_cell_size(5)
+        self.assertIn(geo.geohash_encode(48.8606 + dlat, 2.3376 - dlon, 5), cells)
+        # Pas de voisins au-delà du pôle ; l'antiméridien est franchi
+        self.assertEqual(len(geo.geohash_neighbourhood(89.99, 0, 2)), 6)
+        self.assertIn(geo.geohash_encode(0, -179.99, 3), geo.geohash_neighbourhood(0, 179.99, 3))
+
+    def test_nearest_matches_brute_force(self):
+        for latitude, longitude, k in [(48.853, 2.3499, 5), (48.80, 2.30, 12), (48.5, 2.0, 3)]:
+            with self.subTest(latitude=latitude, longitude=longitude):
+                expected = self.brute_force(latitude, longitude)[:k]
+                found = geo.nearest(Attraction.objects.all(), latitude, longitude, k=k)
+                self.assertEqual([pk for pk, _ in found], [pk for _, pk in expected])
+                self.assertAlmostEqual(found[-1][1], expected[-1][0])
+
+        within = geo.nearest(Attraction.objects.all(), 48.85, 2.35, radius=1.2)
+        expected = [pk for distance, pk in self.brute_force(48.85, 2.35) if distance <= 1.2]
+        self.assertEqual([pk for pk, _ in within], expected)
+        self.assertEqual(len(geo.nearest(Attraction.objects.all(), 48.85, 2.35, k=500)), 121)
+
+    def test_nearest_on_sparse_data(self):
+        # Sydney : aucune attraction dans les cellules de précision 1, repli exhaustif
+        found = geo.nearest(Attraction.objects.all(), -33.86, 151.2, k=2)
+        expected = self.brute_force(-33.86, 151.2)[:2]
+        self.assertEqual([pk for pk, _ in found], [pk for _, pk in expected])
+        self.assertAlmostEqual(found[0][1], expected[0][0], places=3)
+
+    def test_very_large_radius(self):
+        rng = random.Random(7)
+        points = [(round(rng.uniform(-80, 80), 4), round(rng.uniform(-180, 180), 4)) for _ in range(150)]
+        Attraction.objects.bulk_create([
+            Attraction(
+                tripadvisor_id=f'world-{i}', name=f'Monde {i}', country=self.country, city='',
+                address='', latitude=latitude, longitude=longitude,
+                geohash=geo.geohash_encode(latitude, longitude)
+            )
+            for i, (latitude, longitude) in enumerate(points)
+        ])
+        queryset = Attraction.objects.all()
+        for _ in range(30):
+            latitude, longitude = rng.uniform(-80, 80), rng.uniform(-180, 180)
+            with self.subTest(latitude=latitude, longitude=longitude):
+                expected = {pk for distance, pk in self.brute_force(latitude, longitude) if distance <= 3000}
+                self.assertEqual({pk for pk, _ in geo.nearest(queryset, latitude, longitude, radius=3000)}, expected)
+                self.assertEqual(
+                    {a.pk for a in geo.filter_by_radius(queryset, latitude, longitude, 3000)}, expected
+                )
+
+    def test_nearby_endpoint(self):
+        data = self.client.get('/api/attractions/nearby/?lat=48.853&lon=2.3499&k=3').json()
+        self.assertEqual(len(data), 3)
+        self.assertEqual([item['distance'] for item in data], sorted(item['distance'] for item in data))
+        self.assertEqual(data[0]['name'], 'Point 5 5')
+
+        self.assertEqual(len(self.client.get('/api/attractions/nearby/?lat=48.85&lon=2.35&k=0').json()), 1)
+        self.assertEqual(len(self.client.get('/api/attractions/nearby/?lat=48.85&lon=2.35&k=-2').json()), 1)
+        self.assertEqual(len(self.client.get('/api/attractions/nearby/?lat=48.85&lon=2.35&k=1000').json()), 100)
+        for params in ['k=abc', 'radius=far', 'lat=north']:
+            with self.subTest(params=params):
+                response = self.client.get('/api/attractions/nearby/?lat=48.85&lon=2.35&' + params)
+                self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.get('/api/attractions/nearby/?lat=48.85').status_code, 400)
+
+    def test_upsert_keeps_geohash_of_untouched_coordinates(self):
+        attraction = Attraction.objects.get(tripadvisor_id='ta-0-0')
+        geohash = attraction.geohash
+        # Résultat de recherche placé sur la capitale : coordonnées non écrasées
+        upsert_attractions([{
+            'tripadvisor_id': attraction.tripadvisor_id, 'name': 'Renommé', 'country': self.country,
+            'city': 'Paris', 'address': '', 'latitude': 0, 'longitude': 0,
+        }], update_fields=['name'])
+        attraction.refresh_from_db()
+        self.assertEqual((attraction.name, attraction.geohash), ('Renommé', geohash))
+
+    def test_geohash_backfill_migration(self):
+        from django.apps import apps
+        migration = importlib.import_module('tourism.migrations.0003_attraction_geohash')
+        Attraction.objects.update(geohash='')
+        migration.fill_geohash(apps, None)
+        for latitude, longitude, geohash in Attraction.objects.values_list('latitude', 'longitude', 'geohash'):
+            self.assertEqual(geohash, geo.geohash_encode(latitude, longitude))
+
+
+class RoutePlannerTests(SimpleTestCase):
+    def points(self, n, seed=1):
+        rng = random.Random(seed)
+        return [(48.8 + rng.random() / 10, 2.3 + rng.random() / 10) for _ in range(n)]
+
+    def greedy_length(self, points, start):
+        remaining, current, total = list(points), start, 0.0
+        while remaining:
+            nearest = min(remaining, key=lambda point: geo.haversine(*current, *point))
+            total += geo.haversine(*current, *nearest)
+            remaining.remove(nearest)
+            current = nearest
+        return total
+
+    def assert_valid(self, route, points, start=None, return_to_start=False):
+        self.assertEqual(sorted(route.order), list(range(len(points))))
+        stops = ([start] if start else []) + [points[i] for i in route.order]
+        if return_to_start:
+            stops.append(stops[0])
+        self.assertEqual(len(route.legs), len(stops) - 1)
+        for leg, a, b in zip(route.legs, stops, stops[1:]):
+            self.assertAlmostEqual(leg, geo.haversine(*a, *b), places=6)
+        self.assertAlmostEqual(route.total_distance, sum(route.legs))
+
+    def test_small_inputs(self):
+        self.assertEqual(plan_route([]), ([], [], 0.0))
+        self.assertEqual(plan_route([(48.85, 2.35)]).order, [0])
+        route = plan_route([(48.85, 2.35)], start=(48.86, 2.35), return_to_start=True)
+        self.assertEqual(route.order, [0])
+        self.assertEqual(len(route.legs), 2)
+
+    def test_points_on_a_line_are_visited_in_order(self):
+        rng = random.Random(2)
+        longitudes = [2.30 + i / 1000 for i in range(40)]
+        shuffled = rng.sample(longitudes, len(longitudes))
+        points = [(48.85, lon) for lon in shuffled]
+        route = plan_route(points, start=(48.85, 2.29))
+        self.assertEqual([points[i][1] for i in route.order], longitudes)
+        self.assert_valid(route, points, start=(48.85, 2.29))
+
+        # Sans départ imposé, le trajet part d'une extrémité
+        route = plan_route(points)
+        self.assertIn(points[route.order[0]][1], {longitudes[0], longitudes[-1]})
+
+    def test_valid_routes_beat_greedy(self):
+        start = (48.85, 2.35)
+        points = self.points(300)
+        for return_to_start in (False, True):
+            with self.subTest(return_to_start=return_to_start):
+                route = plan_route(points, start=start, return_to_start=return_to_start, time_budget=2)
+                self.assert_valid(route, points, start, return_to_start)
+                if not return_to_start:
+                    self.assertLess(route.total_distance, self.greedy_length(points, start) * 0.97)
+
+    def test_without_distance_matrix(self):
+        points = self.points(120, seed=3)
+        with_matrix = plan_route(points, start=(48.85, 2.35), time_budget=2)
+        with mock.patch('tourism.itinerary.MATRIX_LIMIT', 10):
+            route = plan_route(points, start=(48.85, 2.35), time_budget=2)
+        self.assert_valid(route, points, start=(48.85, 2.35))
+        self.assertAlmostEqual(route.total_distance, with_matrix.total_distance, delta=with_matrix.total_distance * 0.05)
+
+    def test_time_budget_covers_neighbour_lists(self):
+        points = self.points(3000, seed=4)
+        started = time.monotonic()
+        route = plan_route(points, start=(48.85, 2.35), time_budget=0.1)
+        self.assertLess(time.monotonic() - started, 0.5)
+        self.assertEqual(len(route.order), 3000)
+
+    def test_large_input_stays_within_budget(self):
+        rng = random.Random(5)
+        points = [(48.7 + rng.random() * 0.3, 2.2 + rng.random() * 0.3) for _ in range(20000)]
+        for start, return_to_start in ((None, False), ((48.85, 2.35), True)):
+            with self.subTest(start=start, return_to_start=return_to_start):
+                started = time.monotonic()
+                route = plan_route(points, start=start, return_to_start=return_to_start)
+                self.assertLess(time.monotonic() - started, 1.0)  # budget de 0,5 s, marge pour la CI
+                self.assert_valid(route, points, start, return_to_start)
+
+
+class RouteStreamingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.country = Country.objects.create(
+            name='France', code='FR', capital='Paris',
+            capital_latitude=48.8566, capital_longitude=2.3522
+        )
+        for i in range(5):
+            Attraction.objects.create(
+                tripadvisor_id=f'ta-{i}', name=f'Attraction {i}', country=cls.country,
+                city='Paris', address='Paris', latitude=48.85 + i / 100, longitude=2.35
+            )
+
+    url = '/api/attractions/by_distance/?latitude=48.84&longitude=2.35'
+
+    def test_route_is_paginated_with_cursors(self):
+        names, legs, url = [], [], self.url + '&limit=2'
+        while url:
+            data = self.client.get(url).json()
+            self.assertEqual(data['count'], 5)
+            names += [item['name'] for item in data['results']]
+            legs += data['legs']
+            url = data['next']
+        self.assertEqual(names, [f'Attraction {i}' for i in range(5)])
+        self.assertAlmostEqual(sum(legs), data['total_distance'])
+
+        previous = self.client.get(data['previous']).json()
+        self.assertEqual([item['name'] for item in previous['results']], names[2:4])
+
+    def test_ndjson_stream(self):
+        response = self.client.get(self.url + '&stream=ndjson')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson; charset=utf-8')
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual([row['name'] for row in rows], [f'Attraction {i}' for i in range(5)])
+        self.assertAlmostEqual(rows[0]['leg'], 1.11, places=2)
+
+    def test_popular_attractions_limit(self):
+        url = '/api/countries/%d/popular_attractions/?limit=' % self.country.pk
+        self.assertEqual(len(self.client.get(url + '3').json()), 3)
+        self.assertEqual(len(self.client.get(url + '-2').json()), 1)
+        self.assertEqual(len(self.client.get(url + 'abc').json()), 5)
+
+
+class ItineraryExportTests(TestCase):
+    def setUp(self):
+        country = Country.objects.create(
+            name='France', code='FR', capital='Paris',
+            capital_latitude=48.8566, capital_longitude=2.3522
+        )
+        self.user = User.objects.create_user('visitor')
+        # Alignées vers le nord : l'ordre de visite depuis le sud est connu
+        for name, latitude in [('Sacré-Cœur', 48.886), ('Louvre', 48.861), ('Panthéon, Paris', 48.846)]:
+            attraction = Attraction.objects.create(
+                tripadvisor_id=name, name=name, country=country,
+                city='Paris', address='Paris', latitude=latitude, longitude=2.34
+            )
+            UserAttractionList.objects.create(user=self.user, attraction=attraction, notes='à voir' if latitude > 48.88 else '')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def export(self, format, located=True, **params):
+        if located:
+            params = {'latitude': 48.80, 'longitude': 2.34, **params}
+        params = ''.join(f'&{key}={value}' for key, value in params.items())
+        return self.client.get(f'/api/my-attractions/export/?format={format}{params}')
+
+    def test_streamed_formats_follow_route_order(self):
+        response = self.export('gpx')
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/gpx+xml; charset=utf-8')
+        self.assertIn('attachment; filename="itinerary.gpx"', response['Content-Disposition'])
+        # L'en-tête part avant le calcul de l'itinéraire
+        with self.assertNumQueries(0):
+            self.assertTrue(next(response.streaming_content).startswith(b'<?xml'))
+        gpx = b''.join(response.streaming_content).decode()
+        self.assertEqual(gpx.count('<rtept'), 3)
+        self.assertLess(gpx.index('Panthéon'), gpx.index('Louvre'))
+        self.assertLess(gpx.index('Louvre'), gpx.index('Sacré-Cœur'))
+
+        rows = list(csv.DictReader(io.StringIO(b''.join(self.export('csv').streaming_content).decode())))
+        self.assertEqual([row['name'] for row in rows], ['Panthéon, Paris', 'Louvre', 'Sacré-Cœur'])
+        self.assertEqual(rows[2]['notes'], 'à voir')
+
+        stops = json.loads(b''.join(self.export('json').streaming_content))
+        self.assertEqual([stop['position'] for stop in stops], [1, 2, 3])
+
+        ics = b''.join(self.export('ics', start='2026-06-01T10:00').streaming_content).decode()
+        self.assertEqual(ics.count('BEGIN:VEVENT'), 3)
+        self.assertIn('DTSTART:20260601T100000', ics)
+        self.assertIn('SUMMARY:1. Panthéon\\, Paris', ics)
+
+    def test_without_start_position(self):
+        # Sans position : trajet ouvert, première étape nulle et n étapes pour n arrêts
+        stops = json.loads(b''.join(self.export('json', located=False).streaming_content))
+        self.assertEqual(len(stops), 3)
+        self.assertEqual(stops[1]['name'], 'Louvre')
+        # Chaque étape mène à son arrêt, quel que soit le sens du parcours
+        expected = {'Sacré-Cœur': [0.0, 2.78, 1.67], 'Panthéon, Paris': [0.0, 1.67, 2.78]}[stops[0]['name']]
+        self.assertEqual([round(stop['leg_km'], 2) for stop in stops], expected)
+
+        rows = list(csv.DictReader(io.StringIO(b''.join(self.export('csv', located=False).streaming_content).decode())))
+        self.assertEqual([row['leg_km'] for row in rows], [str(stop['leg_km']) for stop in stops])
+        gpx = b''.join(self.export('gpx', located=False).streaming_content).decode()
+        self.assertEqual(gpx.count('<rtept'), 3)
+        ics = b''.join(self.export('ics', located=False, start='2026-06-01T10:00').streaming_content).decode()
+        self.assertEqual(ics.count('BEGIN:VEVENT'), 3)
+
+    def test_single_item(self):
+        UserAttractionList.objects.exclude(attraction__name='Louvre').delete()
+        for located in (True, False):
+            for format in ('json', 'csv', 'gpx', 'ics'):
+                response = self.export(format, located=located)
+                self.assertIn('Louvre', b''.join(response.streaming_content).decode())
+        stops = json.loads(b''.join(self.export('json', located=False).streaming_content))
+        self.assertEqual([stop['leg_km'] for stop in stops], [0.0])
+
+    def test_errors(self):
+        self.assertEqual(self.export('pdf').status_code, 404)
+        self.assertEqual(self.export('ics', start='demain').status_code, 400)
+        self.client.force_authenticate(None)
+        response = self.export('gpx')
+        self.assertIn(response.status_code, (401, 403))
+        self.assertEqual(response['Content-Type'], 'application/json')
+
+
+class SimilarAttractionTests(TestCase):
+    def setUp(self):
+        country = Country.objects.create(
+            name='France', code='FR', capital='Paris',
+            capital_latitude=48.8566, capital_longitude=2.3522
+        )
+        museum = Category.objects.create(name='museum')
+        park = Category.objects.create(name='park')
+        self.attractions = {}
+        for key, city, category, latitude in [
+            ('louvre', 'Paris', museum, 48.861),
+            ('orsay', 'Paris', museum, 48.860),
+            ('tuileries', 'Paris', park, 48.863),
+            ('confluences', 'Lyon', museum, 45.733),
+        ]:
+            self.attractions[key] = Attraction.objects.create(
+                tripadvisor_id=key, name=key, country=country, category=category,
+                city=city, address=city, latitude=latitude, longitude=2.33
+            )
+
+    def similar(self, key):
+        data = self.client.get('/api/attractions/%d/' % self.attractions[key].pk).json()
+        return [item['name'] for item in data['similar_attractions']]
+
+    def compute(self, *args):
+        call_command('compute_similar', *args, stdout=io.StringIO())
+
+    def test_precomputed_ranking_and_incremental_refresh(self):
+        self.compute()
+        self.assertEqual(self.similar('louvre'), ['orsay', 'tuileries', 'confluences'])
+        self.assertEqual(stale_attractions().count(), 0)
+
+        # Orsay change de ville : elle-même et le Louvre, qui la cite, sont à recalculer
+        orsay = self.attractions['orsay']
+        orsay.city = 'Lyon'
+        orsay.latitude = 45.76
+        orsay.save()
+        self.assertEqual(set(stale_attractions().values_list('tripadvisor_id', flat=True)),
+                         {'orsay', 'louvre', 'tuileries', 'confluences'})
+        self.compute()
+        self.assertEqual(self.similar('louvre'), ['tuileries', 'orsay', 'confluences'])
+        self.assertEqual(self.similar('orsay'), ['confluences', 'louvre', 'tuileries'])
+
+
+class CountryCounterTests(TestCase):
+    def setUp(self):
+        self.france = Country.objects.create(
+            name='France', code='FR', capital='Paris',
+            capital_latitude=48.8566, capital_longitude=2.3522
+        )
+        self.spain = Country.objects.create(
+            name='Spain', code='ES', capital='Madrid',
+            capital_latitude=40.4168, capital_longitude=-3.7038
+        )
+
+    def create_attraction(self, tripadvisor_id, **kwargs):
+        return Attraction.objects.create(
+            tripadvisor_id=tripadvisor_id, name=tripadvisor_id,
+            country=self.france, city='Paris', address='Paris',
+            latitude=48.85, longitude=2.35, **kwargs
+        )
+
+    def assertCounts(self, france, spain):
+        self.france.refresh_from_db()
+        self.spain.refresh_from_db()
+        self.assertEqual(self.france.active_attractions_count, france)
+        self.assertEqual(self.spain.active_attractions_count, spain)
+
+    def test_counter_follows_attraction_changes(self):
+        louvre = self.create_attraction('louvre')
+        self.create_attraction('closed', is_active=False)
+        self.assertCounts(1, 0)
+
+        louvre = Attraction.objects.get(pk=louvre.pk)
+        louvre.country = self.spain
+        louvre.save()
+        self.assertCounts(0, 1)
+
+        louvre.is_active = False
+        louvre.save()
+        self.assertCounts(0, 0)
+
+        Attraction.objects.filter(tripadvisor_id='closed').update(is_active=True)
+        recount_countries()
+        self.assertCounts(1, 0)
+
+        Attraction.objects.all().delete()
+        self.assertCounts(0, 0)
+
+
+class LikeSaveCounterTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        country = Country.objects.create(
+            name='France', code='FR', capital='Paris',
+            capital_latitude=48.8566, capital_longitude=2.3522
+        )
+        self.attraction = Attraction.objects.create(
+            tripadvisor_id='louvre', name='Louvre', country=country,
+            city='Paris', address='Paris', latitude=48.86, longitude=2.33
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('visitor'))
+
+    def toggle(self, action):
+        return self.client.post('/api/attractions/%d/%s/' % (self.attraction.pk, action)).json()
+
+    def assertStored(self, num_likes, saves_count):
+        self.attraction.refresh_from_db()
+        self.assertEqual((self.attraction.num_likes, self.attraction.saves_count), (num_likes, saves_count))
+
+    def test_like_and_save_update_counters(self):
+        self.assertEqual(self.toggle('like'), {'liked': True, 'num_likes': 1})
+        self.toggle('save')
+        self.assertStored(1, 1)
+
+        self.assertEqual(self.toggle('like'), {'liked': False, 'num_likes': 0})
+        self.toggle('save')
+        self.assertStored(0, 0)
+
+    @override_settings(ATTRACTION_COUNTERS={'BUFFERED': True, 'FLUSH_INTERVAL': 60, 'FLUSH_SIZE': 100})
+    def test_buffered_counters_are_flushed_in_batches(self):
+        cache.set(counters.FLUSH_KEY, 1, 60)
+        self.assertEqual(self.toggle('like'), {'liked': True, 'num_likes': 1})
+        self.toggle('save')
+        self.assertStored(0, 0)
+
+        # Verrou et incréments en attente libérés au commit seulement
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(counters.flush(), 2)
+            self.assertEqual(counters.flush(), 0)
+        self.assertStored(1, 1)
+        self.assertEqual(counters.current_value(self.attraction.pk, 'num_likes'), 1)
+
+    @override_settings(ATTRACTION_COUNTERS={'BUFFERED': True, 'FLUSH_INTERVAL': 60, 'FLUSH_SIZE': 100})
+    def test_failed_flush_keeps_pending_increments(self):
+        cache.set(counters.FLUSH_KEY, 1, 60)
+        for _ in range(3):
+            counters.increment(self.attraction.pk, 'num_likes', 1)
+        # Un seul enregistrement au registre pour un même compteur
+        self.assertEqual(cache.get(counters.DIRTY_SEQ_KEY), 1)
+
+        with mock.patch('tourism.counters._apply', side_effect=RuntimeError('disk I/O error')):
+            with self.assertRaises(RuntimeError), self.captureOnCommitCallbacks(execute=True):
+                counters.flush()
+        self.assertEqual(counters.pending(self.attraction.pk, 'num_likes'), 3)
+        self.assertStored(0, 0)
+
+        counters.increment(self.attraction.pk, 'num_likes', 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            counters.flush()
+        self.assertStored(4, 0)
+        self.assertEqual(counters.pending(self.attraction.pk, 'num_likes'), 0)
+
+    @override_settings(ATTRACTION_COUNTERS={'BUFFERED': True, 'FLUSH_INTERVAL': 60, 'FLUSH_SIZE': 100})
+    def test_increment_never_waits_for_the_flush_lock(self):
+        cache.set(counters.FLUSH_KEY, 1, 60)
+        cache.set(counters.LOCK_KEY, 1, 60)  # flush en cours ailleurs
+        counters.increment(self.attraction.pk, 'saves_count', 1)
+        cache.delete(counters.LOCK_KEY)
+
+        # Numéro pris mais entrée pas encore écrite : attendue une fois, puis ignorée
+        cache.incr(counters.DIRTY_SEQ_KEY)
+        counters.increment(self.attraction.pk, 'num_likes', 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            counters.flush()
+        self.assertStored(0, 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            counters.flush()
+        self.assertStored(1, 1)
+
+
+    @override_settings(ATTRACTION_COUNTERS={'BUFFERED': True, 'FLUSH_INTERVAL': 60, 'FLUSH_SIZE': 100})
+    def test_flush_and_registration_share_the_registry_lock(self):
+        cache.set(counters.FLUSH_KEY, 1, 60)
+        counters.increment(self.attraction.pk, 'num_likes', 1)
+        cache.add(counters.REGISTRY_LOCK_KEY, 1, 60)  # flush en train de relever le registre
+        liked = threading.Thread(target=counters.increment, args=(self.attraction.pk, 'saves_count', 1))
+        liked.start()
+        liked.join(0.1)
+        self.assertTrue(liked.is_alive())  # inscription en attente, pas à moitié écrite
+        cache.delete(counters.REGISTRY_LOCK_KEY)
+        liked.join(5)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(counters.flush(), 2)
+        self.assertStored(1, 1)
+
+
+class LeaderboardTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.country = Country.objects.create(
+            name='France', code='FR', capital='Paris',
+            capital_latitude=48.8566, capital_longitude=2.3522
+        )
+        museum = Category.objects.create(name='attraction')
+        hotel = Category.objects.create(name='hotel')
+        self.attractions = {}
+        for key, city, category, num_likes in [
+            ('louvre', 'Paris', museum, 5),
+            ('ritz', 'Paris', hotel, 3),
+            ('confluences', 'Lyon', museum, 1),
+        ]:
+            self.attractions[key] = Attraction.objects.create(
+                tripadvisor_id=key, name=key, country=self.country, category=category,
+                city=city, address=city, latitude=48.86, longitude=2.33, num_likes=num_likes
+            )
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('visitor'))
+
+    def popular(self, **params):
+        params = ''.join(f'&{key}={value}' for key, value in params.items())
+        data = self.client.get('/api/attractions/popular/?country=%d%s' % (self.country.pk, params)).json()
+        return [item['name'] for item in data]
+
+    def test_boards_per_city_and_profile(self):
+        call_command('rebuild_leaderboards', stdout=io.StringIO())
+        self.assertEqual(self.popular(), ['louvre', 'ritz', 'confluences'])
+        self.assertEqual(self.popular(city='paris'), ['louvre', 'ritz'])
+        self.assertEqual(self.popular(profile_type='professional'), ['ritz'])
+        self.assertEqual(self.popular(city='Lyon', profile_type='local'), ['confluences'])
+
+    def test_likes_update_boards_incrementally(self):
+        leaderboard.rebuild()
+        confluences = self.attractions['confluences']
+        Attraction.objects.filter(pk=confluences.pk).update(num_likes=3)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/attractions/%d/like/' % confluences.pk)
+        # 4 likes : devant le Ritz (3), sans reconstruction
+        self.assertEqual(self.popular(), ['louvre', 'confluences', 'ritz'])
+        self.assertEqual(self.popular(city='Lyon'), ['confluences'])
+
+        confluences.is_active = False
+        confluences.save()
+        leaderboard.rebuild([self.country.pk])
+        self.assertEqual(self.popular(), ['louvre', 'ritz'])
+
+
+    def test_boards_updated_once_per_transaction(self):
+        leaderboard.rebuild()
+        user = User.objects.get(username='visitor')
+        with mock.patch.object(leaderboard, 'record') as record:
+            with self.captureOnCommitCallbacks(execute=True):
+                for key in ('ritz', 'confluences'):
+                    AttractionLike.objects.create(user=user, attraction=self.attractions[key])
+                record.assert_not_called()  # pas dans la transaction du like
+        record.assert_called_once_with({self.attractions['ritz'].pk, self.attractions['confluences'].pk})
+
+    def test_rolled_back_transaction_does_not_block_later_updates(self):
+        ritz, louvre = self.attractions['ritz'], self.attractions['louvre']
+        with mock.patch.object(leaderboard, 'record') as record:
+            with self.captureOnCommitCallbacks(execute=True):
+                try:
+                    with transaction.atomic():
+                        leaderboard.schedule([ritz.pk])
+                        raise RuntimeError
+                except RuntimeError:
+                    pass
+                leaderboard.schedule([louvre.pk])
+        record.assert_called_once_with({louvre.pk})
+
+    def test_partial_city_matches_fallback(self):
+        Attraction.objects.create(
+            tripadvisor_id='moulin', name='moulin', country=self.country, city='Cormeilles-en-Parisis',
+            address='Cormeilles', latitude=48.97, longitude=2.2, num_likes=9
+        )
+        leaderboard.rebuild()
+        # 'paris' recouvre deux villes : même résultat que sans classement
+        self.assertEqual(self.popular(city='paris'), ['moulin', 'louvre', 'ritz'])
+        self.assertEqual(self.popular(city='Cormeilles-en-Parisis'), ['moulin'])
+        self.assertEqual(self.popular(city='lyo'), ['confluences'])
+
+
+@override_settings(RESPONSE_CACHE={'ENABLED': True})
+class ConditionalCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        country = Country.objects.create(
+            name='France', code='FR', capital='Paris',
+            capital_latitude=48.8566, capital_longitude=2.3522
+        )
+        self.attraction = Attraction.objects.create(
+            tripadvisor_id='louvre', name='Louvre', country=country,
+            city='Paris', address='Paris', latitude=48.86, longitude=2.33
+        )
+        self.user = User.objects.create_user('visitor')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_etag_revalidation_and_version_bump(self):
+        url = '/api/attractions/%d/' % self.attraction.pk
+        first = self.client.get(url)
+        etag = first['ETag']
+        self.assertIn('private', first['Cache-Control'])
+
+        # Ni calcul ni accès à la base : réponse en cache, puis 304
+        with self.assertNumQueries(0):
+            cached = self.client.get(url)
+            not_modified = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(cached.content, first.content)
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified['ETag'], etag)
+
+        # Un like incrémente la version des attractions
+        self.client.post('/api/attractions/%d/like/' % self.attraction.pk)
+        refreshed = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(refreshed.status_code, 200)
+        self.assertNotEqual(refreshed['ETag'], etag)
+        self.assertTrue(refreshed.json()['is_liked'])
+
+    @override_settings(RESPONSE_CACHE={})
+    def test_enabled_only_with_a_shared_cache(self):
+        response = self.client.get('/api/attractions/%d/' % self.attraction.pk)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('ETag', response)  # LocMemCache : propre à chaque process
+        shared = {'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': '/tmp'}}
+        with override_settings(CACHES=shared):
+            self.assertTrue(caching.response_cache_settings()['ENABLED'])
+
+    @override_settings(ATTRACTION_COUNTERS={'BUFFERED': True, 'FLUSH_INTERVAL': 60, 'FLUSH_SIZE': 100})
+    def test_buffered_like_invalidates_user_flags(self):
+        url = '/api/attractions/%d/' % self.attraction.pk
+        cache.set(counters.FLUSH_KEY, 1, 60)  # pas de flush : compteur encore en attente
+        etag = self.client.get(url)['ETag']
+        self.client.post('/api/attractions/%d/save/' % self.attraction.pk)
+        refreshed = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(refreshed.status_code, 200)
+        self.assertTrue(refreshed.json()['is_saved'])
+
+    def test_key_normalizes_params_and_separates_users(self):
+        etag = self.client.get('/api/attractions/?city=Paris&category=').get('ETag')
+        self.assertEqual(self.client.get('/api/attractions/?city=Paris')['ETag'], etag)
+
+        self.client.force_authenticate(User.objects.create_user('other'))
+        self.assertNotEqual(self.client.get('/api/attractions/?city=Paris')['ETag'], etag)
+
+        # Les pays ne dépendent que de leur propre version
+        countries = self.client.get('/api/countries/')['ETag']
+        self.attraction.country.name = 'République française'
+        self.attraction.country.save()
+        self.assertNotEqual(self.client.get('/api/countries/')['ETag'], countries)
+
+
+class SQLiteTuningTests(TestCase):
+    def test_pragmas_applied_to_connections(self):
+        with connection.cursor() as cursor:
+            self.assertEqual(cursor.execute('PRAGMA synchronous').fetchone()[0], 1)  # NORMAL
+            self.assertEqual(cursor.execute('PRAGMA busy_timeout').fetchone()[0], 5000)
+            self.assertEqual(cursor.execute('PRAGMA temp_store').fetchone()[0], 2)  # MEMORY
+
+    def test_read_replica_router(self):
+        replica = read_replica_settings({'NAME': '/srv/db.sqlite3', 'OPTIONS': {}})
+        self.assertEqual(replica['NAME'], 'file:/srv/db.sqlite3?mode=ro')
+        self.assertTrue(replica['OPTIONS']['uri'])
+
+        router = ReadReplicaRouter()
+        self.assertEqual(router.db_for_write(Attraction), 'default')
+        with mock.patch.dict(settings.DATABASES, {READ_REPLICA: replica}):
+            # Dans une transaction de l'écrivain, les lectures restent sur celui-ci
+            self.assertEqual(router.db_for_read(Attraction), 'default')
+            with mock.patch.object(connection, 'in_atomic_block', False):
+                self.assertEqual(router.db_for_read(Attraction), READ_REPLICA)
+
+
+class SQLiteLoadTestTests(TransactionTestCase):
+    # La copie de la base demande une connexion hors transaction
+    def test_load_test_command(self):
+        country = Country.objects.create(
+            name='France', code='FR', capital='Paris',
+            capital_latitude=48.8566, capital_longitude=2.3522
+        )
+        Attraction.objects.create(
+            tripadvisor_id='louvre', name='Louvre', country=country,
+            city='Paris', address='Paris', latitude=48.86, longitude=2.33
+        )
+        out = io.StringIO()
+        call_command('loadtest_sqlite', readers=1, writers=1, duration=0.2, stdout=out)
+        self.assertIn('journal rollback', out.getvalue())
+        self.assertIn('WAL + PRAGMA', out.getvalue())
+
+
+class FullTextSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        country = Country.objects.create(
+            name='France', code='FR', capital='Paris',
+            capital_latitude=48.8566, capital_longitude=2.3522
+        )
+        for tripadvisor_id, name, description, num_likes in [
+            ('louvre', 'Musée du Louvre', 'Le plus grand musée du monde', 1),
+            ('orsay', "Musée d'Orsay", 'Impressionnistes', 2),
+            ('eiffel', 'Tour Eiffel', 'Vue sur le musée du quai Branly', 3),
+        ]:
+            Attraction.objects.create(
+                tripadvisor_id=tripadvisor_id, name=name, description=description,
+                country=country, city='Paris', address='Paris',
+                latitude=48.86, longitude=2.33, num_likes=num_likes
+            )
+
+    def search(self, url):
+        data = self.client.get(url).json()
+        if isinstance(data, dict):
+            data = data['results']
+        return [item['name'] for item in data]
+
+    def test_search_is_accent_insensitive_and_ranked(self):
+        # Le nom pèse plus que la description
+        self.assertEqual(self.search('/api/attractions/?search=musee'),
+                         ["Musée d'Orsay", 'Musée du Louvre', 'Tour Eiffel'])
+        self.assertEqual(self.search('/api/attractions/?search=MUS%C3%89E+louv'), ['Musée du Louvre'])
+        self.assertEqual(self.search('/api/attractions/?search=musee&ordering=-num_likes'),
+                         ['Tour Eiffel', "Musée d'Orsay", 'Musée du Louvre'])
+        self.assertEqual(self.search('/api/attractions/?search=%22*'), self.search('/api/attractions/'))
+
+    def test_popular_searches_names_only(self):
+        self.assertEqual(self.search('/api/attractions/popular/?search=musee'), ["Musée d'Orsay", 'Musée du Louvre'])
+
+    def test_index_follows_updates(self):
+        Attraction.objects.filter(tripadvisor_id='eiffel').update(name='Tour Montparnasse')
+        Attraction.objects.filter(tripadvisor_id='orsay').delete()
+        self.assertEqual(self.search('/api/attractions/?search=tour'), ['Tour Montparnasse'])
+        self.assertEqual(self.search('/api/attractions/?search=orsay'), [])
+
+
+class SuggestTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.country = Country.objects.create(
+            name='France', code='FR', capital='Paris',
+            capital_latitude=48.8566, capital_longitude=2.3522
+        )
+        for tripadvisor_id, name, city, num_likes in [
+            ('louvre', 'Musée du Louvre', 'Paris', 5),
+            ('orsay', "Musée d'Orsay", 'Paris', 9),
+            ('lumiere', 'Musée Lumière', 'Lyon', 1),
+        ]:
+            Attraction.objects.create(
+                tripadvisor_id=tripadvisor_id, name=name, country=cls.country,
+                city=city, address=city, latitude=48.86, longitude=2.33, num_likes=num_likes
+            )
+
+    def setUp(self):
+        suggest.index.clear()
+        self.addCleanup(suggest.index.clear)
+
+    def suggest(self, query):
+        return [item['name'] for item in self.client.get('/api/attractions/suggest/', {'q': query}).json()]
+
+    def test_prefix_matches_ranked_without_queries(self):
+        self.assertEqual(self.suggest('mus'), ["Musée d'Orsay", 'Musée du Louvre', 'Musée Lumière'])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.suggest('LOUV'), ['Musée du Louvre'])
+            self.assertEqual(self.suggest('du lou'), ['Musée du Louvre'])
+            self.assertEqual(self.suggest('lyo'), ['Musée Lumière'])
+            self.assertEqual(self.suggest('m'), [])
+
+    def test_invalid_parameters_are_rejected(self):
+        for params in ({'k': 'abc'}, {'country': 'undefined'}):
+            response = self.client.get('/api/attractions/suggest/', {'q': 'mus', **params})
+            self.assertEqual(response.status_code, 400)
+        response = self.client.get('/api/attractions/suggest/', {'q': 'mus', 'k': 0})
+        self.assertEqual(len(response.json()), 1)
+
+    def test_index_follows_saves_and_deletes(self):
+        self.suggest('mus')
+        with self.captureOnCommitCallbacks(execute=True):
+            lumiere = Attraction.objects.get(tripadvisor_id='lumiere')
+            lumiere.name = 'Institut Lumière'
+            lumiere.num_likes = 20
+            lumiere.save()
+            Attraction.objects.get(tripadvisor_id='orsay').delete()
+        self.assertEqual(self.suggest('mus'), ['Musée du Louvre'])
+        self.assertEqual(self.suggest('lum'), ['Institut Lumière'])
+
+    def test_likes_reorder_without_rebuild(self):
+        self.suggest('mus')
+        lumiere = Attraction.objects.get(tripadvisor_id='lumiere')
+        with self.captureOnCommitCallbacks(execute=True):
+            counters.increment(lumiere.pk, 'num_likes', 10)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.suggest('mus'), ['Musée Lumière', "Musée d'Orsay", 'Musée du Louvre'])
+            response = self.client.get('/api/attractions/suggest/', {'q': 'lum', 'country': self.country.pk})
+        self.assertEqual(response.json()[0]['num_likes'], 11)
+
+    def test_rebuild_serves_old_index_and_keeps_changes(self):
+        self.suggest('mus')
+        orsay = Attraction.objects.get(tripadvisor_id='orsay')
+        query = Attraction.objects.filter
+        served = []
+
+        def filter_during_rebuild(*args, **kwargs):
+            # Pendant la requête de reconstruction : l'ancien index répond
+            # sans attendre, et une suppression arrive
+            reader = threading.Thread(target=lambda: served.append(suggest.index.suggest('mus')))
+            reader.start()
+            reader.join(timeout=5)
+            suggest.index.discard(orsay.pk)
+            return query(*args, **kwargs)
+
+        suggest.index._built_at -= 3600
+        with mock.patch.object(Attraction.objects, 'filter', side_effect=filter_during_rebuild):
+            self.assertEqual(self.suggest('mus'), ['Musée du Louvre', 'Musée Lumière'])
+        self.assertEqual(len(served[0]), 3)
+
+
+class StubTripAdvisor(ThreadingHTTPServer):
+    """
+    Serveur HTTP local qui rejoue une liste de réponses (status, headers, corps),
+    ou appelle `responses(path)` si c'est une fonction.
+    """
+
+    def __init__(self, responses):
+        self.responses = responses if callable(responses) else list(responses)
+        self.hits = []
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(handler):
+                self.hits.append(handler.path)
+                status, headers, body = self.next_response(handler.path)
+                handler.send_response(status)
+                for name, value in {'Content-Type': 'application/json', **headers}.items():
+                    handler.send_header(name, value)
+                handler.end_headers()
+                handler.wfile.write(body if isinstance(body, bytes) else json.dumps(body).encode())
+
+            def log_message(handler, *args):
+                pass
+
+        super().__init__(('127.0.0.1', 0), Handler)
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    def next_response(self, path):
+        if callable(self.responses):
+            return self.responses(path)
+        return self.responses.pop(0) if self.responses else (200, {}, {})
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:%d' % self.server_address[1]
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class TripAdvisorClientTests(SimpleTestCase):
+    def client_for(self, responses, **options):
+        server = StubTripAdvisor(responses)
+        self.addCleanup(server.stop)
+        options.setdefault('cache_alias', None)
+        return server, TripAdvisorService(base_url=server.url, api_key='test', **options)
+
+    def test_retries_server_errors_honouring_retry_after(self):
+        server, client = self.client_for([
+            (503, {'Retry-After': '0'}, {}),
+            (429, {'Retry-After': '0'}, {}),
+            (200, {}, {'location_id': '42'}),
+        ])
+        self.assertEqual(client.get_location_details('42'), {'location_id': '42'})
+        self.assertEqual(len(server.hits), 3)
+
+    def test_retry_after_is_capped(self):
+        server, client = self.client_for([
+            (503, {'Retry-After': '3600'}, {}),
+            (200, {}, {'location_id': '42'}),
+        ], max_retry_after=0.1, backoff_factor=0)
+        started = time.monotonic()
+        self.assertEqual(client.get_location_details('42'), {'location_id': '42'})
+        self.assertLess(time.monotonic() - started, 5)
+        self.assertEqual(len(server.hits), 2)
+
+    async def test_async_retry_after_is_capped(self):
+        server, client = self.client_for([
+            (429, {'Retry-After': '3600'}, {}),
+            (200, {}, {'location_id': '42'}),
+        ], max_retry_after=0)
+        self.assertEqual(await asyncio.wait_for(client.aget_location_details('42'), 5), {'location_id': '42'})
+        await client.aclose()
+
+    def test_invalid_json_raises_client_error(self):
+        server, client = self.client_for([(200, {}, b'<html>maintenance</html>')] * 2)
+        with self.assertRaises(TripAdvisorError):
+            client.get_location_details('42')
+        with self.assertRaises(TripAdvisorError):
+            asyncio.run(client.aget_location_details('42'))
+
+    def test_circuit_opens_after_repeated_failures(self):
+        server, client = self.client_for(
+            [(500, {}, {})] * 2,
+            max_retries=0, circuit_failure_threshold=2, circuit_reset_timeout=60
+        )
+        for _ in range(2):
+            with self.assertRaises(TripAdvisorError):
+                client.get_location_photos('42')
+        with self.assertRaises(CircuitOpenError):
+            client.get_location_photos('42')
+        self.assertEqual(len(server.hits), 2)
+
+    def test_rate_limited_trial_does_not_block_half_open_circuit(self):
+        server, client = self.client_for(
+            [(500, {}, {}), (200, {}, {'location_id': '42'})],
+            max_retries=0, circuit_failure_threshold=1, circuit_reset_timeout=0,
+            rate_limit_burst=1, rate_limit_qps=0.001, rate_limit_timeout=0
+        )
+        with self.assertRaises(TripAdvisorError):
+            client.get_location_details('42')
+        # Circuit semi-ouvert, plus de jeton : l'essai échoue sans atteindre l'API
+        with self.assertRaises(RateLimitedError):
+            client.get_location_details('42')
+        with self.assertRaises(RateLimitedError):
+            asyncio.run(client.aget_location_details('42'))
+        self.assertFalse(client.breaker.trial_running)
+
+        client.rate_limiter.tokens = 1
+        self.assertEqual(client.get_location_details('42'), {'location_id': '42'})
+        self.assertEqual(len(server.hits), 2)
+
+    def test_bundle_returns_partial_results(self):
+        def respond(path):
+            if '/reviews' in path:
+                return 404, {}, {}
+            return 200, {}, {'path': path.split('?')[0]}
+
+        server, client = self.client_for(respond)
+        bundle = client.get_location_bundle('42')
+        self.assertEqual(bundle['details'], {'path': '/location/42/details'})
+        self.assertEqual(bundle['photos'], {'path': '/location/42/photos'})
+        self.assertIsNone(bundle['reviews'])
+        self.assertEqual(list(bundle['errors']), ['reviews'])
+
+    def test_concurrent_identical_calls_share_one_request(self):
+        def respond(path):
+            time.sleep(0.2)
+            return 200, {}, {'location_id': '42'}
+
+        server, client = self.client_for(respond)
+        with ThreadPoolExecutor(max_workers=5) as pool:
+            results = list(pool.map(lambda _: client.get_location_details('42'), range(5)))
+        self.assertEqual(results, [{'location_id': '42'}] * 5)
+        self.assertEqual(len(server.hits), 1)
+
+    def test_token_bucket_limits_bursts(self):
+        bucket = TokenBucket(rate=1, burst=2)
+        self.assertEqual([bucket.acquire(timeout=0) for _ in range(3)], [True, True, False])
+
+    def test_stale_responses_are_served_while_refreshing(self):
+        cache.clear()
+        server, client = self.client_for(
+            lambda path: (200, {}, {'fetched': len(server.hits)}),
+            cache_alias='default', cache_ttl={'details': 0}, cache_l1_ttl=0
+        )
+        self.assertEqual(client.get_location_details('42'), {'fetched': 1})
+        # Périmée : servie immédiatement, rafraîchie en arrière-plan
+        self.assertEqual(client.get_location_details('42'), {'fetched': 1})
+        client.executor.shutdown(wait=True)
+        self.assertEqual(len(server.hits), 2)
+
+    async def test_async_client_retries_and_shares_identical_calls(self):
+        def respond(path):
+            if len(server.hits) == 1:
+                return 503, {'Retry-After': '0'}, {}
+            time.sleep(0.1)
+            return 200, {}, {'path': path.split('?')[0]}
+
+        server, client = self.client_for(respond)
+        results = await asyncio.gather(*(client.aget_location_details('42') for _ in range(5)))
+        self.assertEqual(results, [{'path': '/location/42/details'}] * 5)
+        self.assertEqual(len(server.hits), 2)  # un seul appel, rejoué une fois après le 503
+
+        bundle = await client.aget_location_bundle('42', parts=('details', 'reviews'))
+        self.assertEqual(bundle['reviews'], {'path': '/location/42/reviews'})
+        self.assertEqual(bundle['errors'], {})
+        await client.aclose()
+
+    def test_empty_searches_are_cached(self):
+        cache.clear()
+        server, client = self.client_for(
+            lambda path: (200, {}, {'data': []}),
+            cache_alias='default', cache_negative_ttl=60
+        )
+        for _ in range(3):
+            self.assertEqual(client.search_locations('nowhere'), {'data': []})
+        self.assertEqual(len(server.hits), 1)
+
+
+class AsyncTripAdvisorViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.country = Country.objects.create(
+            name='France', code='FR', capital='Paris',
+            capital_latitude=48.8566, capital_longitude=2.3522
+        )
+        self.factory = AsyncRequestFactory()
+
+    def get(self, path):
+        request = self.factory.get(path)
+        request.user = AnonymousUser()
+        return request
+
+    async def test_search_upserts_results(self):
+        results = {'data': [{'location_id': '1', 'name': 'Louvre', 'address_obj': {'address_string': 'Paris'}}]}
+        with mock.patch.object(views.tripadvisor, 'asearch_locations', mock.AsyncMock(return_value=results)):
+            response = await async_views.search_tripadvisor(self.get('/?q=louvre'), pk=self.country.pk)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item['name'] for item in json.loads(response.content)], ['Louvre'])
+        self.assertTrue(await Attraction.objects.filter(tripadvisor_id='1', country=self.country).aexists())
+
+        response = await async_views.search_tripadvisor(self.get('/'), pk=0)
+        self.assertEqual(response.status_code, 404)
+
+    async def test_details_saved_and_errors_mapped(self):
+        attraction = await Attraction.objects.acreate(
+            tripadvisor_id='42', name='?', country=self.country,
+            city='Paris', address='Paris', latitude=48.86, longitude=2.33
+        )
+        bundle = {
+            'details': {'name': 'Louvre', 'category': {'name': 'attraction'}},
+            'photos': {'data': []}, 'reviews': None,
+            'errors': {'reviews': TripAdvisorError('TripAdvisor a répondu 404')},
+        }
+        with mock.patch.object(views.tripadvisor, 'aget_location_bundle', mock.AsyncMock(return_value=bundle)):
+            response = await async_views.details_from_tripadvisor(self.get('/'), pk=attraction.pk)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content)['errors'], {'reviews': 'TripAdvisor a répondu 404'})
+        await attraction.arefresh_from_db()
+        self.assertEqual(attraction.name, 'Louvre')
+
+        failed = {'details': None, 'photos': None, 'reviews': None, 'errors': {'details': CircuitOpenError('coupé')}}
+        with mock.patch.object(views.tripadvisor, 'aget_location_bundle', mock.AsyncMock(return_value=failed)):
+            response = await async_views.details_from_tripadvisor(self.get('/'), pk=attraction.pk)
+        self.assertEqual(response.status_code, 503)
+
+    def liked_during_call(self):
+        """Attraction likée pendant l'appel à TripAdvisor (UPDATE F() concurrent)"""
+        attraction = Attraction.objects.create(
+            tripadvisor_id='42', name='?', country=self.country, num_likes=3,
+            city='Paris', address='Paris', latitude=48.86, longitude=2.33
+        )
+        bundle = {'details': {'name': 'Louvre'}, 'photos': None, 'reviews': None, 'errors': {}}
+
+        def fetch(location_id):
+            Attraction.objects.filter(pk=attraction.pk).update(num_likes=F('num_likes') + 1)
+            return bundle
+        return attraction, fetch
+
+    def test_details_keep_likes_counted_during_the_call(self):
+        attraction, fetch = self.liked_during_call()
+        with mock.patch.object(views.tripadvisor, 'get_location_bundle', fetch):
+            self.client.get('/api/attractions/%d/details_from_tripadvisor/' % attraction.pk)
+        attraction.refresh_from_db()
+        self.assertEqual((attraction.name, attraction.num_likes), ('Louvre', 4))
+
+    async def test_async_details_keep_likes_counted_during_the_call(self):
+        attraction, fetch = await sync_to_async(self.liked_during_call)()
+        with mock.patch.object(views.tripadvisor, 'aget_location_bundle', sync_to_async(fetch)):
+            await async_views.details_from_tripadvisor(self.get('/'), pk=attraction.pk)
+        await attraction.arefresh_from_db()
+        self.assertEqual((attraction.name, attraction.num_likes), ('Louvre', 4))
+
+
+class SyncTripAdvisorTests(TestCase):
+    def setUp(self):
+        self.country = Country.objects.create(
+            name='France', code='FR', capital='Paris',
+            capital_latitude=48.8566, capital_longitude=2.3522
+        )
+        # Lieu déjà connu, placé sur la capitale par search_tripadvisor
+        Attraction.objects.create(
+            tripadvisor_id='1', name='Louvre', country=self.country, city='Paris',
+            address='', latitude=48.8566, longitude=2.3522, num_likes=7
+        )
+        self.server = StubTripAdvisor(self.respond)
+        self.addCleanup(self.server.stop)
+        self.checkpoint = os.path.join(tempfile.mkdtemp(), 'sync.json')
+
+    def respond(self, path):
+        if path.startswith('/location/nearby_search'):
+            return 200, {}, {'data': [{'location_id': '1'}, {'location_id': '2'}]}
+        location_id = path.split('/')[2]
+        if '/photos' in path:
+            return 200, {}, {'data': [{'images': {'original': {'url': f'https://example.com/{location_id}.jpg'}}}]}
+        return 200, {}, {
+            'name': f'Lieu {location_id}', 'latitude': '48.86%s' % location_id, 'longitude': '2.33',
+            'rating': '4.5', 'num_reviews': '120', 'address_obj': {'city': 'Paris', 'address_string': 'Paris'},
+        }
+
+    def sync(self, **options):
+        client = TripAdvisorService(base_url=self.server.url, api_key='test', cache_alias=None)
+        with mock.patch('tourism.management.commands.sync_tripadvisor.TripAdvisorService', return_value=client):
+            call_command('sync_tripadvisor', category=['museum'], checkpoint=self.checkpoint,
+                         stdout=io.StringIO(), **options)
+
+    def test_failed_parts_keep_stored_values(self):
+        Attraction.objects.filter(tripadvisor_id='1').update(
+            phone='+33 1 40 20 50 50', images=['https://example.com/louvre.jpg']
+        )
+        respond = self.respond
+        self.server.responses = lambda path: (404, {}, {}) if '/1/photos' in path else respond(path)
+        self.sync()
+        louvre = Attraction.objects.get(tripadvisor_id='1')
+        self.assertEqual((louvre.name, louvre.phone, louvre.images),
+                         ('Lieu 1', '+33 1 40 20 50 50', ['https://example.com/louvre.jpg']))
+        self.assertEqual(Attraction.objects.get(tripadvisor_id='2').images, ['https://example.com/2.jpg'])
+
+    def test_sync_records_real_coordinates_and_resumes(self):
+        self.sync()
+        louvre = Attraction.objects.get(tripadvisor_id='1')
+        self.assertEqual((float(louvre.latitude), louvre.num_likes, louvre.images),
+                         (48.861, 7, ['https://example.com/1.jpg']))
+        self.assertEqual(louvre.category.name, 'museum')
+        self.assertEqual(Attraction.objects.count(), 2)
+        self.country.refresh_from_db()
+        self.assertEqual(self.country.active_attractions_count, 2)
+
+        # Tranche déjà faite : aucun appel
+        hits = len(self.server.hits)
+        self.sync()
+        self.assertEqual(len(self.server.hits), hits)
+        self.sync(restart=True)
+        self.assertGreater(len(self.server.hits), hits)
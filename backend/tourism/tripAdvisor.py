@@ -1,59 +1,628 @@
-import os
+import asyncio
+import hashlib
+import json
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+import httpx
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from django.conf import settings
+from django.core.cache import cache, caches
+
+DEFAULT_CLIENT_SETTINGS = {
+    'BASE_URL': "https://api.content.tripadvisor.com/api/v1",
+    'CONNECT_TIMEOUT': 3.05,  # secondes
+    'READ_TIMEOUT': 10,
+    'MAX_RETRIES': 3,
+    'BACKOFF_FACTOR': 0.5,  # 0.5 s, 1 s, 2 s... (Retry-After est prioritaire)
+    'MAX_RETRY_AFTER': 30,  # plafond d'attente imposé par un Retry-After (secondes)
+    'POOL_SIZE': 20,
+    'ASYNC_POOL_SIZE': 200,  # connexions simultanées du client asynchrone (vues ASGI)
+    'FETCH_WORKERS': 8,  # appels parallèles maximum (get_location_bundle)
+    'CIRCUIT_FAILURE_THRESHOLD': 5,
+    'CIRCUIT_RESET_TIMEOUT': 30,  # secondes avant un nouvel essai
+    'RATE_LIMIT_QPS': 5,  # requêtes par seconde en moyenne
+    'RATE_LIMIT_BURST': 10,
+    'RATE_LIMIT_TIMEOUT': 5,  # attente maximum d'un jeton (secondes)
+    'RATE_LIMIT_SHARED': False,  # quota partagé entre workers via le cache
+    'CACHE_ALIAS': 'tripadvisor',  # None : pas de cache des réponses
+    'CACHE_TTL': {  # fraîcheur par endpoint (secondes)
+        'search': 6 * 3600,
+        'details': 24 * 3600,
+        'photos': 24 * 3600,
+        'reviews': 6 * 3600,
+    },
+    'CACHE_STALE_TTL': 7 * 24 * 3600,  # durée où une réponse périmée reste servie
+    'CACHE_NEGATIVE_TTL': 600,  # recherches sans résultat
+    'CACHE_L1_TTL': 60,  # copie en mémoire du process
+}
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class TripAdvisorError(Exception):
+    """Échec d'un appel à l'API TripAdvisor"""
+
+
+class CircuitOpenError(TripAdvisorError):
+    """L'API est considérée indisponible : appel refusé sans attendre"""
+
+
+class RateLimitedError(TripAdvisorError):
+    """Quota local épuisé : pas de jeton disponible dans le délai imparti"""
+
+
+class CappedRetry(Retry):
+    """Retry dont l'attente demandée par Retry-After est plafonnée à `max_retry_after` secondes"""
+
+    def __init__(self, *args, max_retry_after=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.max_retry_after = max_retry_after
+
+    def new(self, **kw):
+        # urllib3 recrée l'objet à chaque tentative
+        return super().new(max_retry_after=self.max_retry_after, **kw)
+
+    def get_retry_after(self, response):
+        retry_after = super().get_retry_after(response)
+        if retry_after is not None and self.max_retry_after is not None:
+            return min(retry_after, self.max_retry_after)
+        return retry_after
+
+
+class TokenBucket:
+    """Seau à jetons propre au process : `rate` jetons/s, au plus `burst` d'avance"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _take(self):
+        """Prend un jeton ; sinon retourne le temps d'attente estimé"""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.rate
+
+    def acquire(self, timeout):
+        deadline = time.monotonic() + timeout
+        while True:
+            wait = self._take()
+            if not wait:
+                return True
+            if time.monotonic() + wait > deadline:
+                return False
+            time.sleep(wait)
+
+    async def aacquire(self, timeout):
+        """acquire() sans bloquer la boucle d'événements"""
+        deadline = time.monotonic() + timeout
+        while True:
+            wait = self._take()
+            if not wait:
+                return True
+            if time.monotonic() + wait > deadline:
+                return False
+            await asyncio.sleep(wait)
+
+
+class SharedTokenBucket(TokenBucket):
+    """
+    Quota partagé par tous les workers via le cache : au plus `burst`
+    requêtes par fenêtre de burst / rate secondes (même débit moyen).
+    """
+
+    KEY = 'tripadvisor:rate'
+
+    def _take(self):
+        window = self.burst / self.rate
+        now = time.time()
+        slot = int(now / window)
+        key = f'{self.KEY}:{slot}'
+        cache.add(key, 0, int(window) + 1)
+        try:
+            used = cache.incr(key)
+        except ValueError:
+            # Clé expirée entre add et incr : on recommence à la prochaine itération
+            return 0.01
+        if used <= self.burst:
+            return 0
+        return (slot + 1) * window - now
+
+
+class SingleFlight:
+    """
+    Regroupe les appels identiques simultanés : le premier exécute la
+    fonction, les suivants attendent et reçoivent le même résultat.
+    """
+
+    class _Call:
+        def __init__(self):
+            self.done = threading.Event()
+            self.result = None
+            self.error = None
 
-class TripAdvisorService:
-    BASE_URL = "https://api.content.tripadvisor.com/api/v1"
-    
     def __init__(self):
-        self.api_key = settings.TRIPADVISOR_API_KEY
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = self._Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except Exception as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+
+class AsyncSingleFlight:
+    """
+    SingleFlight pour les coroutines : les appels identiques simultanés
+    d'une même boucle d'événements attendent la même tâche.
+    """
+
+    def __init__(self):
+        self._calls = {}
+
+    async def do(self, key, fn):
+        key = (asyncio.get_running_loop(), key)
+        task = self._calls.get(key)
+        if task is None:
+            task = self._calls[key] = asyncio.ensure_future(fn())
+            task.add_done_callback(lambda _: self._calls.pop(key, None))
+        # shield : l'annulation d'un appelant n'interrompt pas les autres
+        return await asyncio.shield(task)
+
+
+class ResponseCache:
+    """
+    Cache des réponses TripAdvisor à deux niveaux : le cache mémoire du
+    process (L1, court) devant un backend persistant (L2, par défaut
+    FileBasedCache : survit aux redémarrages et est commun aux workers).
+
+    Les entrées gardent leur date de récupération : une entrée périmée
+    reste servie pendant CACHE_STALE_TTL pendant qu'elle est rafraîchie.
+    """
+
+    def __init__(self, config):
+        self.l1 = cache
+        self.l2 = caches[config['CACHE_ALIAS']]
+        self.l1_ttl = config['CACHE_L1_TTL']
+        self.ttls = config['CACHE_TTL']
+        self.stale_ttl = config['CACHE_STALE_TTL']
+        self.negative_ttl = config['CACHE_NEGATIVE_TTL']
+
+    @staticmethod
+    def key(endpoint, path, params):
+        digest = hashlib.sha1(json.dumps([path, params], sort_keys=True, default=str).encode()).hexdigest()
+        return f'tripadvisor:{endpoint}:{digest}'
+
+    def get(self, key):
+        entry = self.l1.get(key)
+        if entry is None:
+            entry = self.l2.get(key)
+            if entry is not None:
+                self.l1.set(key, entry, self.l1_ttl)
+        return entry
+
+    async def aget(self, key):
+        entry = await self.l1.aget(key)
+        if entry is None:
+            entry = await self.l2.aget(key)
+            if entry is not None:
+                await self.l1.aset(key, entry, self.l1_ttl)
+        return entry
+
+    def _entry(self, endpoint, data):
+        negative = endpoint == 'search' and not data.get('data')
+        ttl = self.negative_ttl if negative else self.ttls[endpoint]
+        return {'data': data, 'fetched_at': time.time(), 'ttl': ttl}, ttl
+
+    def set(self, key, endpoint, data):
+        entry, ttl = self._entry(endpoint, data)
+        self.l1.set(key, entry, min(self.l1_ttl, ttl))
+        self.l2.set(key, entry, ttl + self.stale_ttl)
+
+    async def aset(self, key, endpoint, data):
+        entry, ttl = self._entry(endpoint, data)
+        await self.l1.aset(key, entry, min(self.l1_ttl, ttl))
+        await self.l2.aset(key, entry, ttl + self.stale_ttl)
+
+    def is_fresh(self, entry):
+        return time.time() - entry['fetched_at'] < entry['ttl']
+
+    def claim_refresh(self, key):
+        """Un seul rafraîchissement en arrière-plan par clé, tous workers confondus"""
+        return self.l2.add(f'{key}:refreshing', 1, 60)
+
+    async def aclaim_refresh(self, key):
+        return await self.l2.aadd(f'{key}:refreshing', 1, 60)
+
+    def release_refresh(self, key):
+        self.l2.delete(f'{key}:refreshing')
+
+
+class CircuitBreaker:
+    """
+    Coupe-circuit partagé entre threads : après `failure_threshold` échecs
+    consécutifs, les appels échouent immédiatement pendant `reset_timeout`
+    secondes, puis un seul appel d'essai est autorisé.
+    """
+
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if self.trial_running or time.monotonic() - self.opened_at < self.reset_timeout:
+                return False
+            self.trial_running = True
+            return True
+
+    def release(self):
+        """Appel autorisé abandonné sans résultat (quota, annulation) : l'essai reste à faire"""
+        with self._lock:
+            self.trial_running = False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self.trial_running = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+
+class TripAdvisorService:
+    """
+    Client de l'API TripAdvisor Content.
+
+    Une seule session HTTP (pool de connexions keep-alive) est partagée par
+    tous les threads ; timeouts, retries exponentiels sur 429/5xx et
+    coupe-circuit sont réglables via settings.TRIPADVISOR_CLIENT.
+
+    Les appels identiques simultanés (même lieu, même recherche) sont
+    regroupés en un seul appel, et le débit vers l'API est limité par un
+    seau à jetons (partageable entre workers via le cache).
+
+    Les réponses passent par ResponseCache (TTL par endpoint,
+    stale-while-revalidate, cache négatif des recherches vides).
+
+    Chaque appel a une variante asynchrone (asearch_locations,
+    aget_location_bundle...) sur un client httpx, pour les vues ASGI :
+    coupe-circuit, quota et cache sont communs aux deux variantes.
+    """
+
+    def __init__(self, base_url=None, api_key=None, **options):
+        config = {
+            **DEFAULT_CLIENT_SETTINGS,
+            **getattr(settings, 'TRIPADVISOR_CLIENT', {}),
+            **{key.upper(): value for key, value in options.items()},
+        }
+        self.base_url = (base_url or config['BASE_URL']).rstrip('/')
+        self.api_key = api_key or settings.TRIPADVISOR_API_KEY
         self.headers = {
             'accept': 'application/json',
         }
-    
-    def search_locations(self, query, latitude=None, longitude=None):
-        """Rechercher des lieux"""
-        url = f"{self.BASE_URL}/location/nearby_search"
+        self.timeout = (config['CONNECT_TIMEOUT'], config['READ_TIMEOUT'])
+        self.config = config
+        self.breaker = CircuitBreaker(
+            config['CIRCUIT_FAILURE_THRESHOLD'],
+            config['CIRCUIT_RESET_TIMEOUT']
+        )
+        bucket_class = SharedTokenBucket if config['RATE_LIMIT_SHARED'] else TokenBucket
+        self.rate_limiter = bucket_class(config['RATE_LIMIT_QPS'], config['RATE_LIMIT_BURST'])
+        self.in_flight = SingleFlight()
+        self.async_in_flight = AsyncSingleFlight()
+        self.responses = ResponseCache(config) if config['CACHE_ALIAS'] else None
+        self._session = None
+        self._executor = None
+        self._session_lock = threading.Lock()
+        self._async_clients = weakref.WeakKeyDictionary()  # boucle d'événements -> client httpx
+
+    @property
+    def session(self):
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    self._session = self._build_session()
+        return self._session
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            with self._session_lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.config['FETCH_WORKERS'],
+                        thread_name_prefix='tripadvisor'
+                    )
+        return self._executor
+
+    def async_client(self):
+        """Client httpx de la boucle d'événements courante (un client ne passe pas d'une boucle à l'autre)"""
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            client = self._async_clients[loop] = httpx.AsyncClient(
+                headers=self.headers,
+                timeout=httpx.Timeout(self.config['READ_TIMEOUT'], connect=self.config['CONNECT_TIMEOUT']),
+                limits=httpx.Limits(
+                    max_connections=self.config['ASYNC_POOL_SIZE'],
+                    max_keepalive_connections=self.config['POOL_SIZE'],
+                ),
+            )
+        return client
+
+    async def aclose(self):
+        client = self._async_clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.aclose()
+
+    def _build_session(self):
+        retry = CappedRetry(
+            total=self.config['MAX_RETRIES'],
+            backoff_factor=self.config['BACKOFF_FACTOR'],
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=frozenset(['GET']),
+            respect_retry_after_header=True,
+            max_retry_after=self.config['MAX_RETRY_AFTER'],
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=self.config['POOL_SIZE'],
+            pool_maxsize=self.config['POOL_SIZE'],
+            max_retries=retry,
+        )
+        session = requests.Session()
+        session.headers.update(self.headers)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
+    def _get(self, path, params):
+        key = (path, tuple(sorted(params.items())))
+        return self.in_flight.do(key, lambda: self._fetch(path, params))
+
+    def _cached_get(self, endpoint, path, params):
+        if self.responses is None:
+            return self._get(path, params)
+
+        key = self.responses.key(endpoint, path, params)
+        entry = self.responses.get(key)
+        if entry is not None:
+            if not self.responses.is_fresh(entry) and self.responses.claim_refresh(key):
+                self.executor.submit(self._refresh, key, endpoint, path, params)
+            return entry['data']
+
+        data = self._get(path, params)
+        self.responses.set(key, endpoint, data)
+        return data
+
+    async def _aget(self, path, params):
+        key = (path, tuple(sorted(params.items())))
+        return await self.async_in_flight.do(key, lambda: self._afetch(path, params))
+
+    async def _acached_get(self, endpoint, path, params):
+        if self.responses is None:
+            return await self._aget(path, params)
+
+        key = self.responses.key(endpoint, path, params)
+        entry = await self.responses.aget(key)
+        if entry is not None:
+            if not self.responses.is_fresh(entry) and await self.responses.aclaim_refresh(key):
+                # Rafraîchissement par le client synchrone : survit à la fin de la requête
+                self.executor.submit(self._refresh, key, endpoint, path, params)
+            return entry['data']
+
+        data = await self._aget(path, params)
+        await self.responses.aset(key, endpoint, data)
+        return data
+
+    def _refresh(self, key, endpoint, path, params):
+        """Rafraîchit une entrée périmée ; en cas d'échec l'ancienne reste servie"""
+        try:
+            self.responses.set(key, endpoint, self._get(path, params))
+        except TripAdvisorError:
+            pass
+        finally:
+            self.responses.release_refresh(key)
+
+    def _fetch(self, path, params):
+        if not self.breaker.allow():
+            raise CircuitOpenError("TripAdvisor temporairement indisponible")
+
+        try:
+            if not self.rate_limiter.acquire(self.config['RATE_LIMIT_TIMEOUT']):
+                raise RateLimitedError("Quota TripAdvisor atteint, réessayez plus tard")
+            response = self.session.get(
+                f"{self.base_url}{path}",
+                params={'key': self.api_key, 'language': 'fr', **params},
+                timeout=self.timeout
+            )
+        except requests.RequestException as exc:
+            self.breaker.record_failure()
+            raise TripAdvisorError(str(exc)) from exc
+        except BaseException:
+            # Sans réponse, l'essai du coupe-circuit semi-ouvert ne doit pas rester bloqué
+            self.breaker.release()
+            raise
+        return self._result(response.status_code, response.json)
+
+    def _result(self, status_code, load):
+        """Corps décodé d'une réponse, après mise à jour du coupe-circuit"""
+        if status_code in RETRY_STATUSES:
+            self.breaker.record_failure()
+            raise TripAdvisorError(f"TripAdvisor a répondu {status_code}")
+
+        # Une 4xx (lieu inconnu, clé invalide...) ne signifie pas que l'API est en panne
+        self.breaker.record_success()
+        if status_code >= 400:
+            raise TripAdvisorError(f"TripAdvisor a répondu {status_code}")
+        try:
+            return load()
+        except ValueError as exc:
+            raise TripAdvisorError("Réponse TripAdvisor illisible") from exc
+
+    def _retry_delay(self, attempt, response):
+        """Retry-After (plafonné) s'il est donné, sinon attente exponentielle (comme urllib3)"""
+        retry_after = response.headers.get('Retry-After') if response is not None else None
+        if retry_after is not None and retry_after.isdigit():
+            return min(int(retry_after), self.config['MAX_RETRY_AFTER'])
+        return self.config['BACKOFF_FACTOR'] * 2 ** attempt
+
+    async def _afetch(self, path, params):
+        if not self.breaker.allow():
+            raise CircuitOpenError("TripAdvisor temporairement indisponible")
+
+        try:
+            if not await self.rate_limiter.aacquire(self.config['RATE_LIMIT_TIMEOUT']):
+                raise RateLimitedError("Quota TripAdvisor atteint, réessayez plus tard")
+
+            # Retries faits ici : le transport httpx ne rejoue que les échecs de connexion
+            retries = self.config['MAX_RETRIES']
+            for attempt in range(retries + 1):
+                response, error = None, None
+                try:
+                    response = await self.async_client().get(
+                        f"{self.base_url}{path}",
+                        params={'key': self.api_key, 'language': 'fr', **params},
+                    )
+                except httpx.HTTPError as exc:
+                    error = exc
+                if (response is not None and response.status_code not in RETRY_STATUSES) or attempt == retries:
+                    break
+                await asyncio.sleep(self._retry_delay(attempt, response))
+        except BaseException:
+            # Quota épuisé ou appel annulé : l'essai du coupe-circuit semi-ouvert est libéré
+            self.breaker.release()
+            raise
+
+        if response is None:
+            self.breaker.record_failure()
+            raise TripAdvisorError(str(error)) from error
+        return self._result(response.status_code, response.json)
+
+    @staticmethod
+    def _search_params(query, latitude, longitude, category):
         params = {
-            'key': self.api_key,
             'searchQuery': query,
-            'language': 'fr'
         }
         if latitude and longitude:
             params['latLong'] = f"{latitude},{longitude}"
-        
-        response = requests.get(url, headers=self.headers, params=params)
-        return response.json()
-    
+        if category:
+            params['category'] = category
+        return params
+
+    def search_locations(self, query, latitude=None, longitude=None, category=None):
+        """Rechercher des lieux (category : hotels, attractions, restaurants, geos)"""
+        params = self._search_params(query, latitude, longitude, category)
+        return self._cached_get('search', "/location/nearby_search", params)
+
+    async def asearch_locations(self, query, latitude=None, longitude=None, category=None):
+        params = self._search_params(query, latitude, longitude, category)
+        return await self._acached_get('search', "/location/nearby_search", params)
+
     def get_location_details(self, location_id):
         """Obtenir les détails d'un lieu"""
-        url = f"{self.BASE_URL}/location/{location_id}/details"
-        params = {
-            'key': self.api_key,
-            'language': 'fr'
-        }
-        
-        response = requests.get(url, headers=self.headers, params=params)
-        return response.json()
-    
+        return self._cached_get('details', f"/location/{location_id}/details", {})
+
     def get_location_photos(self, location_id):
         """Obtenir les photos d'un lieu"""
-        url = f"{self.BASE_URL}/location/{location_id}/photos"
-        params = {
-            'key': self.api_key,
-            'language': 'fr'
-        }
-        
-        response = requests.get(url, headers=self.headers, params=params)
-        return response.json()
-    
+        return self._cached_get('photos', f"/location/{location_id}/photos", {})
+
     def get_location_reviews(self, location_id):
         """Obtenir les avis d'un lieu"""
-        url = f"{self.BASE_URL}/location/{location_id}/reviews"
-        params = {
-            'key': self.api_key,
-            'language': 'fr'
+        return self._cached_get('reviews', f"/location/{location_id}/reviews", {})
+
+    def get_location_bundle(self, location_id, parts=('details', 'photos', 'reviews')):
+        """
+        Détails, photos et avis d'un lieu, demandés en parallèle.
+
+        Retourne {'details': ..., 'photos': ..., 'reviews': ..., 'errors': {}} ;
+        une partie en échec vaut None et son exception est dans `errors`.
+        """
+        fetchers = {
+            'details': self.get_location_details,
+            'photos': self.get_location_photos,
+            'reviews': self.get_location_reviews,
         }
-        
-        response = requests.get(url, headers=self.headers, params=params)
-        return response.json()
\ No newline at end of file
+        futures = {part: self.executor.submit(fetchers[part], location_id) for part in parts}
+
+        bundle = {'errors': {}}
+        for part, future in futures.items():
+            try:
+                bundle[part] = future.result()
+            except TripAdvisorError as exc:
+                bundle[part] = None
+                bundle['errors'][part] = exc
+        return bundle
+
+    async def aget_location_details(self, location_id):
+        return await self._acached_get('details', f"/location/{location_id}/details", {})
+
+    async def aget_location_photos(self, location_id):
+        return await self._acached_get('photos', f"/location/{location_id}/photos", {})
+
+    async def aget_location_reviews(self, location_id):
+        return await self._acached_get('reviews', f"/location/{location_id}/reviews", {})
+
+    async def aget_location_bundle(self, location_id, parts=('details', 'photos', 'reviews')):
+        """get_location_bundle() en coroutines concurrentes, sans thread"""
+        fetchers = {
+            'details': self.aget_location_details,
+            'photos': self.aget_location_photos,
+            'reviews': self.aget_location_reviews,
+        }
+        results = await asyncio.gather(
+            *(fetchers[part](location_id) for part in parts), return_exceptions=True
+        )
+
+        bundle = {'errors': {}}
+        for part, result in zip(parts, results):
+            if isinstance(result, TripAdvisorError):
+                bundle[part] = None
+                bundle['errors'][part] = result
+            elif isinstance(result, BaseException):
+                raise result
+            else:
+                bundle[part] = result
+        return bundle
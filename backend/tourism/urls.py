@@ -1,7 +1,8 @@
 # tourism/urls.py
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from . import views
+from . import async_views, views
 
 router = DefaultRouter()
 router.register(r'countries', views.CountryViewSet, basename='country')
@@ -12,6 +13,13 @@ urlpatterns = [
     path('', include(router.urls)),
 ]
 
+# Sous ASGI : endpoints TripAdvisor asynchrones, prioritaires sur les actions des viewsets
+if settings.TRIPADVISOR_ASYNC_VIEWS:
+    urlpatterns = [
+        path('countries/<int:pk>/search_tripadvisor/', async_views.search_tripadvisor),
+        path('attractions/<int:pk>/details_from_tripadvisor/', async_views.details_from_tripadvisor),
+    ] + urlpatterns
+
 # Les endpoints disponibles seront :
 # GET  /api/countries/                           → Liste des pays
 # GET  /api/countries/{id}/                      → Détail d'un pays
@@ -22,10 +30,13 @@ urlpatterns = [
 # GET  /api/attractions/{id}/                   → Détail attraction
 # GET  /api/attractions/popular/                → Les plus populaires
 # GET  /api/attractions/by_distance/            → Triées par distance
+# GET  /api/attractions/nearby/?lat=&lon=&k=    → Les k plus proches
+# GET  /api/attractions/suggest/?q=             → Autocomplétion (nom, ville)
 # GET  /api/attractions/{id}/details_from_tripadvisor/ → Détails TripAdvisor
 # POST /api/attractions/{id}/like/              → Ajouter un like
 # POST /api/attractions/{id}/save/              → Ajouter à ma liste
 #
 # GET  /api/my-attractions/                     → Ma liste
 # GET  /api/my-attractions/by_distance/         → Ma liste par distance
-# GET  /api/my-attractions/budget_total/        → Budget total
\ No newline at end of file
+# GET  /api/my-attractions/budget_total/        → Budget total
+# GET  /api/my-attractions/export/?format=      → Itinéraire GPX / ICS / CSV / JSON (streamé)
\ No newline at end of file
@@ -1,32 +1,318 @@
+import base64
+import binascii
+import uuid
+from datetime import datetime
 from rest_framework import viewsets, filters, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticatedOrReadOnly
-from django.db.models import Q, Count
+from rest_framework.permissions import IsAuthenticated, IsAuthenticatedOrReadOnly
+from rest_framework.utils.urls import replace_query_param
+from django.db import connections
+from django.db.models import Case, Count, F, IntegerField, Prefetch, Q, Sum, Value, When, Window
+from django.db.models.functions import Coalesce, Ntile
+from django.http import StreamingHttpResponse
 from django.core.cache import cache
-from .models import Country, Attraction, UserAttractionList, AttractionLike, Category
+from .models import (
+    PRICE_COSTS, PROFILE_CATEGORIES, PriceLevel, Country, Attraction, UserAttractionList, AttractionLike, Category, SimilarAttraction
+)
 from .serializers import (
     CountrySerializer, AttractionListSerializer, 
     AttractionDetailSerializer, UserAttractionListSerializer
 )
-from .tripAdvisor import TripAdvisorService
-import math
+from .tripAdvisor import CircuitOpenError, RateLimitedError, TripAdvisorError, TripAdvisorService
+from .ingestion import fields_from_details, upsert_attractions
+from .caching import ConditionalCacheMixin
+from .itinerary import plan_route
+from .pagination import KeysetPagination
+from .search import SEARCH_RANK, FullTextSearchFilter, full_text_search
+from .renderers import EXPORT_RENDERERS
+from .streaming import STREAM_CHUNK_SIZE, iter_in_bulk, iter_serialized, ndjson_response
+from . import counters, geo, leaderboard, suggest
 
 tripadvisor = TripAdvisorService()
 
-class CountryViewSet(viewsets.ReadOnlyModelViewSet):
+def tripadvisor_error_status(exc):
+    """503 si l'appel n'a pas été tenté (coupe-circuit, quota), 502 pour une erreur de l'API"""
+    if isinstance(exc, (CircuitOpenError, RateLimitedError)):
+        return status.HTTP_503_SERVICE_UNAVAILABLE
+    return status.HTTP_502_BAD_GATEWAY
+
+def tripadvisor_error_response(exc):
+    return Response({'error': str(exc)}, status=tripadvisor_error_status(exc))
+
+# Vues TripAdvisor : logique commune aux versions synchrones (ci-dessous) et
+# asynchrones (async_views.py)
+SEARCH_RESULTS_LIMIT = 20
+DETAILS_CACHE_TIMEOUT = 3600
+
+def search_rows(country, results):
+    """Lignes à upserter pour les résultats d'une recherche TripAdvisor dans un pays"""
+    return [
+        {
+            'tripadvisor_id': item.get('location_id'),
+            'country': country,
+            'name': item.get('name'),
+            'address': item.get('address_obj', {}).get('address_string', ''),
+            # Ville et position provisoires pour un nouveau lieu : les valeurs
+            # réelles viennent des détails (sync_tripadvisor) et ne sont
+            # jamais écrasées ici
+            'city': country.capital,
+            'latitude': country.capital_latitude,
+            'longitude': country.capital_longitude,
+            'is_active': True,
+        }
+        for item in results['data'][:SEARCH_RESULTS_LIMIT]
+    ]
+
+def upsert_search_results(country, results, context):
+    """Upsert des résultats (transaction) puis sérialisation pour la réponse"""
+    attractions = upsert_attractions(
+        search_rows(country, results),
+        update_fields=['country', 'name', 'address', 'is_active']
+    )
+    return AttractionListSerializer(attractions, many=True, context=context).data
+
+def details_cache_key(attraction):
+    return f'tripadvisor_details_{attraction.tripadvisor_id}'
+
+def apply_details(attraction, bundle):
+    """
+    Reporte les détails / photos TripAdvisor sur l'attraction (sans
+    l'enregistrer) et retourne les champs modifiés, pour un save(update_fields=...)
+    qui n'écrase pas les compteurs incrémentés pendant l'appel à l'API.
+    """
+    fields = fields_from_details(bundle['details'], bundle['photos'])
+    for field, value in fields.items():
+        setattr(attraction, field, value)
+    return list(fields)
+
+def details_response(bundle):
+    return {
+        'details': bundle['details'],
+        'photos': bundle['photos'],
+        'reviews': bundle['reviews'],
+        'errors': {part: str(exc) for part, exc in bundle['errors'].items()}
+    }
+
+# Colonnes lues par AttractionListSerializer : évite de charger les gros JSON inutiles
+ATTRACTION_LIST_FIELDS = [
+    'id', 'tripadvisor_id', 'name', 'city', 'latitude', 'longitude',
+    'price_level', 'rating', 'num_reviews', 'num_likes', 'images', 'image_variants',
+    'country__name', 'category__name',
+]
+
+def shape_for_list(queryset, prefix='', extra_fields=()):
+    """Projection + jointures pour sérialiser des attractions en liste (une seule requête)"""
+    return queryset.select_related(
+        f'{prefix}country', f'{prefix}category'
+    ).only(*extra_fields, *(f'{prefix}{field}' for field in ATTRACTION_LIST_FIELDS))
+
+# Paramètres de /attractions/popular/ servis par un classement matérialisé
+LEADERBOARD_PARAMS = {'country', 'city', 'profile_type', 'language'}
+
+POPULAR_DEFAULT_LIMIT = 10
+
+NEARBY_DEFAULT_K = 10
+NEARBY_MAX_K = 100
+
+ROUTE_PAGE_SIZE = 100
+ROUTE_MAX_PAGE_SIZE = 500
+ROUTE_CACHE_TIMEOUT = 15 * 60  # durée de validité des curseurs d'itinéraire
+
+def plan_attraction_route(queryset, latitude, longitude, return_to_start):
+    """
+    Itinéraire optimisé : ids des attractions dans l'ordre de visite et
+    étapes (km), legs[i] menant à la i-ème attraction (+ retour au départ
+    en fin de trajet). Sans position de départ, le trajet part d'où il est
+    le plus court et sa première étape est nulle.
+    """
+    rows = list(queryset.order_by().values_list('id', 'latitude', 'longitude'))
+    start = None
+    if latitude is not None and longitude is not None:
+        start = (float(latitude), float(longitude))
+    route = plan_route(
+        [(float(lat), float(lon)) for _, lat, lon in rows],
+        start=start,
+        return_to_start=return_to_start
+    )
+    return {
+        'ids': [rows[i][0] for i in route.order],
+        'legs': route.legs if start is not None else [0.0, *route.legs],
+        'total_distance': route.total_distance,
+    }
+
+def route_cursor(request, token, offset):
+    cursor = base64.urlsafe_b64encode(f'{token}:{offset}'.encode()).decode()
+    return replace_query_param(request.build_absolute_uri(), 'cursor', cursor)
+
+def route_response(request, queryset, serializer_class, context, latitude, longitude):
+    """
+    Attractions de `queryset` ordonnées en itinéraire depuis la position donnée.
+
+    Les coordonnées seules sont chargées pour calculer l'itinéraire ; les
+    attractions ne sont lues et sérialisées que pour la page demandée
+    (?limit=, ?cursor=). L'itinéraire est mis en cache derrière le curseur :
+    les pages suivantes restent cohérentes sans le recalculer.
+    ?stream=ndjson renvoie tout l'itinéraire en NDJSON, par paquets.
+    """
+    return_to_start = request.query_params.get('return_to_start') in ('1', 'true')
+    token, offset = None, 0
+    planned = None
+    cursor = request.query_params.get('cursor')
+    if cursor:
+        try:
+            token, offset = base64.urlsafe_b64decode(cursor).decode().split(':')
+            offset = int(offset)
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            raise NotFound('Curseur invalide.')
+        planned = cache.get(f'route:{token}')
+    if planned is None:
+        planned = plan_attraction_route(queryset, latitude, longitude, return_to_start)
+    ids, legs = planned['ids'], planned['legs']
+
+    if request.query_params.get('stream') == 'ndjson':
+        leg_by_id = dict(zip(ids, legs))
+        rows = iter_serialized(iter_in_bulk(queryset, ids), serializer_class, context)
+        return ndjson_response({**row, 'leg': leg_by_id[row['id']]} for row in rows)
+
+    try:
+        limit = int(request.query_params.get('limit', ROUTE_PAGE_SIZE))
+    except ValueError:
+        limit = ROUTE_PAGE_SIZE
+    limit = max(1, min(limit, ROUTE_MAX_PAGE_SIZE))
+    end = offset + limit
+
+    next_url = previous_url = None
+    if end < len(ids) or offset > 0:
+        if token is None:
+            token = uuid.uuid4().hex
+        cache.set(f'route:{token}', planned, ROUTE_CACHE_TIMEOUT)
+        if end < len(ids):
+            next_url = route_cursor(request, token, end)
+        if offset > 0:
+            previous_url = route_cursor(request, token, max(0, offset - limit))
+
+    page = list(iter_in_bulk(queryset, ids[offset:end], chunk_size=limit))
+    serializer = serializer_class(page, many=True, context=context)
+    return Response({
+        'count': len(ids),
+        'total_distance': planned['total_distance'],
+        # Étape menant à chaque attraction de la page (+ retour au départ en fin de trajet)
+        'legs': legs[offset:end] if end < len(ids) else legs[offset:],
+        'next': next_url,
+        'previous': previous_url,
+        'results': serializer.data
+    })
+
+EXPORT_VALUES = {
+    'id': 'attraction_id', 'name': 'attraction__name', 'city': 'attraction__city',
+    'address': 'attraction__address', 'latitude': 'attraction__latitude',
+    'longitude': 'attraction__longitude', 'price_level': 'attraction__price_level',
+    'rating': 'attraction__rating', 'visited': 'visited', 'notes': 'notes',
+}
+
+def iter_itinerary(items, latitude=None, longitude=None, return_to_start=False, chunk_size=STREAM_CHUNK_SIZE):
+    """
+    Étapes de l'itinéraire des éléments de liste `items`, dans l'ordre de
+    visite. L'itinéraire n'est calculé qu'à la première étape demandée (le
+    début d'un export part avant) ; les lignes sont lues par paquets de
+    `chunk_size`, mémoire bornée quelle que soit la taille de la liste.
+    """
+    attractions = Attraction.objects.filter(pk__in=items.values('attraction_id'))
+    planned = plan_attraction_route(attractions, latitude, longitude, return_to_start)
+    ids, legs = planned['ids'], planned['legs']
+    for start in range(0, len(ids), chunk_size):
+        chunk = ids[start:start + chunk_size]
+        rows = {
+            row['id']: row
+            for row in (
+                dict(zip(EXPORT_VALUES, values))
+                for values in items.filter(attraction_id__in=chunk).order_by().values_list(*EXPORT_VALUES.values())
+            )
+        }
+        for position, pk in enumerate(chunk, start + 1):
+            if pk in rows:
+                yield {
+                    **rows[pk],
+                    'position': position,
+                    'latitude': float(rows[pk]['latitude']),
+                    'longitude': float(rows[pk]['longitude']),
+                    'rating': float(rows[pk]['rating']) if rows[pk]['rating'] is not None else None,
+                    'leg_km': round(legs[position - 1], 3),
+                }
+
+BUDGET_MAX_DAYS = 60
+
+def price_cost(path='price_level'):
+    """Coût d'une visite (PRICE_COSTS) calculé en SQL depuis le niveau de prix"""
+    return Case(
+        *(When(**{path: level}, then=Value(cost)) for level, cost in PRICE_COSTS.items()),
+        default=Value(0),
+        output_field=IntegerField()
+    )
+
+def budget_by_day(items, days):
+    """
+    [(jour, nombre, budget)] : les éléments de liste `items` répartis en
+    `days` journées de tailles égales, dans l'ordre d'ajout. Une requête :
+    NTILE numérote les journées, la requête englobante les agrège.
+    """
+    ranked = items.annotate(
+        day=Window(Ntile(days), order_by=[F('added_at').asc(), F('id').asc()]),
+        cost=price_cost('attraction__price_level'),
+    ).order_by().values('day', 'cost')
+    sql, params = ranked.query.sql_with_params()
+    with connections[items.db].cursor() as cursor:
+        cursor.execute(
+            f'SELECT day, COUNT(*), SUM(cost) FROM ({sql}) AS ranked GROUP BY day ORDER BY day',
+            params
+        )
+        return cursor.fetchall()
+
+class DistanceOrderingFilter(filters.OrderingFilter):
+    """
+    Ignore ?ordering=distance quand aucune position n'est fournie.
+    Sans ?ordering, une recherche plein texte est classée par pertinence.
+    """
+    
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        if SEARCH_RANK in queryset.query.annotations and not request.query_params.get(self.ordering_param):
+            return [SEARCH_RANK, *(ordering or [])]
+        return ordering
+    
+    def remove_invalid_fields(self, queryset, fields, view, request):
+        ordering = super().remove_invalid_fields(queryset, fields, view, request)
+        if 'distance' not in queryset.query.annotations:
+            ordering = [term for term in ordering if term.lstrip('-') != 'distance']
+        return ordering
+
+class CountryViewSet(ConditionalCacheMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Country.objects.all()
     serializer_class = CountrySerializer
+    cache_tables = ('country',)
     
     @action(detail=True, methods=['get'])
     def popular_attractions(self, request, pk=None):
         """Retourne les attractions les plus populaires d'un pays"""
         country = self.get_object()
-        attractions = Attraction.objects.filter(
+        try:
+            limit = int(request.query_params.get('limit', POPULAR_DEFAULT_LIMIT))
+        except ValueError:
+            limit = POPULAR_DEFAULT_LIMIT
+        limit = max(1, min(limit, leaderboard.LEADERBOARD_SIZE))
+        queryset = shape_for_list(Attraction.objects.filter(
             country=country,
             is_active=True
-        ).order_by('-num_likes', '-rating')[:10]
-        print(attractions)
+        ))
+        
+        ids = leaderboard.top_ids(country.pk)
+        if ids is not None:
+            found = queryset.in_bulk(ids[:limit])
+            attractions = [found[pk] for pk in ids[:limit] if pk in found]
+        else:
+            attractions = queryset.order_by(*leaderboard.POPULARITY_ORDERING)[:limit]
         
         serializer = AttractionListSerializer(
             attractions, 
@@ -40,57 +326,57 @@ class CountryViewSet(viewsets.ReadOnlyModelViewSet):
         country = self.get_object()
         query = request.query_params.get('q', '').strip()
 
-        tripadvisor = TripAdvisorService()
         latitude = country.capital_latitude
         longitude = country.capital_longitude
 
-        results = tripadvisor.search_locations(query, latitude, longitude)
+        try:
+            results = tripadvisor.search_locations(query, latitude, longitude)
+        except TripAdvisorError as exc:
+            return tripadvisor_error_response(exc)
 
         if not results or 'data' not in results:
             return Response({'error': 'Aucun résultat trouvé.'}, status=404)
 
-        formatted_results = []
-        for item in results['data'][:20]:
-            attraction, _ = Attraction.objects.update_or_create(
-                tripadvisor_id=item.get('location_id'),
-                defaults={
-                    'country': country,
-                    'city': country.capital,
-                    'name': item.get('name'),
-                    'tripadvisor_id': item.get('location_id'),
-                    'address': item.get('address_obj', {}).get('address_string', ''),
-                    'latitude': country.capital_latitude,
-                    'longitude': country.capital_longitude,
-                    'is_active': True,
-                }
-            )
-
-
-            formatted_results.append(attraction)
+        return Response(upsert_search_results(country, results, {'request': request}))
 
-        serializer = AttractionListSerializer(
-            formatted_results,
-            many=True,
-            context={'request': request}
-        )
-        return Response(serializer.data)
-
-class AttractionViewSet(viewsets.ReadOnlyModelViewSet):
+class AttractionViewSet(ConditionalCacheMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Attraction.objects.filter(is_active=True)
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [FullTextSearchFilter, DistanceOrderingFilter]
     search_fields = ['name', 'description', 'city']
-    ordering_fields = ['rating', 'num_reviews', 'num_likes', 'price_level']
+    ordering_fields = ['rating', 'num_reviews', 'num_likes', 'price_level', 'distance']
     ordering = ['-num_likes', '-rating']
+    pagination_class = KeysetPagination
     permission_classes = [IsAuthenticatedOrReadOnly]
+    # Réponses de list / retrieve mises en cache ; indicateurs liked / saved propres à chaque utilisateur
+    cache_tables = ('attraction', 'country')
+    cache_per_user = True
     
     def get_serializer_class(self):
         if self.action == 'retrieve':
             return AttractionDetailSerializer
         return AttractionListSerializer
     
+    # Actions qui sérialisent avec AttractionListSerializer
+    list_actions = ['list', 'popular', 'by_distance', 'nearby']
+    
     def get_queryset(self):
         queryset = super().get_queryset()
         
+        if self.action in self.list_actions:
+            queryset = shape_for_list(queryset)
+        elif self.action == 'retrieve':
+            # Similaires précalculées : une seule requête avec jointure
+            queryset = queryset.select_related('country', 'category').prefetch_related(
+                Prefetch('similar_links', queryset=shape_for_list(
+                    SimilarAttraction.objects.all(),
+                    prefix='similar__',
+                    extra_fields=['id', 'attraction', 'rank', 'similar__is_active']
+                ))
+            )
+        elif self.action in ('like', 'save'):
+            # Seul l'identifiant est utile : les compteurs sont mis à jour par UPDATE ciblé
+            queryset = queryset.only('id')
+        
         country = self.request.query_params.get('country')
         if country:
             queryset = queryset.filter(country_id=country)
@@ -125,75 +411,119 @@ class AttractionViewSet(viewsets.ReadOnlyModelViewSet):
         longitude = self.request.query_params.get('longitude')
         radius = self.request.query_params.get('radius')  # en km
         
-        if latitude and longitude and radius:
-            lat = float(latitude)
-            lon = float(longitude)
-            r = float(radius)
-            
-            filtered_ids = []
-            for attraction in queryset:
-                distance = self._calculate_distance(
-                    lat, lon,
-                    float(attraction.latitude),
-                    float(attraction.longitude)
-                )
-                if distance <= r:
-                    filtered_ids.append(attraction.id)
+        if latitude and longitude:
+            try:
+                lat = float(latitude)
+                lon = float(longitude)
+                radius = float(radius) if radius else None
+            except ValueError:
+                raise ValidationError({'error': 'latitude, longitude and radius must be numbers'})
             
-            queryset = queryset.filter(id__in=filtered_ids)
+            # Distance calculée en SQL : tri (?ordering=distance) et pagination en une requête
+            if radius is not None:
+                queryset = geo.filter_by_radius(queryset, lat, lon, radius)
+            else:
+                queryset = geo.annotate_distance(queryset, lat, lon)
         
         profile_type = self.request.query_params.get('profile_type')
-        if profile_type:
-            if profile_type == 'local':
-                queryset = queryset.filter(
-                    Q(category__name='restaurant') | Q(category__name='attraction')
-                )
-            elif profile_type == 'tourist':
-                queryset = queryset.filter(
-                    Q(category__name='restaurant') | Q(category__name='attraction') | 
-                    Q(category__name='hotel') | Q(category__name='geo')
-                )
-            elif profile_type == 'professional':
-                queryset = queryset.filter(
-                    Q(category__name='hotel') | Q(category__name='restaurant')
-                )
+        if profile_type in PROFILE_CATEGORIES:
+            queryset = queryset.filter(category__name__in=PROFILE_CATEGORIES[profile_type])
         
         return queryset
     
-    def _calculate_distance(self, lat1, lon1, lat2, lon2):
-        R = 6371  # Rayon de la Terre en km
-        
-        dlat = math.radians(lat2 - lat1)
-        dlon = math.radians(lon2 - lon1)
-        
-        a = (math.sin(dlat / 2) * math.sin(dlat / 2) +
-             math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) *
-             math.sin(dlon / 2) * math.sin(dlon / 2))
-        
-        c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-        distance = R * c
-        
-        return distance
-    
     @action(detail=False, methods=['get'])
     def popular(self, request):
         country = request.query_params.get('country')
         city = request.query_params.get('city')
         search = self.request.query_params.get('search')
         
-        queryset = self.get_queryset()
+        # Classement matérialisé si seuls pays / ville / profil sont demandés,
+        # et si la ville demandée n'en recouvre pas d'autres (repli : icontains)
+        ids = None
+        params = {key for key, value in request.query_params.items() if value}
+        if (
+            country and country.isdigit() and params <= LEADERBOARD_PARAMS
+            and (not city or leaderboard.covers_city_filter(int(country), city))
+        ):
+            profile_type = request.query_params.get('profile_type', '')
+            ids = leaderboard.top_ids(
+                int(country),
+                city or '',
+                profile_type if profile_type in PROFILE_CATEGORIES else ''
+            )
+        if ids is not None:
+            attractions = shape_for_list(Attraction.objects.filter(is_active=True)).in_bulk(ids[:20])
+            popular = [attractions[pk] for pk in ids[:20] if pk in attractions]
+            serializer = self.get_serializer(popular, many=True)
+            return Response(serializer.data)
+        
+        queryset = self.get_queryset().order_by(*leaderboard.POPULARITY_ORDERING)
         
         if country:
             queryset = queryset.filter(country_id=country)
         if city:
             queryset = queryset.filter(city__icontains=city)
         if search:
-            queryset = queryset.filter(name__icontains=search)
+            queryset = full_text_search(queryset, search, columns=['name'], rank=False)
         
         popular = queryset[:20]
         serializer = self.get_serializer(popular, many=True)
         return Response(serializer.data)
     
+    @action(detail=False, methods=['get'])
+    def nearby(self, request):
+        """Les k attractions les plus proches (ou toutes celles à moins de `radius` km)"""
+        lat = request.query_params.get('lat')
+        lon = request.query_params.get('lon')
+        
+        if not lat or not lon:
+            return Response(
+                {'error': 'lat and lon are required'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        radius = request.query_params.get('radius')
+        try:
+            lat, lon = float(lat), float(lon)
+            radius = float(radius) if radius else None
+            k = int(request.query_params.get('k', NEARBY_DEFAULT_K))
+        except ValueError:
+            return Response(
+                {'error': 'lat, lon and radius must be numbers, k an integer'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        k = max(1, min(k, NEARBY_MAX_K))
+        
+        found = geo.nearest(self.get_queryset(), lat, lon, k=k, radius=radius)
+        
+        attractions = self.get_queryset().in_bulk([pk for pk, _ in found])
+        nearby = []
+        for pk, distance in found:
+            attraction = attractions[pk]
+            attraction.distance = distance
+            nearby.append(attraction)
+        
+        serializer = self.get_serializer(nearby, many=True)
+        return Response(serializer.data)
+    
+    @action(detail=False, methods=['get'])
+    def suggest(self, request):
+        """Autocomplétion sur le nom et la ville, servie par l'index en mémoire"""
+        query = request.query_params.get('q', '')
+        country = request.query_params.get('country')
+        try:
+            limit = int(request.query_params.get('k', 10))
+            country = int(country) if country else None
+        except ValueError:
+            return Response(
+                {'error': 'k and country must be integers'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        limit = max(1, min(limit, suggest.index_settings()['MAX_RESULTS']))
+        
+        suggestions = suggest.index.suggest(query, limit=limit, country=country)
+        return Response(suggestions)
+    
     @action(detail=False, methods=['get'])
     def by_distance(self, request):
         latitude = request.query_params.get('latitude')
@@ -205,37 +535,14 @@ class AttractionViewSet(viewsets.ReadOnlyModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        attractions = list(self.get_queryset())
-        sorted_attractions = self._sort_by_distance(
-            attractions,
-            float(latitude),
-            float(longitude)
+        return route_response(
+            request,
+            self.get_queryset(),
+            self.get_serializer_class(),
+            self.get_serializer_context(),
+            latitude,
+            longitude
         )
-        
-        serializer = self.get_serializer(sorted_attractions, many=True)
-        return Response(serializer.data)
-    
-    def _sort_by_distance(self, attractions, start_lat, start_lon):
-        if not attractions:
-            return attractions
-        
-        sorted_attractions = []
-        remaining = attractions.copy()
-        current_lat, current_lon = start_lat, start_lon
-        
-        while remaining:
-            nearest = min(
-                remaining,
-                key=lambda a: self._calculate_distance(
-                    current_lat, current_lon,
-                    float(a.latitude), float(a.longitude)
-                )
-            )
-            sorted_attractions.append(nearest)
-            remaining.remove(nearest)
-            current_lat, current_lon = float(nearest.latitude), float(nearest.longitude)
-        
-        return sorted_attractions
     
     @action(detail=True, methods=['get'])
     def details_from_tripadvisor(self, request, pk=None):
@@ -250,47 +557,33 @@ class AttractionViewSet(viewsets.ReadOnlyModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        cache_key = f'tripadvisor_details_{attraction.tripadvisor_id}'
+        cache_key = details_cache_key(attraction)
         cached_data = cache.get(cache_key)
         
         if cached_data:
             return Response(cached_data)
         
-        tripadvisor = TripAdvisorService()
-        details = tripadvisor.get_location_details(attraction.tripadvisor_id)
-        photos = tripadvisor.get_location_photos(attraction.tripadvisor_id)
-        reviews = tripadvisor.get_location_reviews(attraction.tripadvisor_id)
+        # Détails, photos et avis sont demandés en parallèle
+        bundle = tripadvisor.get_location_bundle(attraction.tripadvisor_id)
+        if 'details' in bundle['errors']:
+            return tripadvisor_error_response(bundle['errors']['details'])
 
         # --- Mise à jour en base ---
-        attraction.name = details.get('name', attraction.name)
-        attraction.description = details.get('description', attraction.description)
-        attraction.city = details.get('address_obj', {}).get('city', attraction.city)
-        attraction.address = details.get('address_obj', {}).get('address_string', attraction.address)
-        attraction.latitude = details.get('latitude', attraction.latitude)
-        attraction.longitude = details.get('longitude', attraction.longitude)
-        attraction.phone = details.get('phone', attraction.phone)
-        attraction.website = details.get('website', attraction.website)
-        attraction.rating = details.get('rating', attraction.rating)
-        attraction.num_reviews = details.get('num_reviews', attraction.num_reviews)
-        attraction.num_photos = details.get('photo_count', attraction.num_photos)
-        attraction.images = [p['images']['original']['url'] for p in photos.get('data', [])]
-        attraction.awards = details.get('awards', [])
+        update_fields = apply_details(attraction, bundle)
         
         # Category
-        cat = details.get('category', {}).get('name')
+        cat = bundle['details'].get('category', {}).get('name')
         if cat:
             attraction.category = Category.objects.get_or_create(name=cat)[0]
-            pass
+            update_fields.append('category')
         
-        attraction.save()
+        attraction.save(update_fields=[*update_fields, 'updated_at'])
         
-        response_data = {
-            'details': details,
-            'photos': photos,
-            'reviews': reviews
-        }
+        response_data = details_response(bundle)
         
-        cache.set(cache_key, response_data, 3600)
+        # Un résultat partiel n'est pas mis en cache : le prochain appel réessaiera
+        if not bundle['errors']:
+            cache.set(cache_key, response_data, DETAILS_CACHE_TIMEOUT)
         return Response(response_data)
 
     
@@ -302,15 +595,14 @@ class AttractionViewSet(viewsets.ReadOnlyModelViewSet):
             attraction=attraction
         )
         
+        # num_likes est mis à jour par les signaux (counters.increment)
         if not created:
             like.delete()
-            attraction.num_likes -= 1
-            attraction.save()
-            return Response({'liked': False, 'num_likes': attraction.num_likes})
         
-        attraction.num_likes += 1
-        attraction.save()
-        return Response({'liked': True, 'num_likes': attraction.num_likes})
+        return Response({
+            'liked': created,
+            'num_likes': counters.current_value(attraction.pk, 'num_likes')
+        })
     
     @action(detail=True, methods=['post'])
     def save(self, request, pk=None):
@@ -320,6 +612,7 @@ class AttractionViewSet(viewsets.ReadOnlyModelViewSet):
             attraction=attraction
         )
         
+        # saves_count est mis à jour par les signaux (counters.increment)
         if not created:
             saved_item.delete()
             return Response({'saved': False})
@@ -328,10 +621,21 @@ class AttractionViewSet(viewsets.ReadOnlyModelViewSet):
 
 class UserAttractionListViewSet(viewsets.ModelViewSet):
     serializer_class = UserAttractionListSerializer
+    pagination_class = KeysetPagination
     permission_classes = [IsAuthenticatedOrReadOnly]
     
     def get_queryset(self):
-        return UserAttractionList.objects.filter(user=self.request.user)
+        queryset = UserAttractionList.objects.filter(user=self.request.user)
+        if self.action == 'list':
+            # Le user n'est pas sérialisé : projection sur l'élément et son attraction
+            queryset = shape_for_list(
+                queryset,
+                prefix='attraction__',
+                extra_fields=['id', 'added_at', 'notes', 'visited']
+            )
+        else:
+            queryset = queryset.select_related('attraction')
+        return queryset
     
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
@@ -347,61 +651,114 @@ class UserAttractionListViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        my_list = self.get_queryset()
-        attractions = [item.attraction for item in my_list]
+        # Itinéraire sur les attractions de la liste (pas sur les éléments)
+        attractions = shape_for_list(
+            Attraction.objects.filter(userattractionlist__user=request.user)
+        )
         
-        sorted_attractions = self._sort_by_distance(
+        return route_response(
+            request,
             attractions,
-            float(latitude),
-            float(longitude)
+            AttractionListSerializer,
+            self.get_serializer_context(),
+            latitude,
+            longitude
         )
-        
-        serializer = AttractionListSerializer(sorted_attractions, many=True)
-        return Response(serializer.data)
+    
+    @action(detail=False, methods=['get'], renderer_classes=EXPORT_RENDERERS,
+            permission_classes=[IsAuthenticated])
+    def export(self, request):
+        """
+        Ma liste en itinéraire, exportée en GPX, ICS, CSV ou JSON.
+
+        ?format= (ou l'en-tête Accept) est le paramètre de négociation de DRF :
+        il choisit le renderer, un format inconnu donne une 404. Le fichier
+        est streamé étape par étape dans l'ordre de visite optimisé, depuis
+        ?latitude=&longitude= si donnés. ICS : ?start=AAAA-MM-JJTHH:MM et
+        ?visit_minutes= (60 par défaut) placent les visites.
+        """
+        latitude = request.query_params.get('latitude')
+        longitude = request.query_params.get('longitude')
+        options = {}
+        try:
+            if request.query_params.get('start'):
+                options['start'] = datetime.fromisoformat(request.query_params['start']).replace(tzinfo=None)
+            if request.query_params.get('visit_minutes'):
+                options['visit_minutes'] = max(1, int(request.query_params['visit_minutes']))
+            if latitude and longitude:
+                latitude, longitude = float(latitude), float(longitude)
+            else:
+                latitude = longitude = None
+        except ValueError:
+            return Response({'error': 'Paramètre invalide'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        stops = iter_itinerary(
+            UserAttractionList.objects.filter(user=request.user),
+            latitude,
+            longitude,
+            return_to_start=request.query_params.get('return_to_start') in ('1', 'true'),
+        )
+        renderer = request.accepted_renderer
+        response = StreamingHttpResponse(
+            renderer.stream(stops, options),
+            content_type=f'{renderer.media_type}; charset={renderer.charset}'
+        )
+        response['Content-Disposition'] = f'attachment; filename="itinerary.{renderer.extension}"'
+        return response
     
     @action(detail=False, methods=['get'])
     def budget_total(self, request):
-        my_list = self.get_queryset()
-        
-        price_mapping = {
-            'free': 0,
-            'budget': 10,
-            'moderate': 25,
-            'expensive': 50,
-            'luxury': 100
+        """
+        Budget de ma liste, agrégé en base en une seule requête quelle que
+        soit sa taille : total, détail par niveau de prix, visitées / à
+        visiter. ?days=N ajoute un plan sur N journées (une requête de plus).
+        """
+        my_list = UserAttractionList.objects.filter(user=request.user)
+        cost = price_cost('attraction__price_level')
+        visited = Q(visited=True)
+        
+        aggregates = {
+            'total_budget': Coalesce(Sum(cost), 0),
+            'count': Count('id'),
+            'visited_budget': Coalesce(Sum(cost, filter=visited), 0),
+            'visited_count': Count('id', filter=visited),
+        }
+        for level in PriceLevel.values:
+            aggregates[f'{level}_count'] = Count('id', filter=Q(attraction__price_level=level))
+        totals = my_list.aggregate(**aggregates)
+        
+        data = {
+            'total_budget': totals['total_budget'],
+            'count': totals['count'],
+            'by_price_level': {
+                level: {
+                    'count': totals[f'{level}_count'],
+                    'budget': totals[f'{level}_count'] * PRICE_COSTS[level],
+                }
+                for level in PriceLevel.values
+            },
+            'visited': {'count': totals['visited_count'], 'budget': totals['visited_budget']},
+            'remaining': {
+                'count': totals['count'] - totals['visited_count'],
+                'budget': totals['total_budget'] - totals['visited_budget'],
+            },
         }
         
-        total_budget = sum(
-            price_mapping.get(item.attraction.price_level, 0)
-            for item in my_list
-        )
-        
-        return Response({
-            'total_budget': total_budget,
-            'count': my_list.count()
-        })
-    
-    def _sort_by_distance(self, attractions, start_lat, start_lon):
-        if not attractions:
-            return attractions
-        
-        sorted_attractions = []
-        remaining = attractions.copy()
-        current_lat, current_lon = start_lat, start_lon
-        
-        R = 6371  # Rayon Terre en km
-        
-        while remaining:
-            def distance_to(attr):
-                dlat = math.radians(float(attr.latitude) - current_lat)
-                dlon = math.radians(float(attr.longitude) - current_lon)
-                a = math.sin(dlat/2)**2 + math.cos(math.radians(current_lat)) * math.cos(math.radians(float(attr.latitude))) * math.sin(dlon/2)**2
-                c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
-                return R * c
-            
-            nearest = min(remaining, key=distance_to)
-            sorted_attractions.append(nearest)
-            remaining.remove(nearest)
-            current_lat, current_lon = float(nearest.latitude), float(nearest.longitude)
+        days = request.query_params.get('days')
+        if days:
+            try:
+                days = int(days)
+            except ValueError:
+                days = 0
+            if not 1 <= days <= BUDGET_MAX_DAYS:
+                return Response(
+                    {'error': f'days doit être compris entre 1 et {BUDGET_MAX_DAYS}'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            by_day = {day: (count, budget) for day, count, budget in budget_by_day(my_list, days)}
+            data['days'] = [
+                {'day': day, 'count': by_day.get(day, (0, 0))[0], 'budget': by_day.get(day, (0, 0))[1]}
+                for day in range(1, days + 1)
+            ]
         
-        return sorted_attractions            
\ No newline at end of file
+        return Response(data)
@@ -228,6 +228,8 @@ Découvrez le monde autrement avec TravelGuide
                       attraction.main_image ||
                       "https://via.placeholder.com/100x100"
                     }
+                    srcSet={attraction.main_image_srcset || undefined}
+                    sizes="100px"
                     alt={attraction.name}
                   />
                 </div>
@@ -1,6 +1,16 @@
 import { useState, useEffect } from "react";
 import "./HomePage.css";
 
+// Plus petite déclinaison d'au moins `width` pixels (main_image_srcset), sinon la plus grande
+const imageForWidth = (attraction, width) => {
+  if (!attraction.main_image_srcset) return attraction.main_image;
+  const candidates = attraction.main_image_srcset
+    .split(", ")
+    .map((candidate) => candidate.split(" "));
+  const match = candidates.find(([, w]) => parseInt(w, 10) >= width);
+  return (match || candidates[candidates.length - 1])[0];
+};
+
 const HomePage = ({
   API_URL,
   selectedCountry,
@@ -75,7 +85,7 @@ const HomePage = ({
                 className="carousel-image"
                 style={{
                   backgroundImage: `url(${
-                    popularAttractions[carouselIndex].main_image ||
+                    imageForWidth(popularAttractions[carouselIndex], 1280) ||
                     "https://via.placeholder.com/800x400"
                   })`,
                 }}
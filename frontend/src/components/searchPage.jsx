@@ -15,6 +15,7 @@ const SearchPage = ({
   const [distanceSorted, setDistanceSorted] = useState(false);
   const [userLocation, setUserLocation] = useState({ lat: null, lng: null });
   const [categories, setCategories] = useState([]);
+  const [suggestions, setSuggestions] = useState([]);
   const [priceLevels, setPriceLevels] = useState([]);
   const [filters, setFilters] = useState({
     search: "",
@@ -84,6 +85,25 @@ useEffect(() => {
     fetchAttractions();
   }, [selectedCountry]);
 
+  // Autocomplétion : index en mémoire côté serveur, sans relancer la recherche complète
+  useEffect(() => {
+    if (filters.search.trim().length < 2) {
+      setSuggestions([]);
+      return;
+    }
+    const timer = setTimeout(async () => {
+      try {
+        const res = await fetch(
+          `${API_URL}/attractions/suggest/?q=${encodeURIComponent(filters.search)}&country=${selectedCountry.id}`
+        );
+        setSuggestions(await res.json());
+      } catch (error) {
+        console.error("Erreur autocomplétion:", error);
+      }
+    }, 150);
+    return () => clearTimeout(timer);
+  }, [filters.search, selectedCountry]);
+
 const fetchAttractions = async () => {
   setLoading(true);
   try {
@@ -179,7 +199,15 @@ const fetchAttractions = async () => {
           value={filters.search}
           onChange={(e) => handleFilterChange("search", e.target.value)}
           className="filter-input"
+          list="attraction-suggestions"
         />
+        <datalist id="attraction-suggestions">
+          {suggestions.map((s) => (
+            <option key={s.id} value={s.name}>
+              {s.city}
+            </option>
+          ))}
+        </datalist>
       </div>
 
       {/* Catégorie depuis la BDD */}